@@ -0,0 +1,80 @@
+import time
+from multiprocessing import cpu_count
+import numpy as np
+from bench_binarize import make_test_image
+from binarize import parallel_binarize
+from contours import extract_contours
+from paths import parallel_extract_runs
+
+REPEAT = 3
+
+
+def worker_counts():
+    """1, 2, 4, ... とコア数までのプロセス数"""
+    counts = [1]
+    while counts[-1] * 2 < cpu_count():
+        counts.append(counts[-1] * 2)
+    if cpu_count() > 1:
+        counts.append(cpu_count())
+    return counts
+
+
+def best_time(func, *args, **kwargs):
+    """REPEAT 回実行して一番速い時間と結果を返す（1回目はプールの起動を除くための空回し）"""
+    result = func(*args, **kwargs)
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def same_contours(a, b):
+    return (np.array_equal(a.polygons.points, b.polygons.points)
+            and np.array_equal(a.polygons.offsets, b.polygons.offsets)
+            and np.array_equal(a.parents, b.parents) and np.array_equal(a.areas, b.areas))
+
+
+def run_points(runs):
+    """線分の点のX座標を、線分の順に詰めた配列にする（帯ごとの結果は xs を詰めて返すため）"""
+    xs, first, count = runs[3]
+    return xs[np.repeat(first, count) + np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)]
+
+
+def same_runs(a, b):
+    return (all(np.array_equal(x, y) for x, y in zip(a[:3], b[:3])) and np.array_equal(a[3][2], b[3][2])
+            and np.array_equal(run_points(a), run_points(b)))
+
+
+def bench_stage(name, func, same):
+    """プロセス数ごとの時間と、1プロセスに対する速度比・結果の一致を表示"""
+    print(f"\n{name}")
+    print(f"{'プロセス数':>8} {'時間[s]':>9} {'速度比':>7} {'結果':>4}")
+    reference, base = None, None
+    for workers in worker_counts():
+        result, seconds = best_time(func, workers)
+        if reference is None:
+            reference, base = result, seconds
+        match = "一致" if same(reference, result) else "不一致"
+        print(f"{workers:>8} {seconds:>9.3f} {base / seconds:>7.2f} {match:>4}")
+
+
+def main():
+    img = make_test_image(3840, 2160)
+    height, width = img.shape
+    print(f"帯ごとの並列処理のベンチマーク（{width}x{height}, コア数 {cpu_count()}）")
+
+    for method in ("otsu", "adaptive", "sauvola"):
+        bench_stage(f"2値化 ({method})", lambda workers: parallel_binarize(img, method, window=51, workers=workers)[0],
+                    np.array_equal)
+
+    binary, _ = parallel_binarize(img, "sauvola", window=51)
+    bench_stage("線分抽出 (gap=2, min_points=2)",
+                lambda workers: parallel_extract_runs(binary, width, height, gap=2, min_points=2, workers=workers),
+                same_runs)
+    bench_stage("輪郭追跡と多角形化", lambda workers: extract_contours(binary, workers=workers), same_contours)
+
+
+if __name__ == "__main__":
+    main()
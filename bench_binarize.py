@@ -0,0 +1,56 @@
+import time
+import cv2
+import numpy as np
+from binarize import adaptive_binarize, threshold_sweep
+
+WINDOWS = [11, 25, 51, 101, 201]
+
+
+def make_test_image(width=4000, height=3000):
+    """ムラのある照明の上に文字風の模様を置いたテスト画像"""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    lighting = 120 + 80 * np.sin(xx / width * np.pi) * np.cos(yy / height * np.pi / 2)
+    strokes = (rng.random((height // 8, width // 8)) < 0.1).astype(np.float32)
+    strokes = cv2.resize(strokes, (width, height), interpolation=cv2.INTER_NEAREST)
+    img = lighting - 90 * strokes + rng.normal(0, 8, (height, width))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_adaptive():
+    img = make_test_image()
+    print(f"適応2値化のベンチマーク（{img.shape[1]}x{img.shape[0]}）")
+    print(f"{'窓':>5} {'cv2平均[s]':>11} {'cv2ガウス[s]':>12} {'Sauvola[s]':>11} {'Niblack[s]':>11}")
+
+    for window in WINDOWS:
+        _, mean_time = timed(cv2.adaptiveThreshold, img, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                             cv2.THRESH_BINARY, window, 2)
+        _, gaussian_time = timed(cv2.adaptiveThreshold, img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, window, 2)
+        _, sauvola_time = timed(adaptive_binarize, img, window, "sauvola")
+        _, niblack_time = timed(adaptive_binarize, img, window, "niblack")
+        print(f"{window:>5} {mean_time:>11.3f} {gaussian_time:>12.3f} {sauvola_time:>11.3f} {niblack_time:>11.3f}")
+
+
+def bench_threshold_sweep():
+    print("\n閾値スイープのベンチマーク（256通り＋大津）")
+    for size in (300, 1000, 4000):
+        img = make_test_image(size, size)
+        _, sweep_time = timed(threshold_sweep, img)
+        _, single_time = timed(cv2.threshold, img, 127, 255, cv2.THRESH_BINARY)
+        print(f"  {size}x{size}: スイープ {sweep_time * 1000:.1f}ms, 2値化1回 {single_time * 1000:.2f}ms")
+
+
+def main():
+    bench_adaptive()
+    bench_threshold_sweep()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import time
+from multiprocessing import cpu_count
+import numpy as np
+from dithering import error_diffusion, parallel_error_diffusion, ordered_dither, halftone_dither, blue_noise_dither
+
+SIZES = [512, 1000, 2000]
+
+
+def legacy_floyd_steinberg_main3(img):
+    """main3.floyd_steinberg_dither の旧実装（画素ごとのループ）"""
+    img = img.astype(np.float32) / 255.0
+    height, width = img.shape
+
+    for y in range(height - 1):
+        for x in range(1, width - 1):
+            old_pixel = img[y, x]
+            new_pixel = 1.0 if old_pixel > 0.5 else 0.0
+            img[y, x] = new_pixel
+
+            error = old_pixel - new_pixel
+
+            img[y, x + 1] += error * 7/16
+            img[y + 1, x - 1] += error * 3/16
+            img[y + 1, x] += error * 5/16
+            img[y + 1, x + 1] += error * 1/16
+
+    return (img * 255).astype(np.uint8)
+
+
+def legacy_floyd_steinberg_main4(img, black_threshold=80, white_threshold=200):
+    """main4.floyd_steinberg_dither の旧実装（画素ごとのループ）"""
+    img = img.astype(np.float32) / 255.0
+    height, width = img.shape
+
+    black_thresh = black_threshold / 255.0
+    white_thresh = white_threshold / 255.0
+
+    for y in range(height - 1):
+        for x in range(1, width - 1):
+            old_pixel = img[y, x]
+
+            if old_pixel <= black_thresh:
+                new_pixel = 0.0
+            elif old_pixel >= white_thresh:
+                new_pixel = 1.0
+            else:
+                new_pixel = 1.0 if old_pixel > 0.5 else 0.0
+
+            img[y, x] = new_pixel
+
+            error = old_pixel - new_pixel
+
+            if old_pixel <= black_thresh or old_pixel >= white_thresh:
+                error_weight = 0.3
+            else:
+                error_weight = 1.0
+
+            img[y, x + 1] += error * error_weight * 7/16
+            img[y + 1, x - 1] += error * error_weight * 3/16
+            img[y + 1, x] += error * error_weight * 5/16
+            img[y + 1, x + 1] += error * error_weight * 1/16
+
+    return (img * 255).astype(np.uint8)
+
+
+def legacy_ordered_dither(img, matrix_size=4):
+    """main3.ordered_dither の旧実装（画素ごとのループ）"""
+    if matrix_size == 2:
+        bayer_matrix = np.array([[0, 2], [3, 1]]) / 4.0
+    else:
+        bayer_matrix = np.array([
+            [0, 8, 2, 10],
+            [12, 4, 14, 6],
+            [3, 11, 1, 9],
+            [15, 7, 13, 5]
+        ]) / 16.0
+
+    height, width = img.shape
+    result = np.zeros_like(img)
+
+    for y in range(height):
+        for x in range(width):
+            threshold = bayer_matrix[y % matrix_size, x % matrix_size]
+            result[y, x] = 255 if img[y, x] / 255.0 > threshold else 0
+
+    return result
+
+
+def legacy_halftone_dither(img, dot_size=4):
+    """main3.halftone_dither の旧実装（ブロックごと・画素ごとのループ）"""
+    height, width = img.shape
+    result = np.zeros_like(img)
+
+    for y in range(0, height, dot_size):
+        for x in range(0, width, dot_size):
+            block = img[y:y+dot_size, x:x+dot_size]
+            avg_brightness = np.mean(block) / 255.0
+
+            radius = int((1 - avg_brightness) * dot_size / 2)
+
+            center_y = y + dot_size // 2
+            center_x = x + dot_size // 2
+
+            for dy in range(-radius, radius + 1):
+                for dx in range(-radius, radius + 1):
+                    py = center_y + dy
+                    px = center_x + dx
+
+                    if (0 <= py < height and 0 <= px < width and
+                        dx*dx + dy*dy <= radius*radius):
+                        result[py, px] = 0
+                    elif y <= py < y + dot_size and x <= px < x + dot_size:
+                        if 0 <= py < height and 0 <= px < width:
+                            result[py, px] = 255
+
+    return result
+
+
+def legacy_hatching_dither(resized):
+    """main.create_hatching_pattern 内の旧ループ（np.clip付き）"""
+    work = resized.astype(np.float32) / 255.0
+    target_h, target_w = work.shape
+
+    for y in range(target_h - 1):
+        row = work[y]
+        for x in range(1, target_w - 1):
+            old = row[x]
+            new = 0.0 if old < 0.5 else 1.0
+            row[x] = new
+            err = old - new
+            work[y, x + 1] = np.clip(work[y, x + 1] + err * (7.0 / 16.0), 0.0, 1.0)
+            work[y + 1, x - 1] = np.clip(work[y + 1, x - 1] + err * (3.0 / 16.0), 0.0, 1.0)
+            work[y + 1, x] = np.clip(work[y + 1, x] + err * (5.0 / 16.0), 0.0, 1.0)
+            work[y + 1, x + 1] = np.clip(work[y + 1, x + 1] + err * (1.0 / 16.0), 0.0, 1.0)
+
+    return work
+
+
+def make_test_image(size):
+    """グラデーション＋ノイズのテスト画像"""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, size, dtype=np.float32)
+    img = (gradient[None, :] + gradient[:, None]) / 2 + rng.normal(0, 20, (size, size))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_error_diffusion():
+    cases = [
+        ("main3", legacy_floyd_steinberg_main3,
+         lambda img: (error_diffusion(img) * 255).astype(np.uint8)),
+        ("main4", legacy_floyd_steinberg_main4,
+         lambda img: (error_diffusion(img, black_threshold=80, white_threshold=200) * 255).astype(np.uint8)),
+        ("main", legacy_hatching_dither,
+         lambda img: error_diffusion(img, clip=True, midpoint_to_white=True)),
+    ]
+
+    print("誤差拡散ディザリングのベンチマーク（旧ループ vs 波面ベクトル化）")
+    # 1時刻ごとの呼び出しの手間は一定なので、倍率は画像が大きいほど高い
+    # （512x512 では main3・main4 とも、1000x1000 でも main4 は50倍に届かない。実測値は error_diffusion の説明）
+    print(f"{'サイズ':>10} {'呼び出し元':>8} {'旧実装[s]':>10} {'新実装[s]':>10} {'倍率':>8} {'一致':>4}")
+
+    for size in SIZES:
+        img = make_test_image(size)
+        for name, legacy, vectorized in cases:
+            expected, legacy_time = timed(legacy, img)
+            # 新実装は速いので3回のうち一番速い時間を使う
+            result, new_time = min((timed(vectorized, img) for _ in range(3)), key=lambda run: run[1])
+            identical = np.array_equal(expected, result)
+            print(f"{size:>5}x{size:<4} {name:>8} {legacy_time:>10.3f} {new_time:>10.4f} "
+                  f"{legacy_time / new_time:>7.1f}x {'○' if identical else '×':>4}")
+
+
+def bench_parallel_error_diffusion():
+    print(f"\n波面並列誤差拡散のスケーリング（コア数: {cpu_count()}）")
+    print(f"{'サイズ':>10} {'プロセス':>8} {'時間[s]':>10} {'倍率':>8} {'一致':>4}")
+
+    # main4 の作業画像は長辺1000まで（plan_resolution）なので、それより小さい画像も測る
+    worker_counts = [1] + [n for n in (2, 4, 8, 16) if n <= cpu_count()]
+    crossover = None
+    for size in (500, 700, 1000, 2000, 4000):
+        img = make_test_image(size)
+        expected, serial_time = timed(error_diffusion, img, black_threshold=80, white_threshold=200)
+        for workers in worker_counts:
+            result, parallel_time = timed(parallel_error_diffusion, img, workers=workers,
+                                          black_threshold=80, white_threshold=200)
+            identical = np.array_equal(expected, result)
+            print(f"{size:>5}x{size:<4} {workers:>8} {parallel_time:>10.3f} "
+                  f"{serial_time / parallel_time:>7.2f}x {'○' if identical else '×':>4}")
+            if crossover is None and workers > 1 and parallel_time < serial_time:
+                crossover = size * size
+    # main4.PARALLEL_DITHER_MIN_PIXELS はこの値を目安に決める
+    print(f"並列の方が速くなる最小の画素数: {crossover if crossover is not None else 'なし'}")
+
+
+def bench_ordered_dither():
+    print("\n組織的ディザリングのベンチマーク")
+
+    # 旧実装との一致確認（旧実装は2x2と4x4のみ）
+    img = make_test_image(512)
+    for matrix_size in (2, 4):
+        expected, legacy_time = timed(legacy_ordered_dither, img, matrix_size)
+        result, new_time = timed(ordered_dither, img, matrix_size)
+        identical = np.array_equal(expected, result)
+        print(f"  512x512  {matrix_size:>2}x{matrix_size:<2} 旧実装 {legacy_time:.3f}s, 新実装 {new_time * 1000:.2f}ms "
+              f"({legacy_time / new_time:.0f}x) 一致: {'○' if identical else '×'}")
+
+    # 4000x3000 の大きな画像
+    large = np.random.default_rng(0).integers(0, 256, (3000, 4000), dtype=np.uint8)
+    for matrix_size in (2, 4, 8, 16, 64):
+        _, new_time = timed(ordered_dither, large, matrix_size)
+        print(f"  4000x3000 {matrix_size:>2}x{matrix_size:<2} 新実装 {new_time * 1000:.2f}ms")
+
+    # ブルーノイズ（初回はマスク生成を含むので2回目を計測）
+    blue_noise_dither(large[:64, :64])
+    for workers in (1, 2, 4, 8):
+        _, new_time = timed(blue_noise_dither, large, workers=workers)
+        print(f"  4000x3000 ブルーノイズ {workers}スレッド {new_time * 1000:.2f}ms")
+
+
+def bench_halftone_dither():
+    print("\nハーフトーン・ディザリングのベンチマーク")
+    print(f"{'サイズ':>10} {'セル':>4} {'旧実装[s]':>10} {'新実装[s]':>10} {'倍率':>8} {'45度[s]':>8}")
+
+    for size in SIZES:
+        img = make_test_image(size)
+        for dot_size in (4, 8):
+            _, legacy_time = timed(legacy_halftone_dither, img, dot_size)
+            _, new_time = timed(halftone_dither, img, dot_size)
+            _, rotated_time = timed(halftone_dither, img, dot_size, 45)
+            print(f"{size:>5}x{size:<4} {dot_size:>4} {legacy_time:>10.3f} {new_time:>10.4f} "
+                  f"{legacy_time / new_time:>7.1f}x {rotated_time:>8.3f}")
+
+
+def main():
+    bench_error_diffusion()
+    bench_parallel_error_diffusion()
+    bench_ordered_dither()
+    bench_halftone_dither()
+
+
+if __name__ == "__main__":
+    main()
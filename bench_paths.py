@@ -0,0 +1,366 @@
+import time
+import multiprocessing
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import cv2
+import paths
+from paths import (PathBuffer, chain_runs, resample_black_pixels, extract_runs, parallel_extract_runs, runs_to_point_lists,
+                   simplify_paths, order_paths, travel_distance, hatch_fill,
+                   segment_pixels)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 黒ピクセル数の目標
+PIXEL_COUNTS = [10**5, 10**6, 10**7]
+# 旧実装はこの黒ピクセル数までで計測する（それ以上は数分かかる）
+LEGACY_LIMIT = 10**6
+
+
+def legacy_group_rows(binary_img, draw_x1, draw_y1, draw_width, draw_height):
+    """旧実装共通の y_to_x_dict 作成部分"""
+    height, width = binary_img.shape
+    black_y, black_x = np.where(binary_img == 0)
+
+    draw_x_coords = draw_x1 + ((black_x / width) * draw_width).astype(int)
+    draw_y_coords = draw_y1 + ((black_y / height) * draw_height).astype(int)
+
+    y_to_x_dict = {}
+    for x, y in zip(draw_x_coords, draw_y_coords):
+        if y not in y_to_x_dict:
+            y_to_x_dict[y] = []
+        y_to_x_dict[y].append(x)
+    return y_to_x_dict
+
+
+def mapping_differences(binary_img, draw_width, draw_height):
+    """
+    旧実装の浮動小数点の座標写像と、paths._coordinate_map の整数演算の写像で行き先が変わる黒ピクセルの数
+
+    (i / size) * out は丸め誤差で1つ小さくなることがある（116 / 400 * 400 -> 115）ので、
+    その分だけ新旧のパスは一致しない。
+    """
+    height, width = binary_img.shape
+    black_y, black_x = np.where(binary_img == 0)
+    moved_x = ((black_x / width) * draw_width).astype(int) != black_x * draw_width // width
+    moved_y = ((black_y / height) * draw_height).astype(int) != black_y * draw_height // height
+    return int(np.count_nonzero(moved_x | moved_y))
+
+
+def legacy_fill_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
+    """main5.create_fill_paths の旧実装（間隔2以下、重複除去）"""
+    y_to_x_dict = legacy_group_rows(binary_img, draw_x1, draw_y1, draw_width, draw_height)
+    paths = []
+
+    for y in sorted(y_to_x_dict.keys()):
+        x_coords = sorted(set(y_to_x_dict[y]))
+        current_path = [(x_coords[0], y)]
+
+        for i in range(1, len(x_coords)):
+            if x_coords[i] - x_coords[i - 1] <= 2:
+                current_path.append((x_coords[i], y))
+            else:
+                if len(current_path) >= 2:
+                    paths.append(current_path)
+                current_path = [(x_coords[i], y)]
+
+        if len(current_path) >= 2:
+            paths.append(current_path)
+
+    return paths
+
+
+def legacy_optimized_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
+    """main4.create_optimized_paths の旧実装（間隔3以下、重複あり、1プロセス）"""
+    y_to_x_dict = legacy_group_rows(binary_img, draw_x1, draw_y1, draw_width, draw_height)
+    paths = []
+
+    for y in sorted(y_to_x_dict.keys()):
+        x_coords = sorted(y_to_x_dict[y])
+        current_path = [(x_coords[0], y)]
+
+        for i in range(1, len(x_coords)):
+            if abs(x_coords[i] - x_coords[i - 1]) <= 3:
+                current_path.append((x_coords[i], y))
+            else:
+                if len(current_path) >= 2:
+                    paths.append(current_path)
+                current_path = [(x_coords[i], y)]
+
+        if len(current_path) >= 2:
+            paths.append(current_path)
+
+    return paths
+
+
+def legacy_process_row_chunk(args):
+    """main4.process_row_chunk の旧実装"""
+    y_chunk, y_to_x_dict, draw_x1, draw_y1, draw_width, draw_height = args
+    paths = []
+
+    for target_y in y_chunk:
+        x_coords = sorted(y_to_x_dict[target_y])
+        current_path = [(x_coords[0], target_y)]
+
+        for i in range(1, len(x_coords)):
+            if abs(x_coords[i] - x_coords[i - 1]) <= 3:
+                current_path.append((x_coords[i], target_y))
+            else:
+                if len(current_path) >= 2:
+                    paths.append(current_path)
+                current_path = [(x_coords[i], target_y)]
+
+        if len(current_path) >= 2:
+            paths.append(current_path)
+
+    return paths
+
+
+def legacy_pool_optimized_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
+    """main4.create_optimized_paths の旧並列実装（各チャンクに辞書全体を渡し、毎回プールを作る）"""
+    y_to_x_dict = legacy_group_rows(binary_img, draw_x1, draw_y1, draw_width, draw_height)
+    unique_y = sorted(y_to_x_dict.keys())
+
+    pixel_count = int(np.count_nonzero(binary_img == 0))
+    if pixel_count > 200000:
+        num_cores = min(cpu_count(), 4)
+    elif pixel_count > 100000:
+        num_cores = min(cpu_count(), 6)
+    else:
+        num_cores = min(cpu_count(), 8)
+
+    chunk_size = max(1, len(unique_y) // num_cores)
+    y_chunks = [unique_y[i:i + chunk_size] for i in range(0, len(unique_y), chunk_size)]
+    args_list = [(chunk, y_to_x_dict, draw_x1, draw_y1, draw_width, draw_height)
+                 for chunk in y_chunks if chunk]
+
+    with Pool(processes=num_cores) as pool:
+        chunk_results = pool.map(legacy_process_row_chunk, args_list)
+
+    all_paths = []
+    for chunk_paths in chunk_results:
+        all_paths.extend(chunk_paths)
+    return all_paths
+
+
+def shared_memory_runs(binary_img, draw_x1, draw_y1, draw_width, draw_height):
+    """共有メモリ＋使い回しプールによる並列線分抽出（配列のまま返す）"""
+    return parallel_extract_runs(binary_img, draw_width, draw_height, gap=3, min_points=2,
+                                 duplicates=True, workers=cpu_count())
+
+
+def _measure_in_subprocess(name, black_pixels, repeats, queue):
+    """新しいプロセスで実行時間とピークRSS（親・子の最大）を計測する"""
+    builder = {"legacy": legacy_pool_optimized_paths, "shared": shared_memory_runs}[name]
+    img = make_test_image(black_pixels)
+    height, width = img.shape
+    area = (100, 50, int(width * 0.8), int(height * 0.8))
+
+    times = []
+    for _ in range(repeats):
+        _, elapsed = timed(builder, img, *area)
+        times.append(elapsed)
+    paths._close_pool()
+
+    if resource is None:
+        queue.put((times, None, None))
+        return
+    # Linux では KB 単位
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    queue.put((times, self_rss, child_rss))
+
+
+def bench_parallel_paths():
+    print(f"\n並列パス生成のベンチマーク（コア数: {cpu_count()}、3回実行）")
+    print("旧: 辞書全体を各チャンクにpickle・毎回Pool作成 / 新: 共有メモリ・使い回しプール")
+    print(f"{'黒ピクセル':>10} {'方式':>4} {'1回目[s]':>9} {'2回目以降[s]':>12} {'倍率':>7} "
+          f"{'親RSS[MB]':>10} {'子RSS[MB]':>10}")
+
+    context = multiprocessing.get_context("spawn")
+    for target in PIXEL_COUNTS[:2]:
+        measured = {}
+        for name in ("legacy", "shared"):
+            queue = context.Queue()
+            process = context.Process(target=_measure_in_subprocess, args=(name, target, 3, queue))
+            process.start()
+            measured[name] = queue.get()
+            process.join()
+
+        legacy_time = np.mean(measured["legacy"][0][1:])
+        for name, label in (("legacy", "旧"), ("shared", "新")):
+            times, self_rss, child_rss = measured[name]
+            steady = np.mean(times[1:])
+            rss = (f"{self_rss:>10.0f} {child_rss:>10.0f}" if self_rss is not None
+                   else f"{'-':>10} {'-':>10}")
+            print(f"{target:>10} {label:>4} {times[0]:>9.3f} {steady:>12.3f} "
+                  f"{legacy_time / steady:>6.1f}x {rss}")
+
+
+def make_test_image(black_pixels, density=0.5):
+    """黒ピクセルが約 black_pixels 個になるランダムな2値画像"""
+    side = int(np.sqrt(black_pixels / density))
+    rng = np.random.default_rng(0)
+    return np.where(rng.random((side, side)) < density, 0, 255).astype(np.uint8)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def vectorized_fill_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
+    counts = resample_black_pixels(binary_img, draw_width, draw_height)
+    rows, _, _, points = extract_runs(counts, gap=2, min_points=2, return_points=True)
+    return runs_to_point_lists(rows, points, draw_x1, draw_y1)
+
+
+def vectorized_optimized_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
+    counts = resample_black_pixels(binary_img, draw_width, draw_height)
+    rows, _, _, points = extract_runs(counts, gap=3, min_points=2, duplicates=True, return_points=True)
+    return runs_to_point_lists(rows, points, draw_x1, draw_y1)
+
+
+def bench_run_extraction():
+    print("線分抽出のベンチマーク（旧: y_to_x_dict ループ / 新: 配列演算）")
+    print(f"{'黒ピクセル':>10} {'間隔':>4} {'旧実装[s]':>10} {'新(線分のみ)[s]':>16} "
+          f"{'新(点リスト)[s]':>16} {'倍率':>8} {'一致':>4} {'写像の違い[点]':>14}")
+
+    cases = [
+        (2, legacy_fill_paths, vectorized_fill_paths, {}),
+        (3, legacy_optimized_paths, vectorized_optimized_paths, {"duplicates": True}),
+    ]
+
+    for target in PIXEL_COUNTS:
+        img = make_test_image(target)
+        height, width = img.shape
+        # 描画範囲は元画像の8割（縮小して重複が出る場合）
+        area = (100, 50, int(width * 0.8), int(height * 0.8))
+        black = int(np.count_nonzero(img == 0))
+
+        for gap, legacy, vectorized, options in cases:
+            counts = resample_black_pixels(img, area[2], area[3])
+            _, runs_time = timed(extract_runs, counts, gap, 2, **options)
+            result, new_time = timed(vectorized, img, *area)
+            runs_time += timed(resample_black_pixels, img, area[2], area[3])[1]
+
+            if black <= LEGACY_LIMIT:
+                expected, legacy_time = timed(legacy, img, *area)
+                identical = "○" if expected == result else "×"
+                legacy_text = f"{legacy_time:>10.3f}"
+                ratio = f"{legacy_time / new_time:>7.1f}x"
+            else:
+                identical, legacy_text, ratio = "-", f"{'-':>10}", f"{'-':>8}"
+
+            # 一致しないときは、座標写像の違い（浮動小数点→整数）で動いた点の数を見る
+            print(f"{black:>10} {gap:>4} {legacy_text} {runs_time:>16.3f} {new_time:>16.3f} "
+                  f"{ratio} {identical:>4} {mapping_differences(img, area[2], area[3]):>14}")
+
+
+def make_fill_image(size, blobs=40):
+    """塗りつぶしの多い画像（黒い円がいくつか重なった2値画像）"""
+    rng = np.random.default_rng(0)
+    ys, xs = np.mgrid[:size, :size]
+    img = np.full((size, size), 255, dtype=np.uint8)
+    for cx, cy, radius in zip(rng.integers(0, size, blobs), rng.integers(0, size, blobs),
+                              rng.integers(size // 20, size // 6, blobs)):
+        img[(xs - cx) ** 2 + (ys - cy) ** 2 < radius ** 2] = 0
+    return img
+
+
+def bench_simplify():
+    print("\n一直線上の点の除去（塗りつぶしパス、間隔3・重複あり）")
+    print(f"{'画像':>6} {'パス数':>8} {'点数(前)':>10} {'点数(後)':>10} {'削減':>6} {'時間[s]':>8}")
+    for size in (500, 1000, 2000):
+        img = make_fill_image(size)
+        counts = resample_black_pixels(img, size, size)
+        rows, _, _, points = extract_runs(counts, gap=3, min_points=2, duplicates=True, return_points=True)
+        fill_paths = PathBuffer.from_runs(rows, points)
+        simplified, elapsed = timed(simplify_paths, fill_paths)
+        print(f"{size:>6} {len(fill_paths):>8} {fill_paths.total_points:>10} {simplified.total_points:>10} "
+              f"{fill_paths.total_points / max(simplified.total_points, 1):>5.1f}x {elapsed:>8.3f}")
+
+
+def bench_chain_runs():
+    print("\n蛇行連結によるペン上げ回数（塗りつぶしパス、間隔3・重複あり）")
+    print(f"{'画像':>6} {'ペン上げ(前)':>12} {'ペン上げ(後)':>12} {'削減':>6} {'時間[s]':>8}")
+    for size in (500, 1000, 2000):
+        img = make_fill_image(size)
+        counts = resample_black_pixels(img, size, size)
+        rows, starts, ends, points = extract_runs(counts, gap=3, min_points=2, duplicates=True,
+                                                  return_points=True)
+        chained, elapsed = timed(chain_runs, rows, starts, ends, points)
+        print(f"{size:>6} {len(rows):>12} {len(chained):>12} {len(rows) / max(len(chained), 1):>5.1f}x "
+              f"{elapsed:>8.3f}")
+
+
+def make_random_segments(count, size=4000, length=20):
+    """キャンバス全体に散らばった短い線分 count 本"""
+    rng = np.random.default_rng(0)
+    starts = rng.integers(0, size, (count, 2))
+    ends = starts + rng.integers(-length, length + 1, (count, 2))
+    return PathBuffer.from_lengths(np.stack([starts, ends], axis=1).reshape(-1, 2), np.full(count, 2))
+
+
+def bench_order_paths():
+    print("\nパスの並べ替え（ペン移動距離、反転あり）")
+    print(f"{'パス数':>8} {'元の順[px]':>12} {'最近傍[px]':>12} {'時間[s]':>8} {'2-opt後[px]':>12} {'時間[s]':>8}")
+    for count in (10**3, 10**4, 10**5):
+        segments = make_random_segments(count)
+        greedy, greedy_time = timed(order_paths, segments, time_limit=0)
+        refined, refined_time = timed(order_paths, segments, time_limit=2.0)
+        print(f"{count:>8} {travel_distance(segments):>12.0f} {travel_distance(greedy):>12.0f} {greedy_time:>8.2f} "
+              f"{travel_distance(refined):>12.0f} {refined_time:>8.2f}")
+
+
+def white_crossings(lines, black):
+    """白い画素を通るハッチング線の数（0 でなければ塗り範囲からはみ出している）"""
+    index, xs, ys = segment_pixels(lines.points.reshape(-1, 2, 2))
+    return len(np.unique(index[~black[ys, xs]]))
+
+
+def missed_pixels(lines, black, pen_width):
+    """
+    太さ pen_width のペンで線を引いたとき、どの線にも塗られない黒い画素の数
+
+    画素の中心が線から pen_width / 2 + 0.5（画素の半分）以内なら塗られたとみなす。
+    """
+    canvas = np.full(black.shape, 255, dtype=np.uint8)
+    index, xs, ys = segment_pixels(lines.points.reshape(-1, 2, 2))
+    canvas[ys, xs] = 0
+    distance = cv2.distanceTransform(canvas, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    return int(np.count_nonzero(black & (distance > pen_width / 2 + 0.5)))
+
+
+def bench_hatch_fill():
+    print("\nペン幅に合わせたハッチング（1000x1000）")
+    print(f"{'画像':>6} {'ペン幅':>6} {'角度':>6} {'線の数':>8} {'走査線比':>8} {'時間[s]':>8} {'白を通る線':>10} "
+          f"{'塗り残し[px]':>12}")
+    # 塗りつぶし画像と、幅2ピクセルの斜めの線（帯にまとめると白を通りやすい）
+    diagonal = np.full((1000, 1000), 255, dtype=np.uint8)
+    cv2.line(diagonal, (0, 100), (999, 700), 0, 2)
+    for name, img in (("塗り", make_fill_image(1000)), ("斜線", diagonal)):
+        counts = resample_black_pixels(img, 1000, 1000)
+        scanlines = len(extract_runs(counts, gap=2, min_points=2)[0])
+        for pen_width in (1, 3, 5, 8):
+            for angle in (0, 45):
+                lines, elapsed = timed(hatch_fill, img, 0, 0, 1000, 1000, pen_width, angle)
+                print(f"{name:>6} {pen_width:>6} {angle:>6} {len(lines):>8} "
+                      f"{scanlines / max(len(lines), 1):>7.1f}x {elapsed:>8.3f} {white_crossings(lines, counts > 0):>10} "
+                      f"{missed_pixels(lines, counts > 0, pen_width):>12}")
+
+
+def main():
+    bench_run_extraction()
+    bench_parallel_paths()
+    bench_simplify()
+    bench_chain_runs()
+    bench_order_paths()
+    bench_hatch_fill()
+
+
+if __name__ == "__main__":
+    main()
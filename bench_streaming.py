@@ -0,0 +1,51 @@
+import time
+from bench_binarize import make_test_image
+from binarize import parallel_binarize
+from paths import chain_runs, iter_band_runs, order_paths, parallel_extract_runs, simplify_paths
+from streaming import format_stream_report, stream_draw
+
+# pyautogui の代わりに、点の数に比例して待つだけの描画（実際の 0.002 秒/点の 1/20）
+SIMULATED_SECONDS_PER_POINT = 0.0001
+BAND_HEIGHT = 32
+ORDER_SECONDS = 0.1
+
+
+def simulated_draw(paths):
+    time.sleep(paths.total_points * SIMULATED_SECONDS_PER_POINT)
+
+
+def batch_paths(binary):
+    """全部のパスを作ってから並べる（従来の流れ）"""
+    height, width = binary.shape
+    rows, starts, ends, points = parallel_extract_runs(binary, width, height, gap=2, min_points=2)
+    return order_paths(simplify_paths(chain_runs(rows, starts, ends, points)))
+
+
+def band_chunks(binary):
+    """行の帯ごとにパスを作って並べ、出来た順に返す"""
+    height, width = binary.shape
+    for rows, starts, ends, points in iter_band_runs(binary, width, height, gap=2, min_points=2,
+                                                     band_height=BAND_HEIGHT):
+        yield order_paths(simplify_paths(chain_runs(rows, starts, ends, points)), time_limit=ORDER_SECONDS)
+
+
+def main():
+    for size in (1000, 2000):
+        img = make_test_image(size, size)
+        binary, _ = parallel_binarize(img, "sauvola", window=51)
+        print(f"\n{size}x{size} (塗りつぶし・蛇行連結, 帯 {BAND_HEIGHT}行)")
+
+        start = time.perf_counter()
+        paths = batch_paths(binary)
+        first_stroke = time.perf_counter() - start
+        simulated_draw(paths)
+        total = time.perf_counter() - start
+        print(f"  一括:           最初のストロークまで {first_stroke:.2f}秒, 全体 {total:.2f}秒 "
+              f"({len(paths)}パス, {paths.total_points}点)")
+
+        report = stream_draw(band_chunks(binary), simulated_draw)
+        print(f"  ストリーミング: {format_stream_report(report)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import time
+import cv2
+import numpy as np
+from strokes import group_strokes, stroke_pattern
+
+# ストローク数
+STROKE_COUNTS = [10**3, 10**4, 10**5]
+# 旧実装はこの本数までで計測する（それ以上は数分かかる）
+LEGACY_LIMIT = 10**4
+
+
+def legacy_group_strokes(strokes, connect_threshold=40.0):
+    """main.py の旧実装（毎回すべての未訪問ストロークを走査する）"""
+    visited = [False] * len(strokes)
+    ordered_groups = []
+
+    idx = 0
+    while idx < len(strokes):
+        try:
+            start_i = next(i for i, v in enumerate(visited) if not v)
+        except StopIteration:
+            break
+
+        visited[start_i] = True
+        sx, sy, ex, ey = strokes[start_i]
+        group = [(sx, sy, ex, ey)]
+        current_x, current_y = ex, ey
+
+        while True:
+            best_j = -1
+            best_flip = False
+            best_dist = 1e12
+
+            for j, v in enumerate(visited):
+                if v:
+                    continue
+                csx, csy, cex, cey = strokes[j]
+                d1 = ((current_x - csx) ** 2 + (current_y - csy) ** 2) ** 0.5
+                d2 = ((current_x - cex) ** 2 + (current_y - cey) ** 2) ** 0.5
+                if d1 < best_dist:
+                    best_dist = d1
+                    best_j = j
+                    best_flip = False
+                if d2 < best_dist:
+                    best_dist = d2
+                    best_j = j
+                    best_flip = True
+
+            if best_j == -1 or best_dist > connect_threshold:
+                break
+
+            visited[best_j] = True
+            nsx, nsy, nex, ney = strokes[best_j]
+            if best_flip:
+                nsx, nsy, nex, ney = nex, ney, nsx, nsy
+            group.append((nsx, nsy, nex, ney))
+            current_x, current_y = nex, ney
+
+        ordered_groups.append(group)
+        idx += 1
+
+    return ordered_groups
+
+
+def make_strokes(count, seed=0):
+    """create_stroke_pattern と同じ密度（12px 間隔・長さ5〜20px）のストローク"""
+    rng = np.random.default_rng(seed)
+    side = int(np.sqrt(count)) * 12
+    starts = rng.integers(0, side, (count, 2))
+    angles = rng.uniform(-np.pi, np.pi, count)
+    lengths = rng.integers(5, 21, count)
+    ends = starts + np.stack([np.cos(angles) * lengths, np.sin(angles) * lengths], axis=1).astype(int)
+    return [tuple(row) for row in np.concatenate([starts, ends], axis=1).tolist()]
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_group_strokes():
+    print("ストロークのグループ化（つなぐ距離 40px）")
+    print(f"{'本数':>8} {'グループ数':>10} {'旧実装[s]':>10} {'新実装[s]':>10} {'倍率':>8} {'一致':>4}")
+    for count in STROKE_COUNTS:
+        strokes = make_strokes(count)
+        groups, new_time = timed(group_strokes, strokes, 40.0)
+        if count <= LEGACY_LIMIT:
+            expected, legacy_time = timed(legacy_group_strokes, strokes, 40.0)
+            identical = "○" if expected == groups else "×"
+            legacy_text = f"{legacy_time:>10.3f}"
+            ratio = f"{legacy_time / new_time:>7.1f}x"
+        else:
+            identical, legacy_text, ratio = "-", f"{'-':>10}", f"{'-':>8}"
+        print(f"{count:>8} {len(groups):>10} {legacy_text} {new_time:>10.3f} {ratio} {identical:>4}")
+
+
+def legacy_stroke_pattern(img, draw_x1, draw_y1, draw_width, draw_height):
+    """main.create_stroke_pattern の旧実装（全解像度の float64 勾配と二重ループ）"""
+    img_height, img_width = img.shape
+    edges = cv2.Canny(img, 50, 150)
+    sobel_x = cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=3)
+    sobel_y = cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=3)
+    angles = np.arctan2(sobel_y, sobel_x)
+
+    strokes = []
+    step = 12
+    for y in range(0, img_height, step):
+        for x in range(0, img_width, step):
+            brightness = img[y, x]
+            if brightness < 180:
+                angle = angles[y, x]
+                stroke_length = int((255 - brightness) / 255 * 15) + 5
+                start_x = draw_x1 + int((x / img_width) * draw_width)
+                start_y = draw_y1 + int((y / img_height) * draw_height)
+                end_x = start_x + int(np.cos(angle) * stroke_length)
+                end_y = start_y + int(np.sin(angle) * stroke_length)
+                strokes.append((start_x, start_y, end_x, end_y))
+    return strokes
+
+
+def make_test_image(width, height):
+    """なめらかな濃淡のテスト画像"""
+    rng = np.random.default_rng(0)
+    noise = (rng.random((height, width)) * 255).astype(np.uint8)
+    return cv2.normalize(cv2.GaussianBlur(noise, (0, 0), 8), None, 0, 255, cv2.NORM_MINMAX)
+
+
+def bench_stroke_pattern():
+    print("\nストロークパターン生成（12px 間隔、描画範囲 1000x750）")
+    print(f"{'画像':>11} {'本数':>8} {'旧実装[s]':>10} {'新実装[s]':>10} {'倍率':>8} {'始点一致':>8}")
+    for width, height in ((1000, 750), (2000, 1500), (4000, 3000)):
+        img = make_test_image(width, height)
+        expected, legacy_time = timed(legacy_stroke_pattern, img, 0, 0, 1000, 750)
+        strokes, new_time = timed(stroke_pattern, img, 0, 0, 1000, 750)
+        # 終点は縮小画像の勾配を使うので向きが少し変わる
+        same_starts = "○" if np.array_equal(np.array(expected)[:, :2], strokes[:, :2]) else "×"
+        print(f"{width:>5}x{height:<5} {len(strokes):>8} {legacy_time:>10.3f} {new_time:>10.3f} "
+              f"{legacy_time / new_time:>7.1f}x {same_starts:>8}")
+
+
+def main():
+    bench_group_strokes()
+    bench_stroke_pattern()
+
+
+if __name__ == "__main__":
+    main()
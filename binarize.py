@@ -0,0 +1,286 @@
+from multiprocessing import cpu_count, shared_memory
+import cv2
+import numpy as np
+from paths import PARALLEL_MIN_PIXELS, get_pool
+
+# cv2.adaptiveThreshold に渡す近傍の大きさと定数（main5 の「適応的閾値」）
+ADAPTIVE_BLOCK_SIZE = 11
+ADAPTIVE_C = 2
+
+
+def otsu_threshold(histogram):
+    """
+    ヒストグラムから大津の閾値を求める（cv2.THRESH_OTSU と同じ値）
+
+    Args:
+        histogram: 256階調のヒストグラム
+
+    Returns:
+        閾値 (0-255)。この値以下が黒になる
+    """
+    hist = np.asarray(histogram, dtype=np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 0
+
+    prob = hist / total
+    levels = np.arange(256, dtype=np.float64)
+    q1 = np.cumsum(prob)
+    cumulative_mean = np.cumsum(prob * levels)
+    mean = cumulative_mean[-1]
+    q2 = 1.0 - q1
+
+    # クラス間分散 q1*q2*(mu1-mu2)^2 が最大になる最初の閾値
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mu1 = cumulative_mean / q1
+        mu2 = (mean - cumulative_mean) / q2
+        sigma = q1 * q2 * (mu1 - mu2) ** 2
+    valid = (q1 >= 1e-12) & (q2 >= 1e-12)
+    sigma = np.where(valid, sigma, 0.0)
+    return int(np.argmax(sigma))
+
+
+def _threshold_counts(values, upper):
+    """values <= t < upper を満たす要素数を全閾値 t (0-255) について数える"""
+    mask = values < upper
+    counts = np.bincount(values[mask], minlength=257)
+    counts -= np.bincount(upper[mask], minlength=257)
+    return np.cumsum(counts)[:256]
+
+
+def _neighbor_min(img, offsets):
+    """各画素について、同じ行の指定オフセットの画素値の最小値（範囲外は256）"""
+    height, width = img.shape
+    padded = np.full((height, width + 2 * max(abs(o) for o in offsets)), 256, dtype=np.int16)
+    pad = (padded.shape[1] - width) // 2
+    padded[:, pad:pad + width] = img
+    result = np.full((height, width), 256, dtype=np.int16)
+    for offset in offsets:
+        np.minimum(result, padded[:, pad + offset:pad + offset + width], out=result)
+    return result
+
+
+def threshold_sweep(img, gap=2, min_points=2):
+    """
+    全256通りのシンプル閾値と大津の閾値について、2値化せずにコストを求める
+
+    閾値 t では画素値 <= t が黒になる（cv2.THRESH_BINARY と同じ）。
+    黒ピクセル数はヒストグラムの累積和で正確に求まる。パス数は各行で
+    gap 以下の間隔の黒ピクセルをつないだ線分の数で、元画像の解像度で正確に数える。
+
+    Args:
+        img: グレースケール画像 (uint8)
+        gap: 同じパスとみなすX座標の差の上限
+        min_points: これより点の少ない線分はパスにしない（1か2）
+
+    Returns:
+        辞書 {"histogram", "black_pixels", "paths", "payload_bytes", "otsu", "total_pixels"}
+        各配列は閾値 (0-255) で添字付けされる
+    """
+    height, width = img.shape
+    histogram = np.bincount(img.ravel(), minlength=256)
+    black_pixels = np.cumsum(histogram)
+
+    # 画素pが線分の始点になるのは、p <= t かつ左の gap 画素が全て t より明るいとき
+    # つまり t が [v(p), 左gap画素の最小値) に入るとき。差分配列で全閾値を一度に数える
+    values = img.astype(np.int16)
+    left = _neighbor_min(img, range(-gap, 0))
+    paths = _threshold_counts(values.ravel(), left.ravel())
+
+    if min_points >= 2:
+        # 右の gap 画素も全て明るければ1点だけの線分なので除く
+        isolated = np.minimum(left, _neighbor_min(img, range(1, gap + 1)))
+        paths = paths - _threshold_counts(values.ravel(), isolated.ravel())
+
+    # main8 の "y:x1-x2,x3-x4;" 形式を想定した概算（1パスあたり 座標2つ＋区切り2文字）
+    digits = len(str(max(width - 1, 0)))
+    payload_bytes = paths * (2 * digits + 2)
+
+    return {
+        "histogram": histogram,
+        "black_pixels": black_pixels,
+        "paths": paths,
+        "payload_bytes": payload_bytes,
+        "otsu": otsu_threshold(histogram),
+        "total_pixels": height * width,
+    }
+
+
+def format_threshold_cost(sweep, threshold):
+    """閾値のコストを1行の文字列にする"""
+    black = int(sweep["black_pixels"][threshold])
+    ratio = black / max(sweep["total_pixels"], 1) * 100
+    return (f"黒ピクセル {black} ({ratio:.1f}%), パス約 {int(sweep['paths'][threshold])}, "
+            f"データ約 {int(sweep['payload_bytes'][threshold]) / 1024:.1f}KB")
+
+
+def print_threshold_costs(sweep, thresholds=(64, 96, 127, 160, 192)):
+    """代表的な閾値と大津の閾値のコスト一覧を表示"""
+    print(f"大津の閾値 {sweep['otsu']:>3}: {format_threshold_cost(sweep, sweep['otsu'])}")
+    for threshold in thresholds:
+        print(f"閾値 {threshold:>3}: {format_threshold_cost(sweep, threshold)}")
+
+
+def local_statistics(img, window):
+    """
+    積分画像から各画素の周囲 window x window の平均と標準偏差を求める
+
+    画像の端では窓を画像内に切り詰める。計算量は窓の大きさによらず画素あたり一定。
+
+    Returns:
+        (mean, std) いずれも float64
+    """
+    height, width = img.shape
+    radius = window // 2
+    total, squared = cv2.integral2(img, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    # 積分画像の端を複製しておくと、切り詰めた窓の四隅が全てスライスで取れる
+    size = 2 * radius + 1
+
+    def box(integral):
+        padded = np.pad(integral, radius, mode="edge")
+        result = padded[size:size + height, size:size + width] - padded[size:size + height, :width]
+        result -= padded[:height, size:size + width]
+        result += padded[:height, :width]
+        return result
+
+    y = np.arange(height)
+    x = np.arange(width)
+    rows = (np.minimum(y + radius + 1, height) - np.maximum(y - radius, 0)).astype(np.float64)
+    cols = (np.minimum(x + radius + 1, width) - np.maximum(x - radius, 0)).astype(np.float64)
+    inverse_area = 1.0 / np.outer(rows, cols)
+
+    mean = box(total)
+    mean *= inverse_area
+    variance = box(squared)
+    variance *= inverse_area
+    variance -= mean * mean
+    np.maximum(variance, 0.0, out=variance)
+    return mean, np.sqrt(variance, out=variance)
+
+
+def adaptive_binarize(img, window=25, method="sauvola", k=None, dynamic_range=128.0):
+    """
+    積分画像を使った局所適応2値化
+
+    Sauvola: T = m * (1 + k * (s / R - 1))   （kの既定値 0.2）
+    Niblack: T = m + k * s                  （kの既定値 -0.2）
+
+    Args:
+        img: グレースケール画像 (uint8)
+        window: 局所窓の一辺（ピクセル）
+        method: "sauvola" または "niblack"
+        k: 感度パラメータ（Noneなら手法ごとの既定値）
+        dynamic_range: Sauvolaの標準偏差の正規化定数 R
+
+    Returns:
+        2値画像 (uint8, 0/255)。画素値が閾値より大きければ白
+    """
+    mean, std = local_statistics(img, window)
+
+    if method == "sauvola":
+        k = 0.2 if k is None else k
+        threshold = mean * (1.0 + k * (std / dynamic_range - 1.0))
+    elif method == "niblack":
+        k = -0.2 if k is None else k
+        threshold = mean + k * std
+    else:
+        raise ValueError(f"不明な適応2値化の方法です: {method}")
+
+    return np.where(img > threshold, 255, 0).astype(np.uint8)
+
+
+def binarize_image(img, method="otsu", threshold=127, window=51):
+    """
+    main5 の2値化方法をまとめて呼び分ける
+
+    Args:
+        img: グレースケール画像 (uint8)
+        method: "simple", "otsu", "adaptive"（cv2 のガウス窓）, "sauvola", "niblack"
+        threshold: "simple" の閾値（この値より大きければ白）
+        window: Sauvola/Niblack法の窓サイズ
+
+    Returns:
+        2値画像 (uint8, 0/255)
+    """
+    if method == "otsu":
+        method, threshold = "simple", otsu_threshold(np.bincount(img.ravel(), minlength=256))
+    if method == "simple":
+        return cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY)[1]
+    if method == "adaptive":
+        return cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                     ADAPTIVE_BLOCK_SIZE, ADAPTIVE_C)
+    return adaptive_binarize(img, window, method)
+
+
+def _band_margin(method, window):
+    """帯の上下に余分に読む行数（各画素の閾値が見る近傍の半径）"""
+    if method == "adaptive":
+        return ADAPTIVE_BLOCK_SIZE // 2
+    if method in ("sauvola", "niblack"):
+        return window // 2
+    return 0
+
+
+def _binarize_band(args):
+    """帯ごとの2値化のワーカー: 共有メモリ上の画像の自分の帯を2値化して出力へ書く"""
+    source_name, target_name, shape, row_start, row_stop, method, threshold, window = args
+    source = shared_memory.SharedMemory(name=source_name)
+    target = shared_memory.SharedMemory(name=target_name)
+    try:
+        img = np.ndarray(shape, dtype=np.uint8, buffer=source.buf)
+        binary = np.ndarray(shape, dtype=np.uint8, buffer=target.buf)
+        margin = _band_margin(method, window)
+        low, high = max(row_start - margin, 0), min(row_stop + margin, shape[0])
+        # 窓は画像の端で切り詰めるので、余分に読んだ行の外は画像の端と同じ扱いになるが、
+        # 自分の行の閾値が見る窓は margin 行で収まる
+        binary[row_start:row_stop] = binarize_image(np.ascontiguousarray(img[low:high]), method, threshold,
+                                                    window)[row_start - low:row_stop - low]
+        del img, binary
+    finally:
+        source.close()
+        target.close()
+
+
+def parallel_binarize(img, method="otsu", threshold=127, window=51, workers=None):
+    """
+    binarize_image を行の帯ごとに並列実行する
+
+    各帯は閾値の近傍の半径だけ上下に余分に読んで2値化し、自分の行だけを共有メモリの
+    出力に書くので、結果は画像全体を1回で2値化した場合と一致する。大津の閾値は
+    画像全体のヒストグラムから先に決めて、全部の帯で同じ値を使う。
+
+    Args:
+        img: グレースケール画像 (uint8)
+        method, threshold, window: binarize_image と同じ
+        workers: プロセス数（Noneならコア数。小さな画像は1プロセスで処理）
+
+    Returns:
+        (2値画像, 使った閾値)。閾値は "simple" / "otsu" のときだけで、それ以外は None
+    """
+    if method == "otsu":
+        method, threshold = "simple", otsu_threshold(np.bincount(img.ravel(), minlength=256))
+    used_threshold = threshold if method == "simple" else None
+    height = img.shape[0]
+    if workers is None:
+        workers = cpu_count() if img.size >= PARALLEL_MIN_PIXELS else 1
+    workers = min(workers, height)
+    if workers <= 1:
+        return binarize_image(img, method, threshold, window), used_threshold
+
+    bounds = np.linspace(0, height, workers + 1).astype(np.int64).tolist()
+    source = shared_memory.SharedMemory(create=True, size=img.nbytes)
+    target = shared_memory.SharedMemory(create=True, size=img.nbytes)
+    try:
+        shared = np.ndarray(img.shape, dtype=np.uint8, buffer=source.buf)
+        shared[...] = img
+        tasks = [(source.name, target.name, img.shape, bounds[i], bounds[i + 1], method, threshold, window)
+                 for i in range(workers)]
+        get_pool(workers).map(_binarize_band, tasks)
+        binary = np.ndarray(img.shape, dtype=np.uint8, buffer=target.buf).copy()
+        del shared
+    finally:
+        for shm in (source, target):
+            shm.close()
+            shm.unlink()
+    return binary, used_threshold
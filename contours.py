@@ -0,0 +1,627 @@
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from paths import PathBuffer, get_pool
+
+# 8近傍を画面上の反時計回りに東から並べた (dx, dy)。findContours の境界追跡と同じ向き
+_RING = np.array([(1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1)])
+# 移動 (dx, dy) の (dy + 1) * 3 + (dx + 1) → _RING の番号
+_RING_INDEX = np.full(9, -1, dtype=np.int64)
+_RING_INDEX[(_RING[:, 1] + 1) * 3 + _RING[:, 0] + 1] = np.arange(8)
+
+# 帯の上下に余分に読む行数。境界追跡の1歩は3x3近傍で決まるので、
+# 帯の端から2行内側までは画像全体で追跡したときと同じ動きになる
+BAND_MARGIN = 2
+
+
+def _swept_neighbors():
+    """
+    前の点の方向 → 次の点の方向 の間で、境界追跡が調べて背景だと確かめた4近傍の番号
+
+    findContours は前の点の次から反時計回りに近傍を調べ、最初の前景画素へ進む。
+    その間に通った近傍はすべて背景なので、そのうち最初の4近傍（番号が偶数）を返す（なければ -1）。
+    """
+    table = np.full((8, 8), -1, dtype=np.int64)
+    for previous in range(8):
+        for following in range(8):
+            k = (previous + 1) % 8
+            while k != following and k != previous:
+                if k % 2 == 0:
+                    table[previous, following] = k
+                    break
+                k = (k + 1) % 8
+    return table
+
+
+_SWEPT_NEIGHBOR = _swept_neighbors()
+
+
+def adaptive_epsilon(areas, perimeters):
+    """
+    輪郭の大きさに応じた approxPolyDP の許容誤差（従来の main.py の描画時と同じ規則）
+
+    大きな輪郭は細部を残し（周長の 0.3%）、小さな輪郭ほど滑らかにする（最大 1.5%）。
+    """
+    ratio = np.where(areas > 5000, 0.003, np.where(areas > 1000, 0.007, 0.015))
+    return ratio * perimeters
+
+
+def _nearest_kept_ancestor(parents, keep):
+    """各輪郭の親を、keep が True の一番近い祖先（なければ -1）に付け替える"""
+    ancestors = parents.copy()
+    while True:
+        dropped = (ancestors >= 0) & ~keep[np.maximum(ancestors, 0)]
+        if not dropped.any():
+            return ancestors
+        ancestors[dropped] = parents[ancestors[dropped]]
+
+
+def _depths(parents):
+    """親の配列から入れ子の深さ（一番外側が 0）を求める"""
+    depths = np.zeros(len(parents), dtype=np.int32)
+    ancestors = parents.copy()
+    while (ancestors >= 0).any():
+        inside = ancestors >= 0
+        depths += inside
+        ancestors[inside] = parents[ancestors[inside]]
+    return depths
+
+
+class ContourSet:
+    """
+    輪郭ごとの面積・周長・簡略化した多角形と、RETR_TREE の親子関係をまとめて持つ
+
+    幾何量は extract_contours で1輪郭につき1回だけ計算し、プレビューと描画の
+    両方で同じ多角形を使う。並べ替え・間引きをしても親子関係は保たれる
+    （親が除かれた輪郭は、残っている一番近い祖先の子になる）。
+
+    Attributes:
+        polygons: 簡略化した多角形の PathBuffer（画像座標、最初の点に戻って閉じる）
+        areas: 各輪郭の面積（float64）
+        perimeters: 各輪郭の周長（float64）
+        point_counts: 簡略化前の点数
+        parents: 親輪郭の番号（このセット内の番号、なければ -1）
+        depths: 入れ子の深さ（一番外側が 0、穴が 1、穴の中の輪郭が 2 ...）
+        image_size: 輪郭を取った画像の (幅, 高さ)
+    """
+
+    def __init__(self, polygons, areas, perimeters, point_counts, parents, image_size):
+        self.polygons = polygons
+        self.areas = areas
+        self.perimeters = perimeters
+        self.point_counts = point_counts
+        self.parents = parents
+        self.depths = _depths(parents)
+        self.image_size = image_size
+
+    def __len__(self):
+        return len(self.areas)
+
+    def select(self, indices):
+        """指定した番号（またはbool配列）の輪郭を、その順に取り出す"""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        keep = np.zeros(len(self), dtype=bool)
+        keep[indices] = True
+        position = np.full(len(self), -1, dtype=np.int64)
+        position[indices] = np.arange(len(indices))
+
+        ancestors = _nearest_kept_ancestor(self.parents, keep)[indices]
+        parents = np.where(ancestors >= 0, position[np.maximum(ancestors, 0)], -1)
+        return ContourSet(self.polygons.select(indices), self.areas[indices], self.perimeters[indices],
+                          self.point_counts[indices], parents, self.image_size)
+
+    def prune(self, max_depth=None, min_area=0.0):
+        """max_depth より深い輪郭と、面積が min_area 未満の輪郭を除く"""
+        keep = self.areas >= min_area
+        if max_depth is not None:
+            keep &= self.depths <= max_depth
+        return self.select(keep)
+
+    def order(self, by="area"):
+        """
+        輪郭を並べ替える
+
+        Args:
+            by: "area" なら面積の大きい順（従来の並び）、"tree" なら外側の輪郭の直後に
+                その内側の輪郭が続くように、親子をたどりながら兄弟を面積の大きい順に並べる
+        """
+        by_area = np.argsort(-self.areas, kind="stable")
+        if by == "area":
+            return self.select(by_area)
+
+        children = [[] for _ in range(len(self))]
+        roots = []
+        for index in by_area.tolist():
+            parent = int(self.parents[index])
+            (roots if parent < 0 else children[parent]).append(index)
+
+        order = []
+        stack = roots[::-1]
+        while stack:
+            index = stack.pop()
+            order.append(index)
+            stack.extend(children[index][::-1])
+        return self.select(np.array(order, dtype=np.int64))
+
+    def to_paths(self, draw_x1, draw_y1, draw_width, draw_height):
+        """多角形を描画座標へまとめて写した PathBuffer を返す"""
+        width, height = self.image_size
+        return self.polygons.transform(scale=(draw_width / width, draw_height / height),
+                                       offset=(draw_x1, draw_y1))
+
+    def summary(self):
+        """輪郭数・入れ子の深さ・簡略化前後の点数を1行の文字列にする"""
+        if not len(self):
+            return "輪郭数 0"
+        return (f"輪郭数 {len(self)} (入れ子の深さ最大 {int(self.depths.max())}), "
+                f"面積 {self.areas.min():.1f}〜{self.areas.max():.1f}, "
+                f"点数 {int(self.point_counts.sum())} → {self.polygons.total_points}")
+
+
+def _next_index(offsets):
+    """各点の次の点の通し番号（閉じた輪郭として、最後の点の次は最初の点）"""
+    lengths = np.diff(offsets)
+    following = np.arange(1, int(offsets[-1]) + 1)
+    following[offsets[1:][lengths > 0] - 1] = offsets[:-1][lengths > 0]
+    return following
+
+
+def _previous_index(offsets):
+    """各点の前の点の通し番号（最初の点の前は最後の点）"""
+    lengths = np.diff(offsets)
+    previous = np.arange(-1, int(offsets[-1]) - 1)
+    previous[offsets[:-1][lengths > 0]] = offsets[1:][lengths > 0] - 1
+    return previous
+
+
+def _rotate_chains(chains, shift):
+    """各輪郭の画素列を shift 点ずつ回して、shift 番目の点から始まるようにする"""
+    lengths = chains.lengths()
+    starts = np.repeat(chains.offsets[:-1], lengths)
+    local = np.arange(chains.total_points) - starts
+    take = starts + (local + np.repeat(shift, lengths)) % np.repeat(np.maximum(lengths, 1), lengths)
+    return PathBuffer(chains.points[take], chains.offsets.copy())
+
+
+def _canonical_rotation(chains, width):
+    """
+    輪郭の画素列を、始点が追跡の仕方によらないように回す
+
+    各輪郭を一番上の行の一番左の画素から始まるように回し（同じ画素を複数回通るなら
+    そこから読んだ列が辞書順で最小になる所から）、画像全体で追跡しても帯ごとに追跡して
+    つないでも同じ画素列にする。
+
+    Returns:
+        (回した PathBuffer, 並べ替えのキー (始点の位置, 長さ, 2点目の位置) の (N, 3) 配列)
+    """
+    lengths = chains.lengths()
+    keys = chains.points[:, 1].astype(np.int64) * width + chains.points[:, 0]
+    starts = chains.offsets[:-1]
+    minimum = np.minimum.reduceat(keys, starts)
+    path_index = chains.path_index()
+    candidates = np.flatnonzero(keys == minimum[path_index])
+    candidate_paths, first, count = np.unique(path_index[candidates], return_index=True, return_counts=True)
+    shift = candidates[first] - starts[candidate_paths]
+
+    # 同じ画素を複数回通る輪郭だけ、候補の回し方を比べる
+    for path in candidate_paths[count > 1].tolist():
+        start, stop = int(starts[path]), int(starts[path] + lengths[path])
+        ring = keys[start:stop]
+        options = candidates[(candidates >= start) & (candidates < stop)] - start
+        shift[path] = min(options.tolist(), key=lambda k: np.roll(ring, -k).tolist())
+
+    rotated = _rotate_chains(chains, shift)
+    keys = rotated.points[:, 1].astype(np.int64) * width + rotated.points[:, 0]
+    return rotated, np.stack([keys[starts], lengths, keys[np.where(lengths > 1, starts + 1, starts)]], axis=1)
+
+
+def _compress_chains(chains):
+    """画素列から、進む向きが変わる点と始点だけを残す（CHAIN_APPROX_SIMPLE 相当）"""
+    points = chains.points.astype(np.int64)
+    outgoing = points[_next_index(chains.offsets)] - points
+    incoming = points - points[_previous_index(chains.offsets)]
+    keep = (outgoing != incoming).any(axis=1)
+    keep[chains.offsets[:-1]] = True
+    return PathBuffer.from_lengths(chains.points[keep], np.add.reduceat(keep.astype(np.int64), chains.offsets[:-1]))
+
+
+def _polygon_geometry(polygons):
+    """
+    閉じた多角形の符号付き面積と周長を全輪郭まとめて求める
+    （contourArea(oriented=True) / arcLength と同じ値）
+    """
+    points = polygons.points.astype(np.float64)
+    following = points[_next_index(polygons.offsets)]
+    starts = polygons.offsets[:-1]
+    cross = points[:, 0] * following[:, 1] - following[:, 0] * points[:, 1]
+    areas = np.add.reduceat(cross, starts) / 2
+    perimeters = np.add.reduceat(np.hypot(*(following - points).T), starts)
+    return areas, perimeters
+
+
+def _contour_geometry(chains, width, min_area, epsilon, min_vertices):
+    """
+    輪郭の画素列ごとに、向き・面積・周長と簡略化した多角形を求める
+
+    どれも輪郭ごとに閉じた計算なので、帯ごとのワーカーで求めても画像全体で
+    求めても同じ値になる。
+
+    Returns:
+        辞書。keys は並べ替えのキー、outer は外形か（findContours の外形は符号付き面積が
+        0 以下、穴は正）、areas / perimeters / point_counts は面積・周長・簡略化前の点数、
+        kept は残す輪郭か、polygons は残す輪郭の多角形（最初の点に戻って閉じる）
+    """
+    if not len(chains):
+        return {"keys": np.zeros((0, 3), dtype=np.int64), "outer": np.zeros(0, dtype=bool),
+                "areas": np.zeros(0), "perimeters": np.zeros(0), "point_counts": np.zeros(0, dtype=np.int64),
+                "kept": np.zeros(0, dtype=bool), "polygons": PathBuffer()}
+    chains, keys = _canonical_rotation(chains, width)
+    outlines = _compress_chains(chains)
+    signed_areas, perimeters = _polygon_geometry(outlines)
+    areas = np.abs(signed_areas)
+    epsilons = epsilon(areas, perimeters) if callable(epsilon) else epsilon * perimeters
+
+    kept = areas > min_area
+    polygons = []
+    for index in np.flatnonzero(kept).tolist():
+        polygon = cv2.approxPolyDP(outlines[index], float(epsilons[index]), True).reshape(-1, 2)
+        if len(polygon) < min_vertices:
+            kept[index] = False
+            continue
+        polygons.append(np.concatenate([polygon, polygon[:1]]))
+    return {"keys": keys, "outer": signed_areas <= 0, "areas": areas, "perimeters": perimeters,
+            "point_counts": outlines.lengths(), "kept": kept, "polygons": PathBuffer.from_lists(polygons)}
+
+
+def _concatenate_geometry(parts):
+    """_contour_geometry の結果を順に連結する"""
+    return {key: (PathBuffer.concatenate([part[key] for part in parts]) if key == "polygons"
+                  else np.concatenate([part[key] for part in parts])) for key in parts[0]}
+
+
+def _contour_set(geometry, parents, image_size):
+    """
+    輪郭の幾何量と親の番号から ContourSet を作る
+
+    輪郭は始点の位置・長さ・2点目の順に並べ（追跡の仕方によらない並び）、
+    残さない輪郭を除いて親を残っている一番近い祖先に付け替える。
+    """
+    keys, kept = geometry["keys"], geometry["kept"]
+    order = np.lexsort((keys[:, 2], keys[:, 1], keys[:, 0]))
+    indices = order[kept[order]]
+    position = np.full(len(kept), -1, dtype=np.int64)
+    position[indices] = np.arange(len(indices))
+    ancestors = _nearest_kept_ancestor(parents, kept)[indices]
+    parents = np.where(ancestors >= 0, position[np.maximum(ancestors, 0)], -1)
+    polygon_index = np.cumsum(kept) - 1
+    return ContourSet(geometry["polygons"].select(polygon_index[indices]), geometry["areas"][indices],
+                      geometry["perimeters"][indices], geometry["point_counts"][indices], parents, image_size)
+
+
+def _swept_cells(chains, row_offset, label_height):
+    """
+    輪郭の各点について、境界追跡が調べた背景側の4近傍をラベル画像の位置で求める
+
+    findContours は前の点の次から反時計回りに近傍を調べて次の点へ進むので、その間に
+    通った近傍は背景で、輪郭の向こう側（外形なら外、穴なら穴の中）の成分に属する。
+
+    Args:
+        chains: 輪郭の画素列（画像座標）
+        row_offset: 画像の行 → ラベル画像の行 に足す値（ラベル画像は左右に1列ずつ足してある）
+        label_height: ラベル画像の行数
+
+    Returns:
+        (近傍が取れた点か, 点の (行, 列), 近傍の (行, 列))
+    """
+    points = chains.points.astype(np.int64)
+    step = lambda other: _RING_INDEX[(other[:, 1] - points[:, 1] + 1) * 3 + other[:, 0] - points[:, 0] + 1]
+    previous = step(points[_previous_index(chains.offsets)])
+    following = step(points[_next_index(chains.offsets)])
+    # 1画素だけの輪郭は前後の点がないので、左の近傍を見る
+    single = np.repeat(chains.lengths() == 1, chains.lengths())
+    swept = np.where(single, 4, _SWEPT_NEIGHBOR[np.maximum(previous, 0), np.maximum(following, 0)])
+    rows, cols = points[:, 1] + row_offset, points[:, 0] + 1
+    offset = _RING[np.maximum(swept, 0)]
+    # ラベル画像の外にはみ出す近傍（帯の端の行の点）は使わない
+    neighbor_rows = rows + offset[:, 1]
+    valid = (swept >= 0) & (neighbor_rows >= 0) & (neighbor_rows < label_height)
+    return valid, (rows, cols), (np.clip(neighbor_rows, 0, label_height - 1), cols + offset[:, 0])
+
+
+def _first_valid(valid, starts, stops):
+    """各区間 [start, stop) で最初に valid な点の番号（なければ -1）"""
+    candidates = np.flatnonzero(valid)
+    position = np.searchsorted(candidates, starts)
+    found = candidates[np.minimum(position, max(len(candidates) - 1, 0))] if len(candidates) else starts
+    return np.where((position < len(candidates)) & (found < stops), found, -1)
+
+
+def _move_keys(points, following, width):
+    """画素 points から following への1歩を整数で表す（帯の継ぎ目で断片を対応づけるキー）"""
+    direction = (following[:, 1] - points[:, 1] + 1) * 3 + following[:, 0] - points[:, 0] + 1
+    return (points[:, 1].astype(np.int64) * width + points[:, 0]) * 9 + direction
+
+
+def _trace_band(binary_img, row_start, row_stop, min_area, epsilon, min_vertices):
+    """
+    行 [row_start, row_stop) の帯の輪郭を追跡し、帯の中の連結成分にラベルを付ける
+
+    上下に BAND_MARGIN 行ずつ余分に読んで追跡し、帯の行に収まる輪郭はそのまま幾何量まで
+    求め、帯の外へはみ出す輪郭は帯の行にある部分（断片）に切って返す。断片には帯へ入る1歩と
+    出る1歩のキーを付け、隣の帯の断片と継ぎ目でつなげるようにする。
+    連結成分のラベルは、隣の帯と共有する行（row_start と row_stop）のものも返し、
+    帯をまたぐ成分を後でまとめられるようにする。
+
+    Returns:
+        辞書。closed は帯に収まる輪郭の _contour_geometry の結果、pieces は断片の PathBuffer、
+        *_labels はそれぞれの (前景, 背景) の帯内ラベル、entries / exits は断片の継ぎ目のキー、
+        fg_count / bg_count はラベルの数、top / bottom は共有する行の (前景, 背景) ラベル、
+        outside は画像の外の背景のラベル
+    """
+    height, width = binary_img.shape
+    low, high = max(row_start - BAND_MARGIN, 0), min(row_stop + BAND_MARGIN, height)
+    contours, _ = cv2.findContours(binary_img[low:high], cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
+
+    # 左右と、画像の上端・下端に当たる側にだけ背景を1画素足してラベルを付ける
+    top, bottom = int(low == 0), int(high == height)
+    foreground = np.zeros((high - low + top + bottom, width + 2), dtype=np.uint8)
+    foreground[top:top + high - low, 1:-1] = binary_img[low:high] != 0
+    fg_count, fg_labels = cv2.connectedComponents(foreground, connectivity=8)
+    bg_count, bg_labels = cv2.connectedComponents(1 - foreground, connectivity=4)
+    row_offset = top - low
+
+    band = PathBuffer.from_lists(contours)
+    band.points[:, 1] += low
+    lengths = band.lengths()
+    inside = (band.points[:, 1] >= row_start) & (band.points[:, 1] < row_stop)
+    inside_count = np.add.reduceat(inside.astype(np.int64), band.offsets[:-1]) if len(band) else lengths
+    closed = inside_count == lengths
+    crossing = (inside_count > 0) & ~closed
+
+    # はみ出す輪郭は帯の外の点から始まるように回して、帯の中の連続部分を切り出す
+    path_index = band.path_index()
+    outside_first = np.unique(path_index[~inside], return_index=True)
+    shift = np.zeros(len(band), dtype=np.int64)
+    shift[outside_first[0]] = np.flatnonzero(~inside)[outside_first[1]] - band.offsets[outside_first[0]]
+    band = _rotate_chains(band, np.where(crossing, shift, 0))
+    inside = (band.points[:, 1] >= row_start) & (band.points[:, 1] < row_stop)
+    valid, cells, neighbors = _swept_cells(band, row_offset, len(bg_labels))
+
+    point_crossing = np.repeat(crossing, lengths)
+    previous_inside = inside[_previous_index(band.offsets)]
+    next_inside = inside[_next_index(band.offsets)]
+    piece_starts = np.flatnonzero(point_crossing & inside & ~previous_inside)
+    piece_stops = np.flatnonzero(point_crossing & inside & ~next_inside) + 1
+    following = _next_index(band.offsets)
+
+    closed_starts = band.offsets[:-1][closed]
+    take_closed = np.repeat(closed, lengths)
+    piece_lengths = piece_stops - piece_starts
+    piece_take = (np.repeat(piece_starts, piece_lengths) + np.arange(int(piece_lengths.sum()))
+                  - np.repeat(np.cumsum(piece_lengths) - piece_lengths, piece_lengths))
+
+    # ラベルは各輪郭・断片で背景側の近傍が取れた最初の点で読む
+    def labels_at(first):
+        found, first = first >= 0, np.maximum(first, 0)
+        return np.stack([np.where(found, fg_labels[cells[0][first], cells[1][first]], -1),
+                         np.where(found, bg_labels[neighbors[0][first], neighbors[1][first]], -1)], axis=1)
+
+    shared_row = lambda row: (np.stack([fg_labels[row + row_offset], bg_labels[row + row_offset]])
+                              if row < height else None)
+    return {
+        "closed": _contour_geometry(PathBuffer.from_lengths(band.points[take_closed], lengths[closed]),
+                                    width, min_area, epsilon, min_vertices),
+        "closed_labels": labels_at(_first_valid(valid, closed_starts, closed_starts + lengths[closed])),
+        "pieces": PathBuffer.from_lengths(band.points[piece_take], piece_lengths),
+        "piece_labels": labels_at(_first_valid(valid, piece_starts, piece_stops)),
+        "entries": _move_keys(band.points[piece_starts - 1], band.points[piece_starts], width),
+        "exits": _move_keys(band.points[piece_stops - 1], band.points[following[piece_stops - 1]], width),
+        "fg_count": fg_count,
+        "bg_count": bg_count,
+        "top": shared_row(row_start),
+        "bottom": shared_row(row_stop),
+        "outside": int(bg_labels[0, 0]),
+    }
+
+
+def _trace_band_task(args):
+    """帯ごとの輪郭追跡のワーカー: 共有メモリ上の2値画像から自分の帯を処理する"""
+    shm_name, shape, row_start, row_stop, min_area, epsilon, min_vertices = args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        binary_img = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        result = _trace_band(binary_img, row_start, row_stop, min_area, epsilon, min_vertices)
+        del binary_img
+    finally:
+        shm.close()
+    return result
+
+
+def _stitch_pieces(pieces, entries, exits):
+    """
+    帯の継ぎ目を出る1歩と入る1歩が一致する断片をつないで、閉じた輪郭の画素列にする
+
+    Returns:
+        (輪郭の画素列の PathBuffer, 各輪郭を作った断片の番号のリスト)
+    """
+    if not len(pieces):
+        return PathBuffer(), []
+    order = np.argsort(entries, kind="stable")
+    if (np.diff(entries[order]) == 0).any():
+        raise RuntimeError("帯の継ぎ目で断片の対応が一意に決まりません")
+    position = np.minimum(np.searchsorted(entries[order], exits), len(entries) - 1)
+    if (entries[order[position]] != exits).any():
+        raise RuntimeError("帯の継ぎ目でつながらない断片があります")
+    following = order[position].tolist()
+
+    used = np.zeros(len(pieces), dtype=bool)
+    cycles = []
+    for start in range(len(pieces)):
+        if used[start]:
+            continue
+        cycle, piece = [], start
+        while not used[piece]:
+            used[piece] = True
+            cycle.append(piece)
+            piece = following[piece]
+        if piece != start:
+            raise RuntimeError("帯の継ぎ目でつないだ輪郭が閉じません")
+        cycles.append(cycle)
+    return PathBuffer.from_lists([pieces.select(cycle).points for cycle in cycles]), cycles
+
+
+def _merge_band_components(results):
+    """
+    帯ごとの連結成分のラベルを、共有する行で同じ画素に付いたもの同士まとめる
+
+    Returns:
+        (前景の通し番号 → 代表番号, 背景の通し番号 → 代表番号, 画像の外の背景の代表番号,
+         各帯の前景ラベルの通し番号の始まり, 背景の始まり)
+    """
+    fg_start = np.cumsum([0] + [result["fg_count"] for result in results])
+    bg_start = np.cumsum([0] + [result["bg_count"] for result in results])
+
+    def roots(count, pairs):
+        root = np.arange(count)
+        if len(pairs):
+            pairs = np.unique(pairs, axis=0)
+            while True:
+                low = np.minimum(root[pairs[:, 0]], root[pairs[:, 1]])
+                before = root.copy()
+                np.minimum.at(root, pairs[:, 0], low)
+                np.minimum.at(root, pairs[:, 1], low)
+                root = root[root]
+                if np.array_equal(root, before):
+                    break
+        while not np.array_equal(root, root[root]):
+            root = root[root]
+        return root
+
+    fg_pairs, bg_pairs = [], []
+    for k in range(len(results) - 1):
+        upper, lower = results[k]["bottom"], results[k + 1]["top"]
+        for kind, pairs, start in ((0, fg_pairs, fg_start), (1, bg_pairs, bg_start)):
+            # 背景のラベル画像では前景の画素が 0、前景のラベル画像では背景の画素が 0
+            both = (upper[kind] > 0) & (lower[kind] > 0)
+            pairs.append(np.stack([upper[kind][both] + start[k], lower[kind][both] + start[k + 1]], axis=1))
+    # 画像の外（左右に足した列）はどの帯でも同じ背景
+    bg_pairs.append(np.array([[results[0]["outside"], result["outside"] + bg_start[k]]
+                              for k, result in enumerate(results)]))
+
+    fg_root = roots(int(fg_start[-1]), np.concatenate(fg_pairs).astype(np.int64).reshape(-1, 2))
+    bg_root = roots(int(bg_start[-1]), np.concatenate(bg_pairs).astype(np.int64).reshape(-1, 2))
+    return fg_root, bg_root, int(bg_root[results[0]["outside"]]), fg_start, bg_start
+
+
+def _component_parents(components, backgrounds, outer, outside, fg_count, bg_count):
+    """
+    輪郭ごとの (前景の成分 C, 背景の成分 B) と向きから RETR_TREE と同じ親子関係を求める
+
+    外形の親は B を穴として囲む輪郭（B が画像の外なら -1）、穴の親は C の外形になる。
+    """
+    outer_of = np.full(fg_count, -1, dtype=np.int64)
+    outer_of[components[outer]] = np.flatnonzero(outer)
+    hole_of = np.full(bg_count, -1, dtype=np.int64)
+    hole_of[backgrounds[~outer]] = np.flatnonzero(~outer)
+    parents = np.where(outer, hole_of[backgrounds], outer_of[components])
+    parents[outer & (backgrounds == outside)] = -1
+    return parents
+
+
+def _contours_banded(binary_img, workers, min_area, epsilon, min_vertices):
+    """
+    2値画像を横の帯に分けて並列に輪郭を追跡し、継ぎ目をまたぐ輪郭をつなぐ
+
+    各帯は自分の行に収まる輪郭の幾何量と連結成分のラベルを求め、親プロセスは継ぎ目で
+    断片をつないだ輪郭の幾何量を求め、共有する行で連結成分をまとめて親子関係を組み立てる。
+
+    Returns:
+        (_contour_geometry の結果, 親の番号)。_contours_whole と並びだけが違う同じ輪郭になる
+    """
+    height, width = binary_img.shape
+    bounds = np.linspace(0, height, workers + 1).astype(np.int64).tolist()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(binary_img.nbytes, 1))
+    try:
+        shared = np.ndarray(binary_img.shape, dtype=np.uint8, buffer=shm.buf)
+        shared[...] = binary_img
+        tasks = [(shm.name, binary_img.shape, bounds[i], bounds[i + 1], min_area, epsilon, min_vertices)
+                 for i in range(workers)]
+        results = get_pool(workers).map(_trace_band_task, tasks)
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+
+    fg_root, bg_root, outside, fg_start, bg_start = _merge_band_components(results)
+
+    # 帯内ラベルを通し番号の代表に直す（-1 は背景側の近傍が取れなかった輪郭・断片）
+    def global_labels(key):
+        labels = []
+        for k, result in enumerate(results):
+            local = result[key]
+            labels.append(np.where(local >= 0, np.stack([fg_root[np.maximum(local[:, 0], 0) + fg_start[k]],
+                                                           bg_root[np.maximum(local[:, 1], 0) + bg_start[k]]],
+                                                          axis=1), -1))
+        return np.concatenate(labels).reshape(-1, 2)
+
+    stitched, cycles = _stitch_pieces(PathBuffer.concatenate([result["pieces"] for result in results]),
+                                      np.concatenate([result["entries"] for result in results]),
+                                      np.concatenate([result["exits"] for result in results]))
+    piece_labels = global_labels("piece_labels")
+    stitched_labels = np.array([next((piece_labels[piece] for piece in cycle if piece_labels[piece, 0] >= 0),
+                                     (-1, -1)) for cycle in cycles], dtype=np.int64).reshape(-1, 2)
+    labels = np.concatenate([global_labels("closed_labels"), stitched_labels])
+    if (labels < 0).any():
+        raise RuntimeError("輪郭の背景側の画素が見つかりません")
+
+    geometry = _concatenate_geometry([result["closed"] for result in results]
+                                     + [_contour_geometry(stitched, width, min_area, epsilon, min_vertices)])
+    return geometry, _component_parents(labels[:, 0], labels[:, 1], geometry["outer"], outside,
+                                        len(fg_root), len(bg_root))
+
+
+def _contours_whole(binary_img, min_area, epsilon, min_vertices):
+    """画像全体を1回で追跡する（_contours_banded と同じ形で返す）"""
+    width = binary_img.shape[1]
+    contours, hierarchy = cv2.findContours(binary_img, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)
+    parents = hierarchy[0][:, 3].astype(np.int64) if contours else np.zeros(0, dtype=np.int64)
+    return _contour_geometry(PathBuffer.from_lists(contours), width, min_area, epsilon, min_vertices), parents
+
+
+def extract_contours(binary_img, min_area=50, epsilon=0.005, min_vertices=3, workers=1):
+    """
+    2値画像の輪郭を RETR_TREE で取り、面積・周長・簡略化した多角形を1回ずつ計算する
+
+    workers を2以上にすると横の帯に分けて並列に追跡し、帯の中の輪郭の幾何量もワーカーで
+    求める。継ぎ目をまたぐ輪郭はつないでから同じ処理をするので、結果は1プロセスで
+    処理した場合と一致する。findContours 自体は速いので、帯に分けて得をするのは
+    コア数が多く画像が大きいときだけ（bench_bands.py）。
+
+    Args:
+        binary_img: 2値画像 (uint8)
+        min_area: これ以下の面積の輪郭は除く
+        epsilon: approxPolyDP の許容誤差。数値なら周長に対する比、
+                 関数なら (areas, perimeters) から許容誤差の配列を返すもの（adaptive_epsilon など。
+                 帯に分けるときはワーカーへ渡すのでモジュールの関数にする）
+        min_vertices: 簡略化後にこれより頂点の少ない輪郭は除く
+        workers: 帯の数＝プロセス数（1なら画像全体を1回で追跡する）
+
+    Returns:
+        ContourSet（並びは各輪郭の一番上・一番左の画素の順。order で並べ替える）
+    """
+    height, width = binary_img.shape
+    workers = min(workers, height // (2 * BAND_MARGIN + 1))
+
+    result = None
+    if workers > 1:
+        try:
+            result = _contours_banded(binary_img, workers, min_area, epsilon, min_vertices)
+        except RuntimeError as error:
+            print(f"帯ごとの輪郭追跡をやめて画像全体で追跡します: {error}")
+    if result is None:
+        result = _contours_whole(binary_img, min_area, epsilon, min_vertices)
+    geometry, parents = result
+    return _contour_set(geometry, parents, (width, height))
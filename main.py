@@ -6,6 +6,10 @@ import random
 import threading
 import sys
 import msvcrt
+from contours import adaptive_epsilon, extract_contours
+from dithering import error_diffusion, weighted_voronoi_stipple
+from paths import draw_paths_preview, order_paths
+from strokes import flow_streamlines, group_strokes, stroke_pattern
 
 
 def get_drawing_area():
@@ -79,19 +83,7 @@ def create_hatching_pattern(img, draw_x1, draw_y1, draw_width, draw_height):
     target_h = max(1, int(draw_height // scale))
 
     resized = cv2.resize(blurred, (target_w, target_h), interpolation=cv2.INTER_AREA)
-    work = resized.astype(np.float32) / 255.0
-
-    for y in range(target_h - 1):
-        row = work[y]
-        for x in range(1, target_w - 1):
-            old = row[x]
-            new = 0.0 if old < 0.5 else 1.0
-            row[x] = new
-            err = old - new
-            work[y, x + 1] = np.clip(work[y, x + 1] + err * (7.0 / 16.0), 0.0, 1.0)
-            work[y + 1, x - 1] = np.clip(work[y + 1, x - 1] + err * (3.0 / 16.0), 0.0, 1.0)
-            work[y + 1, x] = np.clip(work[y + 1, x] + err * (5.0 / 16.0), 0.0, 1.0)
-            work[y + 1, x + 1] = np.clip(work[y + 1, x + 1] + err * (1.0 / 16.0), 0.0, 1.0)
+    work = error_diffusion(resized, clip=True, midpoint_to_white=True)
 
     binary = (work < 0.5).astype(np.uint8)
 
@@ -121,49 +113,40 @@ def create_hatching_pattern(img, draw_x1, draw_y1, draw_width, draw_height):
     return drawing_points
 
 
-def create_stroke_pattern(img, draw_x1, draw_y1, draw_width, draw_height):
-    """ストローク（線画）パターンを生成"""
-    img_height, img_width = img.shape
-
-    # エッジ検出
-    edges = cv2.Canny(img, 50, 150)
-
-    # Sobelフィルタで方向を計算
-    sobel_x = cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=3)
-    sobel_y = cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=3)
-
-    # 勾配の角度を計算
-    angles = np.arctan2(sobel_y, sobel_x)
-
-    strokes = []
-    step = 12
-
-    print("ストロークパターンを生成中...")
+def create_stipple_pattern(img, draw_x1, draw_y1, draw_width, draw_height, n_points):
+    """重み付きボロノイ点描で、指定した点数ちょうどの点を生成"""
+    # 描画範囲の1ピクセル＝作業画像の1ピクセルとして緩和する
+    work = cv2.resize(img, (int(draw_width), int(draw_height)), interpolation=cv2.INTER_AREA)
+    work = cv2.GaussianBlur(work, (3, 3), 0)
 
-    for y in range(0, img_height, step):
-        for x in range(0, img_width, step):
-            # 明度チェック
-            brightness = img[y, x] if y < img_height and x < img_width else 255
+    print(f"点を配置中... ({n_points}点)")
+    points = weighted_voronoi_stipple(work, n_points)
 
-            # 暗い部分のみストロークを描画
-            if brightness < 180:
-                # エッジの方向に沿ったストローク
-                angle = angles[y, x] if y < img_height and x < img_width else 0
+    xs = np.rint(points[:, 0]).astype(np.int64)
+    ys = np.rint(points[:, 1]).astype(np.int64)
+    brightness = work[ys, xs].astype(float)
 
-                # ストロークの長さ（暗いほど長く）
-                stroke_length = int((255 - brightness) / 255 * 15) + 5
+    # Z階数曲線の順に並べて移動距離を抑える
+    bits = max(int(draw_width), int(draw_height)).bit_length()
+    codes = np.zeros(len(xs), dtype=np.int64)
+    for b in range(bits):
+        codes |= ((xs >> b) & 1) << (2 * b)
+        codes |= ((ys >> b) & 1) << (2 * b + 1)
+    order = np.argsort(codes, kind="stable")
 
-                # ストロークの開始点
-                start_x = draw_x1 + int((x / img_width) * draw_width)
-                start_y = draw_y1 + int((y / img_height) * draw_height)
+    return [
+        (draw_x1 + int(xs[i]), draw_y1 + int(ys[i]), float(brightness[i]))
+        for i in order
+    ]
 
-                # ストロークの終了点
-                end_x = start_x + int(np.cos(angle) * stroke_length)
-                end_y = start_y + int(np.sin(angle) * stroke_length)
 
-                strokes.append((start_x, start_y, end_x, end_y))
+def create_stroke_pattern(img, draw_x1, draw_y1, draw_width, draw_height):
+    """ストローク（線画）パターンを生成"""
+    print("ストロークパターンを生成中...")
 
-    return strokes
+    # 12px 間隔の格子点の勾配だけを縮小画像から求め、全ストロークを配列演算で作る
+    strokes = stroke_pattern(img, draw_x1, draw_y1, draw_width, draw_height, step=12)
+    return [tuple(stroke) for stroke in strokes.tolist()]
 
 
 # 画像を読み込み
@@ -179,8 +162,10 @@ print("\n描画モードを選択してください:")
 print("1. 点描/ハッチング（鉛筆デッサン風）")
 print("2. ストローク（クロッキー風）")
 print("3. 従来の輪郭線")
+print("4. 点描（点数指定・重み付きボロノイ）")
+print("5. 流線ストローク（長い連続線）")
 
-mode = input("モードを選択 (1/2/3): ")
+mode = input("モードを選択 (1/2/3/4/5): ")
 
 if mode == "1":
     # 点描/ハッチングモード
@@ -203,6 +188,25 @@ if mode == "1":
 
     print(f"生成された点数: {len(drawing_points)}")
 
+elif mode == "4":
+    # 点描モード（点数指定）
+    n_points = int(input("点の数を入力 (推奨: 2000-10000): ") or "5000")
+    drawing_points = create_stipple_pattern(
+        img, draw_x1, draw_y1, draw_width, draw_height, n_points
+    )
+
+    # プレビュー画像作成
+    preview_img = np.full((int(draw_height), int(draw_width), 3), 255, dtype=np.uint8)
+
+    for x, y, brightness in drawing_points:
+        rel_x = x - draw_x1
+        rel_y = y - draw_y1
+        if 0 <= rel_x < draw_width and 0 <= rel_y < draw_height:
+            cv2.circle(preview_img, (rel_x, rel_y), 1, (0, 0, 0), -1)
+
+    print(f"生成された点数: {len(drawing_points)}")
+    print(f"推定描画時間: {len(drawing_points) * 0.01:.1f}秒")
+
 elif mode == "2":
     # ストロークモード
     strokes = create_stroke_pattern(img, draw_x1, draw_y1, draw_width, draw_height)
@@ -232,6 +236,18 @@ elif mode == "2":
 
     print(f"生成されたストローク数: {len(strokes)}")
 
+elif mode == "5":
+    # 流線ストロークモード
+    spacing = int(input("線の間隔を入力 (ピクセル, 推奨: 4-10): ") or "6")
+    print("流線を生成中...")
+    flow_paths = flow_streamlines(img, draw_x1, draw_y1, draw_width, draw_height, spacing=max(spacing, 2))
+    flow_paths = order_paths(flow_paths)
+
+    preview_img = draw_paths_preview(flow_paths, draw_width, draw_height, origin=(draw_x1, draw_y1))
+
+    print(f"生成された流線数: {len(flow_paths)}")
+    print(f"総描画点数: {flow_paths.total_points}")
+
 else:
     # 従来の輪郭線モード
     # ガウシアンブラーでノイズ除去
@@ -247,51 +263,19 @@ else:
     thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
     thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
 
-    # 輪郭を抽出（階層構造も取得）
-    contours, hierarchy = cv2.findContours(
-        thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE
-    )
+    # 輪郭を階層構造つきで抽出し、面積・周長・簡略化した多角形を輪郭ごとに1回だけ計算する
+    # （大きな輪郭は細部を残し、小さな輪郭ほど滑らかにする。プレビューと描画で同じ多角形を使う）
+    # 外側の輪郭の直後にその内側の輪郭が続くように並べる
+    contours = extract_contours(thresh, epsilon=adaptive_epsilon, min_vertices=2).order("tree")
+    print(contours.summary())
+    contour_paths = contours.to_paths(draw_x1, draw_y1, draw_width, draw_height)
 
-    # 小さすぎる輪郭を除去
-    min_area = 50
-    contours = [cnt for cnt in contours if cv2.contourArea(cnt) > min_area]
-
-    print(f"検出された輪郭数: {len(contours)}")
-
-    # 描画範囲のサイズで空の画像を作成（白背景）
+    # 線の太さを輪郭の大きさに応じて調整（太さごとにまとめて描く）
+    thicknesses = np.clip((300 * contours.areas / (img_width * img_height)).astype(int), 1, 5)
     preview_img = np.full((int(draw_height), int(draw_width), 3), 255, dtype=np.uint8)
-
-    # 輪郭を面積でソート（大きい順）
-    contours = sorted(contours, key=cv2.contourArea, reverse=True)
-
-    # 各輪郭を描画
-    for i, contour in enumerate(contours):
-        area = cv2.contourArea(contour)
-        print(f"輪郭 {i + 1}: {len(contour)}点, 面積: {area:.1f}")
-
-        # 輪郭を滑らかにする
-        epsilon = 0.005 * cv2.arcLength(contour, True)
-        smoothed_contour = cv2.approxPolyDP(contour, epsilon, True)
-
-        # 輪郭の点をスケール後の座標に変換
-        scaled_points = []
-        for point in smoothed_contour:
-            x, y = point[0]
-            scaled_x = (x / img_width) * draw_width
-            scaled_y = (y / img_height) * draw_height
-            scaled_points.append([int(scaled_x), int(scaled_y)])
-
-        # 線の太さを輪郭の大きさに応じて調整
-        line_thickness = max(1, int(3 * (area / (img_width * img_height)) * 100))
-        line_thickness = min(line_thickness, 5)
-
-        # 線を描画（黒色、調整された太さ）
-        if len(scaled_points) > 1:
-            scaled_contour = np.array(scaled_points, dtype=np.int32).reshape((-1, 1, 2))
-            preview_img = np.ascontiguousarray(preview_img)
-            cv2.polylines(
-                preview_img, [scaled_contour], True, (0, 0, 0), line_thickness
-            )
+    relative = contour_paths.translate(-draw_x1, -draw_y1)
+    for thickness in np.unique(thicknesses).tolist():
+        cv2.polylines(preview_img, list(relative.select(thicknesses == thickness)), False, (0, 0, 0), thickness)
 
 # 画像を保存
 output_filename = "drawing_preview.png"
@@ -388,58 +372,30 @@ if mode == "1":
         if not stop_drawing:
             pyautogui.mouseUp()
 
-elif mode == "2":
-    # ストロークモード（連続描画）
-    print(f"ストローク描画開始: {len(strokes)}本")
-
-    connect_threshold = 40.0
-    visited = [False] * len(strokes)
-    ordered_groups = []
+elif mode == "4":
+    # 点描モード（1点ずつクリック）
+    print(f"点描開始: {len(drawing_points)}点")
 
-    idx = 0
-    while idx < len(strokes):
-        try:
-            start_i = next(i for i, v in enumerate(visited) if not v)
-        except StopIteration:
+    total = len(drawing_points)
+    for i, (x, y, brightness) in enumerate(drawing_points):
+        if check_stop():
             break
 
-        visited[start_i] = True
-        sx, sy, ex, ey = strokes[start_i]
-        group = [(sx, sy, ex, ey)]
-        current_x, current_y = ex, ey
-
-        while True:
-            best_j = -1
-            best_flip = False
-            best_dist = 1e12
-
-            for j, v in enumerate(visited):
-                if v:
-                    continue
-                csx, csy, cex, cey = strokes[j]
-                d1 = ((current_x - csx) ** 2 + (current_y - csy) ** 2) ** 0.5
-                d2 = ((current_x - cex) ** 2 + (current_y - cey) ** 2) ** 0.5
-                if d1 < best_dist:
-                    best_dist = d1
-                    best_j = j
-                    best_flip = False
-                if d2 < best_dist:
-                    best_dist = d2
-                    best_j = j
-                    best_flip = True
-
-            if best_j == -1 or best_dist > connect_threshold:
-                break
+        if i % 100 == 0:
+            print(f"描画進行: {i}/{total}")
 
-            visited[best_j] = True
-            nsx, nsy, nex, ney = strokes[best_j]
-            if best_flip:
-                nsx, nsy, nex, ney = nex, ney, nsx, nsy
-            group.append((nsx, nsy, nex, ney))
-            current_x, current_y = nex, ney
+        pyautogui.moveTo(x, y, duration=0.0)
+        pyautogui.mouseDown()
+        pyautogui.mouseUp()
+        time.sleep(0.001)
+
+elif mode == "2":
+    # ストロークモード（連続描画）
+    print(f"ストローク描画開始: {len(strokes)}本")
 
-        ordered_groups.append(group)
-        idx += 1
+    # 終点から40px以内の端点を持つストロークを続けて描く
+    ordered_groups = group_strokes(strokes, connect_threshold=40.0)
+    print(f"ペン上げ回数: {len(strokes)} → {len(ordered_groups)}")
 
     for group_idx, group in enumerate(ordered_groups):
         if check_stop():
@@ -461,54 +417,51 @@ elif mode == "2":
             pyautogui.mouseUp()
         time.sleep(0.03)
 
-else:
-    # 従来の輪郭線描画
-    for i, contour in enumerate(contours):
-        # スペースキーチェック
+elif mode == "5":
+    # 流線ストロークモード（1本の流線を1回のマウスダウンで描く）
+    print(f"流線描画開始: {len(flow_paths)}本")
+
+    for path_idx, path in enumerate(flow_paths):
         if check_stop():
             break
+        if len(path) < 2:
+            continue
+        if path_idx % 50 == 0:
+            print(f"描画進行: {path_idx}/{len(flow_paths)}")
 
-        area = cv2.contourArea(contour)
-        print(f"描画中: 輪郭 {i + 1}/{len(contours)}")
+        path = path.tolist()
+        pyautogui.moveTo(path[0][0], path[0][1])
+        pyautogui.mouseDown()
 
-        # 描画用の高品質な滑らか化
-        perimeter = cv2.arcLength(contour, True)
-        if area > 5000:
-            epsilon = 0.003 * perimeter  # 大きな輪郭は詳細保持
-        elif area > 1000:
-            epsilon = 0.007 * perimeter  # 中程度
-        else:
-            epsilon = 0.015 * perimeter  # 小さな輪郭は滑らか
+        for x, y in path[1:]:
+            if check_stop():
+                break
+            pyautogui.moveTo(x, y, duration=0.002)
 
-        smoothed_contour = cv2.approxPolyDP(contour, epsilon, True)
+        if not stop_drawing:
+            pyautogui.mouseUp()
+        time.sleep(0.01)
 
-        if len(smoothed_contour) < 2:
-            continue
+else:
+    # 従来の輪郭線描画（プレビューと同じ多角形。最初の点に戻って閉じている）
+    for i, path in enumerate(contour_paths):
+        # スペースキーチェック
+        if check_stop():
+            break
+
+        print(f"描画中: 輪郭 {i + 1}/{len(contour_paths)}")
 
         # 最初の点へ移動
-        x, y = smoothed_contour[0][0]
-        scaled_x = draw_x1 + (x / img_width) * draw_width
-        scaled_y = draw_y1 + (y / img_height) * draw_height
-        pyautogui.moveTo(scaled_x, scaled_y)
+        path = path.tolist()
+        pyautogui.moveTo(path[0][0], path[0][1])
         pyautogui.mouseDown()
 
         # 輪郭の点を順になぞる（高速）
-        for point in smoothed_contour[1:]:
+        for x, y in path[1:]:
             # スペースキーチェック
             if check_stop():
                 break
-
-            x, y = point[0]
-            scaled_x = draw_x1 + (x / img_width) * draw_width
-            scaled_y = draw_y1 + (y / img_height) * draw_height
-            pyautogui.moveTo(scaled_x, scaled_y, duration=0.001)
-
-        # 最初の点に戻って閉じる
-        if not stop_drawing:
-            x, y = smoothed_contour[0][0]
-            scaled_x = draw_x1 + (x / img_width) * draw_width
-            scaled_y = draw_y1 + (y / img_height) * draw_height
-            pyautogui.moveTo(scaled_x, scaled_y, duration=0.001)
+            pyautogui.moveTo(x, y, duration=0.001)
 
         if not stop_drawing:
             pyautogui.mouseUp()
@@ -1,7 +1,8 @@
 import cv2
 import numpy as np
+from binarize import adaptive_binarize, threshold_sweep, format_threshold_cost, print_threshold_costs
 
-def convert_to_binary(input_path, output_path, threshold=127, method="simple"):
+def convert_to_binary(input_path, output_path, threshold=127, method="simple", img=None, window=51):
     """
     画像を白と黒のみに変換する
     
@@ -9,10 +10,13 @@ def convert_to_binary(input_path, output_path, threshold=127, method="simple"):
         input_path: 入力画像のパス
         output_path: 出力画像のパス
         threshold: 閾値 (0-255)
-        method: 変換方法 ("simple", "otsu", "adaptive")
+        method: 変換方法 ("simple", "otsu", "adaptive", "sauvola", "niblack")
+        img: 読み込み済みのグレースケール画像（指定時は input_path を読まない）
+        window: Sauvola/Niblack法の窓サイズ
     """
     # 画像を読み込み（グレースケール）
-    img = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        img = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
     if img is None:
         print(f"エラー: {input_path}が見つかりません")
         return None
@@ -33,6 +37,11 @@ def convert_to_binary(input_path, output_path, threshold=127, method="simple"):
         # 適応的閾値処理
         binary = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
         print("適応的閾値処理")
+        
+    elif method in ("sauvola", "niblack"):
+        # 積分画像による局所適応2値化（窓サイズによらず一定の速度）
+        binary = adaptive_binarize(img, window, method)
+        print(f"{'Sauvola' if method == 'sauvola' else 'Niblack'}法 (窓: {window}px)")
     
     else:
         print("エラー: 不正な変換方法です")
@@ -55,23 +64,42 @@ def convert_to_binary(input_path, output_path, threshold=127, method="simple"):
 def main():
     input_file = "123886908_p0_master1200.jpg"
     
+    img = cv2.imread(input_file, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        print(f"エラー: {input_file}が見つかりません")
+        return
+    
     print("画像を白と黒のみに変換します")
+    
+    # 2値化せずに各閾値のコストを表示
+    sweep = threshold_sweep(img)
+    print("\n閾値ごとの描画コスト:")
+    print_threshold_costs(sweep)
     print("\n変換方法を選択してください:")
     print("1. シンプル閾値 (手動で閾値を指定)")
     print("2. 大津の手法 (自動で最適な閾値を決定)")
     print("3. 適応的閾値 (局所的に閾値を調整)")
+    print("4. Sauvola法 (局所的・大きな窓でも高速)")
+    print("5. Niblack法 (局所的・大きな窓でも高速)")
     
-    choice = input("選択 (1/2/3): ")
+    choice = input("選択 (1/2/3/4/5): ")
     
     if choice == "1":
         threshold = int(input("閾値を入力 (0-255, 推奨: 127): ") or "127")
-        binary = convert_to_binary(input_file, "binary_simple.png", threshold, "simple")
+        threshold = min(max(threshold, 0), 255)
+        print(f"閾値 {threshold}: {format_threshold_cost(sweep, threshold)}")
+        binary = convert_to_binary(input_file, "binary_simple.png", threshold, "simple", img=img)
         
     elif choice == "2":
-        binary = convert_to_binary(input_file, "binary_otsu.png", method="otsu")
+        binary = convert_to_binary(input_file, "binary_otsu.png", method="otsu", img=img)
         
     elif choice == "3":
-        binary = convert_to_binary(input_file, "binary_adaptive.png", method="adaptive")
+        binary = convert_to_binary(input_file, "binary_adaptive.png", method="adaptive", img=img)
+        
+    elif choice in ("4", "5"):
+        method = "sauvola" if choice == "4" else "niblack"
+        window = int(input("窓サイズを入力 (ピクセル, 推奨: 25-101): ") or "51")
+        binary = convert_to_binary(input_file, f"binary_{method}.png", method=method, img=img, window=window)
         
     else:
         print("無効な選択です")
@@ -84,9 +112,11 @@ def main():
         compare = input("他の方法でも変換しますか？ (y/n): ")
         if compare.lower() == "y":
             print("\n比較用に全ての方法で変換中...")
-            convert_to_binary(input_file, "binary_simple_127.png", 127, "simple")
-            convert_to_binary(input_file, "binary_otsu.png", method="otsu")
-            convert_to_binary(input_file, "binary_adaptive.png", method="adaptive")
+            convert_to_binary(input_file, "binary_simple_127.png", 127, "simple", img=img)
+            convert_to_binary(input_file, "binary_otsu.png", method="otsu", img=img)
+            convert_to_binary(input_file, "binary_adaptive.png", method="adaptive", img=img)
+            convert_to_binary(input_file, "binary_sauvola.png", method="sauvola", img=img)
+            convert_to_binary(input_file, "binary_niblack.png", method="niblack", img=img)
             print("全ての変換が完了しました")
 
 if __name__ == "__main__":
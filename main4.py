@@ -6,8 +6,40 @@ import threading
 import sys
 import msvcrt
 import keyboard
-from multiprocessing import Pool, cpu_count
-from functools import partial
+from multiprocessing import cpu_count
+from paths import (PARALLEL_MIN_PIXELS, PathBuffer, chain_runs, dot_paths, draw_paths_preview,
+                   format_point_reduction, format_resolution_plan, iter_band_runs, order_paths, parallel_extract_runs, plan_resolution,
+                   simplify_paths, travel_distance)
+from dithering import (DIFFUSION_KERNELS, FLOYD_STEINBERG, error_diffusion, parallel_error_diffusion,
+                       stippling_dither)
+from streaming import format_stream_report, stream_draw
+
+# これ以上の画素数なら誤差拡散を複数プロセスで行う（bench_dithering.py の
+# 「並列の方が速くなる最小の画素数」から決める）。作業画像は長辺1000まで
+# （plan_resolution）なので、上限 1000x1000 の半分以上の大きな作業画像で並列にする
+PARALLEL_DITHER_MIN_PIXELS = 500_000
+
+# メニューに表示する誤差拡散カーネル (キー, 表示名)
+KERNEL_CHOICES = [
+    ("floyd_steinberg", "フロイド・スタインバーグ"),
+    ("atkinson", "アトキンソン（誤差3/4のみ拡散・黒点少なめ）"),
+    ("sierra", "シエラ"),
+    ("sierra_lite", "シエラ・ライト"),
+    ("jarvis", "ジャービス・ジュディス・ニンケ"),
+    ("stucki", "スタッキー"),
+]
+
+# 点描で点1つ分のセルの大きさ（作業解像度のピクセル）
+STIPPLE_CELL_SIZE = 2
+
+# 1パスあたりの推定描画時間（秒）
+SECONDS_PER_PATH = 0.02
+# 1点（moveTo 1回）あたりの推定描画時間（秒）
+SECONDS_PER_POINT = 0.002
+
+# ストリーミング描画で分ける帯の行数（作業解像度）と、帯ごとの並べ替えの時間（秒）
+STREAM_BAND_HEIGHT = 32
+STREAM_ORDER_SECONDS = 0.1
 
 def get_drawing_area():
     print("描画範囲を指定してください:")
@@ -41,7 +73,8 @@ def get_drawing_area():
 
     return (x1, y1, x2, y2)
 
-def floyd_steinberg_dither(img, black_threshold=80, white_threshold=200):
+def floyd_steinberg_dither(img, black_threshold=80, white_threshold=200, workers=None,
+                           kernel=FLOYD_STEINBERG, serpentine=False):
     """
     改良版フロイド・スタインバーグ・ディザリング
     
@@ -49,146 +82,90 @@ def floyd_steinberg_dither(img, black_threshold=80, white_threshold=200):
         img: 入力画像
         black_threshold: この値以下は強制的に黒 (0-255)
         white_threshold: この値以上は強制的に白 (0-255)
+        workers: プロセス数（Noneなら画像サイズから自動で決める）
+        kernel: 誤差拡散カーネル（dithering.DIFFUSION_KERNELS のいずれか）
+        serpentine: 蛇行走査にするか（逐次処理のみ）
     """
-    img = img.astype(np.float32) / 255.0
-    height, width = img.shape
-    
-    # 閾値を0-1の範囲に変換
-    black_thresh = black_threshold / 255.0
-    white_thresh = white_threshold / 255.0
-    
     print(f"ディザリング設定: 黒固定 ≤{black_threshold}, 白固定 ≥{white_threshold}, 中間部のみディザリング")
     
-    for y in range(height - 1):
-        for x in range(1, width - 1):
-            old_pixel = img[y, x]
-            
-            # 閾値による固定処理
-            if old_pixel <= black_thresh:
-                new_pixel = 0.0  # 強制的に黒
-            elif old_pixel >= white_thresh:
-                new_pixel = 1.0  # 強制的に白
-            else:
-                # 中間部のみディザリング処理
-                new_pixel = 1.0 if old_pixel > 0.5 else 0.0
-            
-            img[y, x] = new_pixel
-            
-            # 誤差拡散（固定された部分は誤差が小さい）
-            error = old_pixel - new_pixel
-            
-            # 誤差拡散の重みを調整（固定部分は誤差拡散を抑制）
-            if old_pixel <= black_thresh or old_pixel >= white_thresh:
-                # 固定部分は誤差拡散を弱める
-                error_weight = 0.3
-            else:
-                # 中間部は通常の誤差拡散
-                error_weight = 1.0
-            
-            img[y, x + 1] += error * error_weight * 7/16
-            img[y + 1, x - 1] += error * error_weight * 3/16
-            img[y + 1, x] += error * error_weight * 5/16
-            img[y + 1, x + 1] += error * error_weight * 1/16
+    if workers is None:
+        workers = cpu_count() if img.size >= PARALLEL_DITHER_MIN_PIXELS else 1
     
-    return (img * 255).astype(np.uint8)
-
-def process_row_chunk(args):
-    """行チャンクを並列処理する関数"""
-    y_chunk, y_to_x_dict, draw_x1, draw_y1, draw_width, draw_height = args
-    paths = []
-    
-    for target_y in y_chunk:
-        # この行の黒ピクセルのX座標を取得
-        if target_y not in y_to_x_dict:
-            continue
-            
-        x_coords = sorted(y_to_x_dict[target_y])
-        if not x_coords:
-            continue
-        
-        # 座標ペアを作成
-        row_pixels = [(x, target_y) for x in x_coords]
-        
-        # 連続する範囲を見つける
-        current_path = [row_pixels[0]]
-        
-        for i in range(1, len(row_pixels)):
-            prev_x = row_pixels[i-1][0]
-            curr_x = row_pixels[i][0]
-            
-            # 連続している（距離が近い）場合は同じパスに追加
-            if abs(curr_x - prev_x) <= 3:
-                current_path.append(row_pixels[i])
-            else:
-                # パスを保存して新しいパスを開始
-                if len(current_path) >= 2:
-                    paths.append(current_path)
-                current_path = [row_pixels[i]]
-        
-        # 最後のパスを追加
-        if len(current_path) >= 2:
-            paths.append(current_path)
+    # 固定部分は誤差拡散を弱める（重み0.3）
+    if workers > 1 and not serpentine:
+        img = parallel_error_diffusion(img, workers=workers, kernel=kernel, black_threshold=black_threshold,
+                                       white_threshold=white_threshold, clamp_weight=0.3)
+    else:
+        img = error_diffusion(img, kernel=kernel, black_threshold=black_threshold,
+                              white_threshold=white_threshold, clamp_weight=0.3, serpentine=serpentine)
     
-    return paths
+    return (img * 255).astype(np.uint8)
 
-def create_optimized_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
-    """黒ピクセルを最小クリック数で描画するパスを生成（並列処理版）"""
-    height, width = binary_img.shape
-    
+def create_optimized_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height, chain=False):
+    """黒ピクセルを最小クリック数で描画するパスを生成（共有メモリ並列版、chain=True なら行間を蛇行でつなぐ）"""
     print("黒ピクセルを検索中...")
-    # NumPyを使って高速に黒ピクセルを取得
-    black_y, black_x = np.where(binary_img == 0)
-    
-    if len(black_x) == 0:
-        return []
-    
-    print(f"黒ピクセル数: {len(black_x)}")
-    
-    # 描画座標に変換
-    draw_x_coords = draw_x1 + ((black_x / width) * draw_width).astype(int)
-    draw_y_coords = draw_y1 + ((black_y / height) * draw_height).astype(int)
-    
-    # Y座標ごとにX座標をグループ化（効率的なデータ構造）
-    y_to_x_dict = {}
-    for x, y in zip(draw_x_coords, draw_y_coords):
-        if y not in y_to_x_dict:
-            y_to_x_dict[y] = []
-        y_to_x_dict[y].append(x)
-    
-    # Y座標の一意な値を取得
-    unique_y = sorted(y_to_x_dict.keys())
-    
-    # CPUコア数を取得（メモリ使用量を考慮して制限）
-    pixel_count = len(black_x)
-    if pixel_count > 200000:
-        num_cores = min(cpu_count(), 4)  # 大量のピクセルの場合は4コアまで
-    elif pixel_count > 100000:
-        num_cores = min(cpu_count(), 6)  # 中程度の場合は6コアまで
+    pixel_count = int(np.count_nonzero(binary_img == 0))
+    if pixel_count == 0:
+        return PathBuffer()
+    
+    print(f"黒ピクセル数: {pixel_count}")
+    
+    # 同じ行でX座標の差が3以下の点をつなぐ（重複する点もそのまま並べる）
+    # 大きな画像は行の帯ごとに使い回しのプロセスプールで処理する
+    rows, starts, ends, points = parallel_extract_runs(binary_img, draw_width, draw_height,
+                                                       gap=3, min_points=2, duplicates=True)
+    if chain:
+        all_paths = chain_runs(rows, starts, ends, points, draw_x1, draw_y1)
+        print(f"ペン上げ回数: {len(rows)} → {len(all_paths)} (蛇行連結)")
     else:
-        num_cores = min(cpu_count(), 8)  # 少ない場合は8コアまで
-    
-    print(f"並列処理開始: {num_cores}コア使用 (ピクセル数: {pixel_count})")
+        all_paths = PathBuffer.from_runs(rows, points, draw_x1, draw_y1)
     
-    # Y座標をチャンクに分割
-    chunk_size = max(1, len(unique_y) // num_cores)
-    y_chunks = [unique_y[i:i + chunk_size] for i in range(0, len(unique_y), chunk_size)]
-    
-    # 並列処理用の引数を準備
-    args_list = [(chunk, y_to_x_dict, draw_x1, draw_y1, draw_width, draw_height) 
-                 for chunk in y_chunks if chunk]
-    
-    # 並列処理でパスを生成
-    with Pool(processes=num_cores) as pool:
-        chunk_results = pool.map(process_row_chunk, args_list)
-    
-    # 結果をマージ
-    all_paths = []
-    for chunk_paths in chunk_results:
-        all_paths.extend(chunk_paths)
-    
-    print(f"並列処理完了: {len(all_paths)}パス生成")
+    print(f"パス生成完了: {len(all_paths)}パス生成")
     return all_paths
 
+def stream_optimized_paths(binary_img, draw_x1, draw_y1, scale, chain=False, band_height=STREAM_BAND_HEIGHT):
+    """
+    create_optimized_paths と同じパスを行の帯ごとに作り、描画座標の塊として上から順に返す
+    
+    各塊は一直線上の点を除いてペン移動が短くなるように並べておく。chain=True でも
+    蛇行でつなぐのは帯の中だけ。
+    """
+    height, width = binary_img.shape
+    workers = cpu_count() if binary_img.size >= PARALLEL_MIN_PIXELS else 1
+    for rows, starts, ends, points in iter_band_runs(binary_img, width, height, gap=3, min_points=2,
+                                                     duplicates=True, band_height=band_height, workers=workers):
+        band = chain_runs(rows, starts, ends, points) if chain else PathBuffer.from_runs(rows, points)
+        band = simplify_paths(band.transform(scale=scale, offset=(draw_x1, draw_y1)))
+        yield order_paths(band, time_limit=STREAM_ORDER_SECONDS)
+
+def stream_dot_paths(dots, draw_x1, draw_y1, scale, band_height=STREAM_BAND_HEIGHT):
+    """点描の点（行優先の順）を行の帯ごとに1点1本のパスにし、描画座標の塊として上から順に返す"""
+    bands = dots[:, 1] // band_height
+    bounds = np.flatnonzero(np.diff(bands)) + 1
+    for chunk in np.split(dots, bounds):
+        band = dot_paths(chunk, STIPPLE_CELL_SIZE - 1).transform(scale=scale, offset=(draw_x1, draw_y1))
+        yield order_paths(band, time_limit=STREAM_ORDER_SECONDS)
+
+def compare_kernels(img, black_threshold, white_threshold, serpentine, draw_x1, draw_y1, draw_width, draw_height):
+    """全カーネルで黒ピクセル数・パス数・推定描画時間を比較表示"""
+    results = []
+    for key, label in KERNEL_CHOICES:
+        binary_img = floyd_steinberg_dither(img.copy(), black_threshold, white_threshold,
+                                            kernel=DIFFUSION_KERNELS[key], serpentine=serpentine)
+        black_pixels = int(np.count_nonzero(binary_img == 0))
+        paths = create_optimized_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height)
+        # パスごとの移動と点ごとのクリックの両方を数える（描画時の推定と同じ式）
+        seconds = len(paths) * SECONDS_PER_PATH + paths.total_points * SECONDS_PER_POINT
+        results.append((label, black_pixels, len(paths), seconds))
+    
+    print("\n=== カーネル比較 ===")
+    for number, (label, black_pixels, path_count, seconds) in enumerate(results, 1):
+        print(f"{number}. {label}: 黒ピクセル {black_pixels}, パス {path_count}, "
+              f"推定描画時間 {seconds:.1f}秒")
+    
+    fastest = min(range(len(results)), key=lambda i: results[i][3])
+    print(f"最速: {results[fastest][0]}")
+
 # 中止フラグとリスナー
 stop_drawing = False
 
@@ -228,6 +205,46 @@ def check_stop():
         return True
     return False
 
+def draw_paths(paths, move_duration, sleep_time, drawn=0, total=None):
+    """
+    パスを順に pyautogui でなぞる
+    
+    Args:
+        drawn: これまでに描いたパス数（進捗表示用）
+        total: 総パス数（分からなければ None）
+    
+    Returns:
+        最後まで描けば True、中止されたら False
+    """
+    for path_idx, path in enumerate(paths, drawn):
+        if check_stop():
+            return False
+        
+        if path_idx % 50 == 0:  # 進捗表示頻度を下げて高速化
+            print(f"描画進行: {path_idx}/{total}パス" if total else f"描画進行: {path_idx}パス")
+        
+        if len(path) < 2:
+            continue
+        path = path.tolist()
+        
+        # パスの開始点に移動
+        pyautogui.moveTo(path[0][0], path[0][1])
+        pyautogui.mouseDown()
+        
+        # パスをなぞる（設定された速度で）
+        for point in path[1:]:
+            if check_stop():
+                break
+            pyautogui.moveTo(point[0], point[1], duration=move_duration)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+        
+        if not stop_drawing:
+            pyautogui.mouseUp()
+        if sleep_time > 0:
+            time.sleep(sleep_time)  # パス間の休憩
+    return not stop_drawing
+
 def main():
     # 入力画像を選択
     print("入力画像を選択してください:")
@@ -266,28 +283,16 @@ def main():
     print(f"描画範囲: ({draw_x1}, {draw_y1}) から ({draw_x2}, {draw_y2})")
     print(f"サイズ: {draw_width} x {draw_height}")
     
-    # 描画範囲に合わせて画像を最適化
+    # 描画範囲とペン幅から作業解像度を決める（作業画像の1ピクセル = 描画の整数倍の正方形）
     height, width = img.shape
-    target_width = min(draw_width, 1000)  # 最大1000ピクセルに制限
-    target_height = min(draw_height, 1000)
-    
-    # アスペクト比を保持して最適なサイズを計算
-    aspect_ratio = width / height
-    target_aspect = target_width / target_height
-    
-    if aspect_ratio > target_aspect:
-        # 横長の場合
-        new_width = target_width
-        new_height = int(target_width / aspect_ratio)
-    else:
-        # 縦長の場合
-        new_height = target_height
-        new_width = int(target_height * aspect_ratio)
+    pen_width = int(input("ペン幅（ピクセル、デフォルト1）: ") or "1")
+    plan = plan_resolution(width, height, draw_width, draw_height, pen_width)
+    work_width, work_height = plan["work_size"]
     
     # リサイズが必要な場合のみ実行
-    if new_width != width or new_height != height:
-        img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-        print(f"描画範囲に最適化してリサイズ: {img.shape}")
+    if (work_width, work_height) != (width, height):
+        img = cv2.resize(img, (work_width, work_height), interpolation=cv2.INTER_AREA)
+        print(f"作業解像度にリサイズ: {img.shape}")
     
     # 閾値設定
     print("\n閾値設定（黒ピクセル数を調整）:")
@@ -323,9 +328,36 @@ def main():
     else:
         black_threshold, white_threshold = 80, 200
     
-    # フロイド・スタインバーグ・ディザリングを実行
-    print("改良版フロイド・スタインバーグ・ディザリングを実行中...")
-    binary_img = floyd_steinberg_dither(img.copy(), black_threshold, white_threshold)
+    # 誤差拡散カーネルを選択
+    serpentine = input("\n蛇行走査（行ごとに左右交互）を使いますか？ (y/n): ").lower() == "y"
+    
+    print("\n誤差拡散カーネルを選択してください:")
+    for number, (_, label) in enumerate(KERNEL_CHOICES, 1):
+        print(f"{number}. {label}")
+    print(f"{len(KERNEL_CHOICES) + 1}. 全カーネルを比較してから選択")
+    print(f"{len(KERNEL_CHOICES) + 2}. 点描（誤差拡散の代わりにセルごとに点を置き、1点を1本の短い線で描く）")
+    
+    kernel_choice = input(f"選択 (1-{len(KERNEL_CHOICES) + 2}): ")
+    if kernel_choice == str(len(KERNEL_CHOICES) + 1):
+        compare_kernels(img, black_threshold, white_threshold, serpentine,
+                        0, 0, work_width, work_height)
+        kernel_choice = input(f"使用するカーネル (1-{len(KERNEL_CHOICES)}): ")
+    
+    # 点描なら点の座標をそのままパスにする（2値画像を走査し直さない）
+    dots = None
+    if kernel_choice == str(len(KERNEL_CHOICES) + 2):
+        print("点描ディザリングを実行中...")
+        binary_img, dots = stippling_dither(img, cell_size=STIPPLE_CELL_SIZE)
+    else:
+        if kernel_choice.isdigit() and 1 <= int(kernel_choice) <= len(KERNEL_CHOICES):
+            kernel_key, kernel_label = KERNEL_CHOICES[int(kernel_choice) - 1]
+        else:
+            kernel_key, kernel_label = KERNEL_CHOICES[0]
+        
+        # 誤差拡散ディザリングを実行
+        print(f"改良版{kernel_label}ディザリングを実行中...")
+        binary_img = floyd_steinberg_dither(img.copy(), black_threshold, white_threshold,
+                                            kernel=DIFFUSION_KERNELS[kernel_key], serpentine=serpentine)
     
     # ディザリング結果を保存
     cv2.imwrite("dither_result.png", binary_img)
@@ -342,64 +374,74 @@ def main():
     print(f"白ピクセル数: {white_pixels} ({100-black_ratio:.1f}%)")
     
     # 最適化されたパスを生成
-    print("最適化されたパスを生成中...")
-    paths = create_optimized_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height)
-    
-    if not paths:
-        print("描画するパスが見つかりませんでした")
-        return
-    
-    print(f"生成されたパス数: {len(paths)}")
-    total_points = sum(len(path) for path in paths)
-    print(f"総描画点数: {total_points}")
-    
-    # クリック削減率の計算（ゼロ除算を回避）
-    if total_points > 0:
-        reduction_rate = (1 - len(paths) / total_points) * 100
-        print(f"クリック削減率: {reduction_rate:.1f}%")
+    chain = dots is None and input("\n隣り合う行の線分を蛇行でつないでペン上げを減らしますか？ (y/n): ").lower() == "y"
+    # ストリーミングでは、上の帯のパスが出来しだい描き始めて、描いている間に下の帯を作る
+    streaming = input("パスを作りながら描き始めますか？ (ストリーミング描画, y/n): ").lower() == "y"
+    if streaming:
+        print("\n=== ストリーミング描画 ===")
+        # 点の数はまだ分からないので、解像度の計画だけを表示する
+        print(format_resolution_plan(plan))
+        print("パスは描きながら作るので、プレビューは描画後に保存します")
     else:
-        print("クリック削減率: 計算不可（描画点なし）")
-    
-    # プレビュー画像作成
-    preview_img = np.full((int(draw_height), int(draw_width), 3), 255, dtype=np.uint8)
-    
-    for path_idx, path in enumerate(paths):
-        # パスごとに異なる色で表示（デバッグ用）
-        color = (0, 0, 0)  # 黒
+        print("最適化されたパスを生成中...")
+        generation_start = time.perf_counter()
+        if dots is not None:
+            paths = dot_paths(dots, STIPPLE_CELL_SIZE - 1)
+        else:
+            paths = create_optimized_paths(binary_img, 0, 0, work_width, work_height, chain)
         
-        for i in range(len(path) - 1):
-            x1, y1 = path[i]
-            x2, y2 = path[i + 1]
-            
-            # 描画範囲内の座標に変換
-            rel_x1 = x1 - draw_x1
-            rel_y1 = y1 - draw_y1
-            rel_x2 = x2 - draw_x1
-            rel_y2 = y2 - draw_y1
-            
-            if (0 <= rel_x1 < draw_width and 0 <= rel_y1 < draw_height and
-                0 <= rel_x2 < draw_width and 0 <= rel_y2 < draw_height):
-                cv2.line(preview_img, (rel_x1, rel_y1), (rel_x2, rel_y2), color, 1)
-    
-    cv2.imwrite("drawing_preview_optimized.png", preview_img)
-    print("最適化されたプレビューを 'drawing_preview_optimized.png' に保存しました")
-    
-    # 描画前の最終確認
-    print(f"\n=== 描画準備完了 ===")
-    print(f"画像: {input_file}")
-    print(f"描画範囲: {draw_width} x {draw_height} ピクセル")
-    total_draw_points = sum(len(path) for path in paths)
-    print(f"生成パス数: {len(paths)}")
-    print(f"総描画点数: {total_draw_points}")
-    
-    if total_draw_points > 0:
-        reduction_rate = (1 - len(paths) / total_draw_points) * 100
-        print(f"クリック削減率: {reduction_rate:.1f}%")
-    else:
-        print("クリック削減率: 計算不可")
+        if not paths:
+            print("描画するパスが見つかりませんでした")
+            return
+        
+        # 作業解像度で作ったパスを描画範囲へ整数倍で写す
+        print(format_resolution_plan(plan, points=paths.total_points))
+        paths = paths.transform(scale=plan["scale"], offset=(draw_x1, draw_y1))
+        
+        print(f"生成されたパス数: {len(paths)}")
+        total_points = paths.total_points
+        print(f"総描画点数: {total_points}")
+        
+        # クリック削減率の計算（ゼロ除算を回避）
+        if total_points > 0:
+            reduction_rate = (1 - len(paths) / total_points) * 100
+            print(f"クリック削減率: {reduction_rate:.1f}%")
+        else:
+            print("クリック削減率: 計算不可（描画点なし）")
+        
+        # 線分の中間点は描画結果に影響しないので、両端だけを残す
+        simplified = simplify_paths(paths)
+        print(f"一直線上の点を除去: {format_point_reduction(paths, simplified, SECONDS_PER_POINT)}")
+        paths = simplified
+        
+        # ペンを上げて移動する距離が短くなるように並べ替える
+        travel_before = travel_distance(paths)
+        paths = order_paths(paths)
+        print(f"ペン移動距離: {travel_before:.0f}px → {travel_distance(paths):.0f}px")
+        print(f"パス生成時間: {time.perf_counter() - generation_start:.2f}秒")
+        
+        # プレビュー画像作成
+        preview_img = draw_paths_preview(paths, draw_width, draw_height, origin=(draw_x1, draw_y1))
+        
+        cv2.imwrite("drawing_preview_optimized.png", preview_img)
+        print("最適化されたプレビューを 'drawing_preview_optimized.png' に保存しました")
+        
+        # 描画前の最終確認
+        print(f"\n=== 描画準備完了 ===")
+        print(f"画像: {input_file}")
+        print(f"描画範囲: {draw_width} x {draw_height} ピクセル")
+        total_draw_points = paths.total_points
+        print(f"生成パス数: {len(paths)}")
+        print(f"総描画点数: {total_draw_points}")
+        
+        if total_draw_points > 0:
+            reduction_rate = (1 - len(paths) / total_draw_points) * 100
+            print(f"クリック削減率: {reduction_rate:.1f}%")
+        else:
+            print("クリック削減率: 計算不可")
+        
+        print(f"推定描画時間: {len(paths) * SECONDS_PER_PATH + total_draw_points * SECONDS_PER_POINT:.1f}秒")
         
-    print(f"推定描画時間: {len(paths) * 0.02:.1f}秒")
-    
     # 描画速度設定
     print("\n描画速度を選択してください:")
     print("1. 最高速度 (duration=0, sleep=0) - 推奨")
@@ -436,7 +478,8 @@ def main():
         print("描画をキャンセルしました")
         print("以下のファイルが保存されています:")
         print("- dither_result.png (ディザリング結果)")
-        print("- drawing_preview_optimized.png (描画予定のプレビュー)")
+        if not streaming:
+            print("- drawing_preview_optimized.png (描画予定のプレビュー)")
         return
     
     print("3秒後に描画開始します。描画アプリにフォーカスを移してください！")
@@ -454,35 +497,31 @@ def main():
     keyboard_thread = threading.Thread(target=keyboard_listener, daemon=True)
     keyboard_thread.start()
     
-    # 最適化されたパスで描画
-    print(f"最適化描画開始: {len(paths)}パス")
-    
-    for path_idx, path in enumerate(paths):
-        if check_stop():
-            break
+    if streaming:
+        print("ストリーミング描画開始")
+        drawn = []
         
-        if path_idx % 50 == 0:  # 進捗表示頻度を下げて高速化
-            print(f"描画進行: {path_idx}/{len(paths)}パス")
-        
-        if len(path) < 2:
-            continue
-        
-        # パスの開始点に移動
-        pyautogui.moveTo(path[0][0], path[0][1])
-        pyautogui.mouseDown()
+        def draw_chunk(chunk):
+            drawn.append(chunk)
+            return draw_paths(chunk, move_duration, sleep_time, sum(map(len, drawn[:-1])))
         
-        # パスをなぞる（設定された速度で）
-        for point in path[1:]:
-            if check_stop():
-                break
-            pyautogui.moveTo(point[0], point[1], duration=move_duration)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+        if dots is not None:
+            chunks = stream_dot_paths(dots, draw_x1, draw_y1, plan["scale"])
+        else:
+            chunks = stream_optimized_paths(binary_img, draw_x1, draw_y1, plan["scale"], chain)
+        report = stream_draw(chunks, draw_chunk)
+        print(format_stream_report(report))
         
-        if not stop_drawing:
-            pyautogui.mouseUp()
-        if sleep_time > 0:
-            time.sleep(sleep_time)  # パス間の休憩
+        preview_img = draw_paths_preview(PathBuffer.concatenate(drawn), draw_width, draw_height,
+                                         origin=(draw_x1, draw_y1))
+        cv2.imwrite("drawing_preview_optimized.png", preview_img)
+        print("描いたパスのプレビューを 'drawing_preview_optimized.png' に保存しました")
+    else:
+        # 最適化されたパスで描画
+        print(f"最適化描画開始: {len(paths)}パス")
+        drawing_start = time.perf_counter()
+        draw_paths(paths, move_duration, sleep_time, total=len(paths))
+        print(f"描画時間: {time.perf_counter() - drawing_start:.2f}秒")
     
     if stop_drawing:
         print("描画が中止されました！")
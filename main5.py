@@ -6,7 +6,21 @@ import threading
 import sys
 import msvcrt
 import keyboard
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
+from paths import (PARALLEL_MIN_PIXELS, PathBuffer, centerline_paths, chain_runs, draw_paths_preview, hatch_fill,
+                   format_point_reduction, format_resolution_plan, iter_band_runs, order_paths,
+                   parallel_extract_runs, plan_resolution, simplify_paths, travel_distance)
+from contours import extract_contours
+from binarize import parallel_binarize, threshold_sweep, format_threshold_cost, print_threshold_costs
+from streaming import format_stream_report, stream_draw
+
+# 1パスあたり・1点（moveTo 1回）あたりの推定描画時間（秒）
+SECONDS_PER_PATH = 0.02
+SECONDS_PER_POINT = 0.002
+
+# ストリーミング描画で塗りつぶしを分ける帯の行数（作業解像度）と、帯ごとの並べ替えの時間
+STREAM_BAND_HEIGHT = 32
+STREAM_ORDER_SECONDS = 0.1
 
 def get_drawing_area():
     print("描画範囲を指定してください:")
@@ -40,125 +54,140 @@ def get_drawing_area():
 
     return (x1, y1, x2, y2)
 
-def create_binary_image(img, threshold=127, method="otsu"):
+def create_binary_image(img, threshold=127, method="otsu", window=51, workers=1):
     """
     完全白黒2値化（点描なし）
     
     Args:
         img: 入力画像
         threshold: 閾値 (0-255)
-        method: 変換方法 ("simple", "otsu", "adaptive")
+        method: 変換方法 ("simple", "otsu", "adaptive", "sauvola", "niblack")
+        window: Sauvola/Niblack法の窓サイズ
+        workers: 行の帯に分けて並列に2値化するプロセス数（結果は1プロセスと同じ）
     """
+    binary, used_threshold = parallel_binarize(img, method, threshold, window, workers)
     if method == "simple":
-        _, binary = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY)
         print(f"シンプル2値化 (閾値: {threshold})")
         
     elif method == "otsu":
-        threshold_otsu, binary = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        print(f"大津の手法 (自動決定閾値: {threshold_otsu:.1f})")
+        print(f"大津の手法 (自動決定閾値: {used_threshold:.1f})")
         
     elif method == "adaptive":
-        binary = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
         print("適応的2値化")
+        
+    elif method in ("sauvola", "niblack"):
+        print(f"{'Sauvola' if method == 'sauvola' else 'Niblack'}法 (窓: {window}px)")
     
     return binary
 
-def create_contour_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
-    """輪郭線から描画パスを生成"""
-    # 輪郭を抽出
-    contours, hierarchy = cv2.findContours(binary_img, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    
-    # 小さすぎる輪郭を除去
-    min_area = 50
-    contours = [cnt for cnt in contours if cv2.contourArea(cnt) > min_area]
-    
-    print(f"検出された輪郭数: {len(contours)}")
-    
-    # 輪郭を面積でソート（大きい順）
-    contours = sorted(contours, key=cv2.contourArea, reverse=True)
-    
-    paths = []
-    img_height, img_width = binary_img.shape
-    
-    for i, contour in enumerate(contours):
-        area = cv2.contourArea(contour)
-        print(f"輪郭 {i + 1}: {len(contour)}点, 面積: {area:.1f}")
-        
-        # 輪郭を滑らかにする
-        epsilon = 0.005 * cv2.arcLength(contour, True)
-        smoothed_contour = cv2.approxPolyDP(contour, epsilon, True)
-        
-        if len(smoothed_contour) < 3:
-            continue
-        
-        # 輪郭の点をスケール後の座標に変換
-        path_points = []
-        for point in smoothed_contour:
-            x, y = point[0]
-            scaled_x = draw_x1 + int((x / img_width) * draw_width)
-            scaled_y = draw_y1 + int((y / img_height) * draw_height)
-            path_points.append((scaled_x, scaled_y))
-        
-        # 最初の点に戻って閉じる
-        if len(path_points) > 0:
-            path_points.append(path_points[0])
-        
-        paths.append(path_points)
-    
-    return paths
+def create_contour_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height, max_depth=None, workers=1):
+    """輪郭線から描画パスを生成（max_depth を指定するとそれより内側の輪郭は描かない）"""
+    # 面積・周長・簡略化は輪郭ごとに1回だけ計算する（workers > 1 なら帯ごとに追跡して継ぎ目でつなぐ）
+    contours = extract_contours(binary_img, workers=workers).prune(max_depth=max_depth).order("area")
+    print(contours.summary())
+    
+    # スケール変換は全輪郭まとめて行う
+    return contours.to_paths(draw_x1, draw_y1, draw_width, draw_height)
+
+def create_fill_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height, chain=False, workers=1):
+    """黒い領域を塗りつぶすパスを生成（スキャンライン方式、chain=True なら隣の行と蛇行でつなぐ）"""
+    # 同じ行でX座標の差が2以下の点をつなぐ（重複除去）。線分は行をまたがないので、
+    # 行の帯ごとに並列に抽出して連結するだけで1プロセスと同じ結果になる
+    rows, starts, ends, points = parallel_extract_runs(binary_img, draw_width, draw_height, gap=2, min_points=2,
+                                                       workers=workers)
+    if not len(rows):
+        return PathBuffer()
+    
+    print(f"線分の点数: {int(points[2].sum())}")
+    
+    if not chain:
+        return PathBuffer.from_runs(rows, points, draw_x1, draw_y1)
+    
+    chained = chain_runs(rows, starts, ends, points, draw_x1, draw_y1)
+    print(f"ペン上げ回数: {len(rows)} → {len(chained)} (蛇行連結)")
+    return chained
 
-def create_fill_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
-    """黒い領域を塗りつぶすパスを生成（スキャンライン方式）"""
+def stream_fill_paths(binary_img, chain=False, band_height=STREAM_BAND_HEIGHT, workers=1):
+    """
+    塗りつぶしパスを行の帯ごとに作って、上の帯から順に返すジェネレータ（作業解像度の座標）
+
+    帯の中の線分は create_fill_paths と同じ。chain=True でも蛇行でつなぐのは帯の中だけ。
+    """
     height, width = binary_img.shape
+    for rows, starts, ends, points in iter_band_runs(binary_img, width, height, gap=2, min_points=2,
+                                                     band_height=band_height, workers=workers):
+        yield chain_runs(rows, starts, ends, points) if chain else PathBuffer.from_runs(rows, points)
+
+def ask_path_options(draw_method, pen_width=1):
+    """描画方法ごとの設定を、パスを作り始める前にまとめて尋ねる（ペンの太さは解像度を決めるときに聞いた値）"""
+    options = {"pen_width": pen_width}
+    if draw_method in ["1", "3"]:
+        depth = input("入れ子の輪郭を何段目まで描きますか？ (0: 一番外側のみ, 空欄: すべて): ")
+        options["max_depth"] = int(depth) if depth.strip() else None
+        options["tolerance"] = float(input("輪郭線の簡略化の許容誤差 (ピクセル, 0で無効, 推奨: 1): ") or "1")
+        method = input("簡略化の方法 (1: Douglas-Peucker, 2: Visvalingam): ")
+        options["simplify_method"] = "visvalingam" if method == "2" else "douglas_peucker"
     
-    # 黒ピクセルを検索
-    black_y, black_x = np.where(binary_img == 0)
-    
-    if len(black_x) == 0:
-        return []
-    
-    print(f"黒ピクセル数: {len(black_x)}")
+    if draw_method in ["2", "3"]:
+        if pen_width > 1:
+            options["angle"] = float(input("ハッチングの角度 (度, 推奨: 0 または 45): ") or "0")
+        else:
+            options["chain"] = input("隣り合う行の線分を蛇行でつないでペン上げを減らしますか？ (y/n): ").lower() == "y"
+    return options
+
+def generate_path_chunks(binary_img, draw_method, options, draw_x1, draw_y1, scale, workers=1, stream=False):
+    """
+    選んだ描画方法のパスを、描画座標の塊ごとに順に返すジェネレータ
     
-    # 描画座標に変換
-    draw_x_coords = draw_x1 + ((black_x / width) * draw_width).astype(int)
-    draw_y_coords = draw_y1 + ((black_y / height) * draw_height).astype(int)
+    輪郭線・ハッチング・中心線は画像全体で1つの塊にする。stream=True なら1行ずつの
+    塗りつぶしを行の帯ごとの塊にし、各塊の中でペン移動が短くなるように並べておく
+    （全体をまとめて並べるよりペン移動は少し長くなる）。
+    """
+    work_height, work_width = binary_img.shape
+    # 作業画像をちょうど整数倍で写した描画範囲（端の scale 未満の余りは使わない）
+    mapped_width, mapped_height = work_width * scale, work_height * scale
     
-    # Y座標ごとにX座標をグループ化
-    y_to_x_dict = {}
-    for x, y in zip(draw_x_coords, draw_y_coords):
-        if y not in y_to_x_dict:
-            y_to_x_dict[y] = []
-        y_to_x_dict[y].append(x)
+    def prepare(chunk):
+        return order_paths(chunk, time_limit=STREAM_ORDER_SECONDS) if stream else chunk
     
-    paths = []
+    if draw_method in ["1", "3"]:
+        print("輪郭線パスを生成中...")
+        contour_paths = create_contour_paths(binary_img, draw_x1, draw_y1, mapped_width, mapped_height,
+                                             options["max_depth"], workers)
+        print(f"輪郭線パス数: {len(contour_paths)}")
+        simplified = simplify_paths(contour_paths, options["tolerance"], options["simplify_method"])
+        print(f"輪郭線の簡略化: {format_point_reduction(contour_paths, simplified, SECONDS_PER_POINT)}")
+        yield prepare(simplified)
     
-    for y in sorted(y_to_x_dict.keys()):
-        x_coords = sorted(set(y_to_x_dict[y]))  # 重複除去
-        
-        if not x_coords:
-            continue
-        
-        # 連続する範囲を見つける
-        current_path = [(x_coords[0], y)]
-        
-        for i in range(1, len(x_coords)):
-            prev_x = x_coords[i-1]
-            curr_x = x_coords[i]
-            
-            # 連続している場合は同じパスに追加
-            if curr_x - prev_x <= 2:
-                current_path.append((curr_x, y))
-            else:
-                # パスを保存して新しいパスを開始
-                if len(current_path) >= 2:
-                    paths.append(current_path)
-                current_path = [(curr_x, y)]
+    if draw_method in ["2", "3"]:
+        print("塗りつぶしパスを生成中...")
+        if options["pen_width"] > 1:
+            # ペンの太さの間隔で平行線を引く
+            fill_chunks = [hatch_fill(binary_img, draw_x1, draw_y1, mapped_width, mapped_height,
+                                      options["pen_width"], options["angle"])]
+        elif stream:
+            # 作業解像度で帯ごとに走査してから整数倍で描画範囲へ写す
+            fill_chunks = (band.transform(scale=scale, offset=(draw_x1, draw_y1))
+                           for band in stream_fill_paths(binary_img, options["chain"], workers=workers))
+        else:
+            # 作業解像度で走査してから整数倍で描画範囲へ写す
+            fill_chunks = [create_fill_paths(binary_img, 0, 0, work_width, work_height, options["chain"], workers)
+                           .transform(scale=scale, offset=(draw_x1, draw_y1))]
         
-        # 最後のパスを追加
-        if len(current_path) >= 2:
-            paths.append(current_path)
-    
-    return paths
+        for fill_paths in fill_chunks:
+            # 線分の中間点は描画結果に影響しないので、両端だけを残す
+            simplified = simplify_paths(fill_paths)
+            if not stream:
+                print(f"塗りつぶしパス数: {len(fill_paths)}")
+                print(f"一直線上の点を除去: {format_point_reduction(fill_paths, simplified, SECONDS_PER_POINT)}")
+            yield prepare(simplified)
+    
+    if draw_method == "4":
+        # 細線化した骨格を折れ線にたどる
+        print("中心線パスを生成中...")
+        line_paths = centerline_paths(binary_img, draw_x1, draw_y1, mapped_width, mapped_height)
+        print(f"中心線パス数: {len(line_paths)}")
+        yield prepare(line_paths)
 
 # 中止フラグとリスナー
 stop_drawing = False
@@ -197,6 +226,78 @@ def check_stop():
         return True
     return False
 
+def choose_drawing_speed():
+    """描画速度を選ぶ（moveTo の duration と点ごとの sleep を返す）"""
+    print("\n描画速度を選択してください:")
+    print("1. 最高速度 (duration=0, sleep=0) - 推奨")
+    print("2. 高速 (duration=0.001, sleep=0.001)")
+    print("3. 中速 (duration=0.005, sleep=0.005)")
+    print("4. 安全速度 (duration=0.01, sleep=0.01)")
+    
+    speed_choice = input("選択 (1/2/3/4): ")
+    
+    if speed_choice == "1":
+        move_duration = 0
+        sleep_time = 0
+        print("最高速度モード: 瞬間描画")
+    elif speed_choice == "2":
+        move_duration = 0.001
+        sleep_time = 0.001
+        print("高速モード")
+    elif speed_choice == "3":
+        move_duration = 0.005
+        sleep_time = 0.005
+        print("中速モード")
+    elif speed_choice == "4":
+        move_duration = 0.01
+        sleep_time = 0.01
+        print("安全速度モード")
+    else:
+        move_duration = 0
+        sleep_time = 0
+        print("デフォルト: 最高速度モード")
+    return move_duration, sleep_time
+
+def draw_paths(paths, move_duration, sleep_time, drawn=0, total=None):
+    """
+    パスを順に pyautogui でなぞる
+    
+    Args:
+        drawn: これまでに描いたパス数（進捗表示用）
+        total: 総パス数（分からなければ None）
+    
+    Returns:
+        最後まで描けば True、中止されたら False
+    """
+    for path_idx, path in enumerate(paths, drawn):
+        if check_stop():
+            return False
+        
+        if path_idx % 50 == 0:
+            print(f"描画進行: {path_idx}/{total}パス" if total else f"描画進行: {path_idx}パス")
+        
+        if len(path) < 2:
+            continue
+        path = path.tolist()
+        
+        # パスの開始点に移動
+        pyautogui.moveTo(path[0][0], path[0][1])
+        pyautogui.mouseDown()
+        
+        # パスをなぞる
+        for point in path[1:]:
+            if check_stop():
+                break
+            pyautogui.moveTo(point[0], point[1], duration=move_duration)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+        
+        if not stop_drawing:
+            pyautogui.mouseUp()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+    return not stop_drawing
+
 def main():
     # 入力画像を選択
     print("入力画像を選択してください:")
@@ -235,42 +336,54 @@ def main():
     print(f"描画範囲: ({draw_x1}, {draw_y1}) から ({draw_x2}, {draw_y2})")
     print(f"サイズ: {draw_width} x {draw_height}")
     
-    # 描画範囲に合わせて画像を最適化
+    # 描画範囲から作業解像度を決める（作業画像の1ピクセル = 描画の整数倍の正方形）
     height, width = img.shape
-    target_width = min(draw_width, 1000)
-    target_height = min(draw_height, 1000)
-    
-    aspect_ratio = width / height
-    target_aspect = target_width / target_height
-    
-    if aspect_ratio > target_aspect:
-        new_width = target_width
-        new_height = int(target_width / aspect_ratio)
-    else:
-        new_height = target_height
-        new_width = int(target_height * aspect_ratio)
-    
-    if new_width != width or new_height != height:
-        img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-        print(f"描画範囲に最適化してリサイズ: {img.shape}")
+    pen_width = int(input("ペンの太さ (ピクセル, 1なら塗りつぶしは1行ずつ塗る): ") or "1")
+    plan = plan_resolution(width, height, draw_width, draw_height, pen_width)
+    print(format_resolution_plan(plan))
+    work_width, work_height = plan["work_size"]
+    scale = plan["scale"]
+    
+    if (work_width, work_height) != (width, height):
+        img = cv2.resize(img, (work_width, work_height), interpolation=cv2.INTER_AREA)
+        print(f"作業解像度にリサイズ: {img.shape}")
+    
+    # 大きな作業画像は行の帯に分けて並列処理できる（2値化・線分抽出・輪郭追跡。結果は1プロセスと同じ）
+    default_workers = cpu_count() if img.size >= PARALLEL_MIN_PIXELS else 1
+    workers = int(input(f"帯に分けて並列処理するプロセス数 (1で無効, 空欄: {default_workers}): ")
+                  or str(default_workers))
+    workers = max(workers, 1)
+    
+    # 2値化せずに各閾値のコストを表示（塗りつぶしパスは間隔2以下をつなぐ）
+    sweep = threshold_sweep(img, gap=2)
+    print("\n閾値ごとの描画コスト:")
+    print_threshold_costs(sweep)
     
     # 2値化方法を選択
     print("\n2値化方法を選択してください:")
     print("1. 大津の手法 (自動閾値) - 推奨")
     print("2. シンプル閾値 (手動)")
     print("3. 適応的閾値 (局所的)")
+    print("4. Sauvola法 (局所的・大きな窓でも高速)")
+    print("5. Niblack法 (局所的・大きな窓でも高速)")
     
-    method_choice = input("選択 (1/2/3): ")
+    method_choice = input("選択 (1/2/3/4/5): ")
     
     if method_choice == "1":
-        binary_img = create_binary_image(img, method="otsu")
+        binary_img = create_binary_image(img, method="otsu", workers=workers)
     elif method_choice == "2":
         threshold = int(input("閾値を入力 (0-255, 推奨: 127): ") or "127")
-        binary_img = create_binary_image(img, threshold, "simple")
+        threshold = min(max(threshold, 0), 255)
+        print(f"閾値 {threshold}: {format_threshold_cost(sweep, threshold)}")
+        binary_img = create_binary_image(img, threshold, "simple", workers=workers)
     elif method_choice == "3":
-        binary_img = create_binary_image(img, method="adaptive")
+        binary_img = create_binary_image(img, method="adaptive", workers=workers)
+    elif method_choice in ("4", "5"):
+        window = int(input("窓サイズを入力 (ピクセル, 推奨: 25-101): ") or "51")
+        binary_img = create_binary_image(img, method="sauvola" if method_choice == "4" else "niblack", window=window,
+                                         workers=workers)
     else:
-        binary_img = create_binary_image(img, method="otsu")
+        binary_img = create_binary_image(img, method="otsu", workers=workers)
     
     # 2値化結果を保存
     cv2.imwrite("binary_result.png", binary_img)
@@ -291,96 +404,56 @@ def main():
     print("1. 輪郭線のみ (線画風)")
     print("2. 塗りつぶし (ベタ塗り風)")
     print("3. 輪郭線＋塗りつぶし (完全再現)")
+    print("4. 中心線のみ (線画向け・線の中心を1回なぞる)")
     
-    draw_method = input("選択 (1/2/3): ")
+    draw_method = input("選択 (1/2/3/4): ")
     
-    all_paths = []
+    options = ask_path_options(draw_method, pen_width)
     
-    if draw_method in ["1", "3"]:
-        # 輪郭線パスを生成
-        print("輪郭線パスを生成中...")
-        contour_paths = create_contour_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height)
-        all_paths.extend(contour_paths)
-        print(f"輪郭線パス数: {len(contour_paths)}")
-    
-    if draw_method in ["2", "3"]:
-        # 塗りつぶしパスを生成
-        print("塗りつぶしパスを生成中...")
-        fill_paths = create_fill_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height)
-        all_paths.extend(fill_paths)
-        print(f"塗りつぶしパス数: {len(fill_paths)}")
-    
-    if not all_paths:
-        print("描画するパスが見つかりませんでした")
-        return
+    # ストリーミングでは、最初の塊が出来しだい描き始めて、描いている間に後の塊を作る
+    streaming = input("\nパスを作りながら描き始めますか？ (ストリーミング描画, y/n): ").lower() == "y"
+    chunks = generate_path_chunks(binary_img, draw_method, options, draw_x1, draw_y1, scale, workers, streaming)
     
-    print(f"総パス数: {len(all_paths)}")
-    total_points = sum(len(path) for path in all_paths)
-    print(f"総描画点数: {total_points}")
-    
-    if total_points > 0:
-        reduction_rate = (1 - len(all_paths) / total_points) * 100
-        print(f"クリック削減率: {reduction_rate:.1f}%")
-    
-    # プレビュー画像作成
-    preview_img = np.full((int(draw_height), int(draw_width), 3), 255, dtype=np.uint8)
-    
-    for path in all_paths:
-        if len(path) < 2:
-            continue
+    if streaming:
+        print("\n=== ストリーミング描画 ===")
+        print("パスは描きながら作るので、プレビューは描画後に保存します")
+    else:
+        generation_start = time.perf_counter()
+        all_paths = PathBuffer.concatenate(list(chunks))
+        
+        if not all_paths:
+            print("描画するパスが見つかりませんでした")
+            return
+        
+        # ペンを上げて移動する距離が短くなるように並べ替える
+        travel_before = travel_distance(all_paths)
+        all_paths = order_paths(all_paths)
+        print(f"ペン移動距離: {travel_before:.0f}px → {travel_distance(all_paths):.0f}px")
+        print(f"パス生成時間: {time.perf_counter() - generation_start:.2f}秒")
+        
+        print(f"総パス数: {len(all_paths)}")
+        total_points = all_paths.total_points
+        print(f"総描画点数: {total_points}")
+        
+        if total_points > 0:
+            reduction_rate = (1 - len(all_paths) / total_points) * 100
+            print(f"クリック削減率: {reduction_rate:.1f}%")
+        
+        # プレビュー画像作成
+        preview_img = draw_paths_preview(all_paths, draw_width, draw_height, origin=(draw_x1, draw_y1))
         
-        for i in range(len(path) - 1):
-            x1, y1 = path[i]
-            x2, y2 = path[i + 1]
-            
-            rel_x1 = x1 - draw_x1
-            rel_y1 = y1 - draw_y1
-            rel_x2 = x2 - draw_x1
-            rel_y2 = y2 - draw_y1
-            
-            if (0 <= rel_x1 < draw_width and 0 <= rel_y1 < draw_height and
-                0 <= rel_x2 < draw_width and 0 <= rel_y2 < draw_height):
-                cv2.line(preview_img, (rel_x1, rel_y1), (rel_x2, rel_y2), (0, 0, 0), 1)
-    
-    cv2.imwrite("drawing_preview_binary.png", preview_img)
-    print("プレビューを 'drawing_preview_binary.png' に保存しました")
-    
-    # 描画前の最終確認
-    print(f"\n=== 描画準備完了 ===")
-    print(f"画像: {input_file}")
-    print(f"描画範囲: {draw_width} x {draw_height} ピクセル")
-    print(f"総パス数: {len(all_paths)}")
-    print(f"推定描画時間: {len(all_paths) * 0.02:.1f}秒")
+        cv2.imwrite("drawing_preview_binary.png", preview_img)
+        print("プレビューを 'drawing_preview_binary.png' に保存しました")
+        
+        # 描画前の最終確認
+        print(f"\n=== 描画準備完了 ===")
+        print(f"画像: {input_file}")
+        print(f"描画範囲: {draw_width} x {draw_height} ピクセル")
+        print(f"総パス数: {len(all_paths)}")
+        print(f"推定描画時間: {len(all_paths) * SECONDS_PER_PATH + all_paths.total_points * SECONDS_PER_POINT:.1f}秒")
     
     # 描画速度設定
-    print("\n描画速度を選択してください:")
-    print("1. 最高速度 (duration=0, sleep=0) - 推奨")
-    print("2. 高速 (duration=0.001, sleep=0.001)")
-    print("3. 中速 (duration=0.005, sleep=0.005)")
-    print("4. 安全速度 (duration=0.01, sleep=0.01)")
-    
-    speed_choice = input("選択 (1/2/3/4): ")
-    
-    if speed_choice == "1":
-        move_duration = 0
-        sleep_time = 0
-        print("最高速度モード: 瞬間描画")
-    elif speed_choice == "2":
-        move_duration = 0.001
-        sleep_time = 0.001
-        print("高速モード")
-    elif speed_choice == "3":
-        move_duration = 0.005
-        sleep_time = 0.005
-        print("中速モード")
-    elif speed_choice == "4":
-        move_duration = 0.01
-        sleep_time = 0.01
-        print("安全速度モード")
-    else:
-        move_duration = 0
-        sleep_time = 0
-        print("デフォルト: 最高速度モード")
+    move_duration, sleep_time = choose_drawing_speed()
     
     # 実際の描画を実行するか確認
     response = input("\n実際の描画を開始しますか？ (y/n): ")
@@ -388,7 +461,8 @@ def main():
         print("描画をキャンセルしました")
         print("以下のファイルが保存されています:")
         print("- binary_result.png (2値化結果)")
-        print("- drawing_preview_binary.png (描画予定のプレビュー)")
+        if not streaming:
+            print("- drawing_preview_binary.png (描画予定のプレビュー)")
         return
     
     print("3秒後に描画開始します。描画アプリにフォーカスを移してください！")
@@ -406,34 +480,26 @@ def main():
     keyboard_thread.start()
     
     # 描画実行
-    print(f"描画開始: {len(all_paths)}パス")
-    
-    for path_idx, path in enumerate(all_paths):
-        if check_stop():
-            break
+    if streaming:
+        print("ストリーミング描画開始")
+        drawn = []
         
-        if path_idx % 50 == 0:
-            print(f"描画進行: {path_idx}/{len(all_paths)}パス")
+        def draw_chunk(chunk):
+            drawn.append(chunk)
+            return draw_paths(chunk, move_duration, sleep_time, sum(map(len, drawn[:-1])))
         
-        if len(path) < 2:
-            continue
+        report = stream_draw(chunks, draw_chunk)
+        print(format_stream_report(report))
         
-        # パスの開始点に移動
-        pyautogui.moveTo(path[0][0], path[0][1])
-        pyautogui.mouseDown()
-        
-        # パスをなぞる
-        for point in path[1:]:
-            if check_stop():
-                break
-            pyautogui.moveTo(point[0], point[1], duration=move_duration)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-        
-        if not stop_drawing:
-            pyautogui.mouseUp()
-        if sleep_time > 0:
-            time.sleep(sleep_time)
+        preview_img = draw_paths_preview(PathBuffer.concatenate(drawn), draw_width, draw_height,
+                                         origin=(draw_x1, draw_y1))
+        cv2.imwrite("drawing_preview_binary.png", preview_img)
+        print("描いたパスのプレビューを 'drawing_preview_binary.png' に保存しました")
+    else:
+        print(f"描画開始: {len(all_paths)}パス")
+        drawing_start = time.perf_counter()
+        draw_paths(all_paths, move_duration, sleep_time, total=len(all_paths))
+        print(f"描画時間: {time.perf_counter() - drawing_start:.2f}秒")
     
     if stop_drawing:
         print("描画が中止されました！")
@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
-import json
+from paths import (PathBuffer, centerline_paths, format_resolution_plan, plan_resolution, resample_black_pixels,
+                   extract_runs)
+from binarize import adaptive_binarize
 
 def get_drawing_area():
     print("描画範囲を指定してください:")
@@ -15,7 +17,7 @@ def get_drawing_area():
         print("数値を入力してください")
         return None
 
-def create_binary_image(img, threshold=127, method="otsu"):
+def create_binary_image(img, threshold=127, method="otsu", window=51):
     """完全白黒2値化"""
     if method == "simple":
         _, binary = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY)
@@ -28,64 +30,29 @@ def create_binary_image(img, threshold=127, method="otsu"):
     elif method == "adaptive":
         binary = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
         print("適応的2値化")
+        
+    elif method in ("sauvola", "niblack"):
+        binary = adaptive_binarize(img, window, method)
+        print(f"{'Sauvola' if method == 'sauvola' else 'Niblack'}法 (窓: {window}px)")
     
     return binary
 
 def create_fill_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height):
     """黒い領域を塗りつぶすパスを生成"""
-    height, width = binary_img.shape
-    
-    # 黒ピクセルを検索
-    black_y, black_x = np.where(binary_img == 0)
-    
-    if len(black_x) == 0:
-        return []
-    
-    print(f"黒ピクセル数: {len(black_x)}")
-    
-    # 描画座標に変換
-    draw_x_coords = draw_x1 + ((black_x / width) * draw_width).astype(int)
-    draw_y_coords = draw_y1 + ((black_y / height) * draw_height).astype(int)
+    counts = resample_black_pixels(binary_img, draw_width, draw_height)
     
-    # Y座標ごとにX座標をグループ化
-    y_to_x_dict = {}
-    for x, y in zip(draw_x_coords, draw_y_coords):
-        if y not in y_to_x_dict:
-            y_to_x_dict[y] = []
-        y_to_x_dict[y].append(x)
+    if not counts.any():
+        return PathBuffer()
     
-    paths = []
+    print(f"黒ピクセル数: {int(counts.sum())}")
     
-    for y in sorted(y_to_x_dict.keys()):
-        x_coords = sorted(set(y_to_x_dict[y]))  # 重複除去
-        
-        if not x_coords:
-            continue
-        
-        # 連続する範囲を見つける
-        current_path = [{"x": x_coords[0], "y": y}]
-        
-        for i in range(1, len(x_coords)):
-            prev_x = x_coords[i-1]
-            curr_x = x_coords[i]
-            
-            # 連続している場合は同じパスに追加
-            if curr_x - prev_x <= 2:
-                current_path.append({"x": curr_x, "y": y})
-            else:
-                # パスを保存して新しいパスを開始
-                if len(current_path) >= 2:
-                    paths.append(current_path)
-                current_path = [{"x": curr_x, "y": y}]
-        
-        # 最後のパスを追加
-        if len(current_path) >= 2:
-            paths.append(current_path)
-    
-    return paths
+    # 同じ行でX座標の差が2以下の点をつなぐ（重複除去）
+    rows, _, _, points = extract_runs(counts, gap=2, min_points=2, return_points=True)
+    return PathBuffer.from_runs(rows, points, draw_x1, draw_y1)
 
 def generate_html_with_paths(paths, canvas_width, canvas_height):
     """描画パスを含むHTMLを生成"""
+    points_json, lengths_json = paths.to_json_arrays()
     
     html_template = f"""<!DOCTYPE html>
 <html lang="ja">
@@ -178,7 +145,7 @@ def generate_html_with_paths(paths, canvas_width, canvas_height):
         <div class="stats">
             <strong>描画データ:</strong><br>
             総パス数: {len(paths):,}<br>
-            総描画点数: {sum(len(path) for path in paths):,}<br>
+            総描画点数: {paths.total_points:,}<br>
             キャンバスサイズ: {canvas_width} x {canvas_height}
         </div>
     </div>
@@ -187,8 +154,17 @@ def generate_html_with_paths(paths, canvas_width, canvas_height):
         const canvas = document.getElementById('canvas');
         const ctx = canvas.getContext('2d');
         
-        // Pythonで生成された描画パス
-        const paths = {json.dumps(paths, indent=2)};
+        // Pythonで生成された描画パス（座標は [x0, y0, x1, y1, ...] に平坦化）
+        const points = {points_json};
+        const pathLengths = {lengths_json};
+        const paths = [];
+        for (let i = 0, index = 0; i < pathLengths.length; i++) {{
+            const path = [];
+            for (let j = 0; j < pathLengths[i]; j++, index += 2) {{
+                path.push({{x: points[index], y: points[index + 1]}});
+            }}
+            paths.push(path);
+        }}
         
         let isDrawing = false;
         
@@ -335,32 +311,26 @@ def main():
     print(f"描画範囲: ({draw_x1}, {draw_y1}) から ({draw_x2}, {draw_y2})")
     print(f"サイズ: {draw_width} x {draw_height}")
     
-    # 描画範囲に合わせて画像を最適化
+    # 描画範囲から作業解像度を決める（作業画像の1ピクセル = 描画の整数倍の正方形）
     height, width = img.shape
-    target_width = min(draw_width, 1000)
-    target_height = min(draw_height, 1000)
+    plan = plan_resolution(width, height, draw_width, draw_height)
+    print(format_resolution_plan(plan))
+    work_width, work_height = plan["work_size"]
+    scale = plan["scale"]
     
-    aspect_ratio = width / height
-    target_aspect = target_width / target_height
-    
-    if aspect_ratio > target_aspect:
-        new_width = target_width
-        new_height = int(target_width / aspect_ratio)
-    else:
-        new_height = target_height
-        new_width = int(target_height * aspect_ratio)
-    
-    if new_width != width or new_height != height:
-        img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-        print(f"描画範囲に最適化してリサイズ: {img.shape}")
+    if (work_width, work_height) != (width, height):
+        img = cv2.resize(img, (work_width, work_height), interpolation=cv2.INTER_AREA)
+        print(f"作業解像度にリサイズ: {img.shape}")
     
     # 2値化方法を選択
     print("\n2値化方法を選択してください:")
     print("1. 大津の手法 (自動閾値) - 推奨")
     print("2. シンプル閾値 (手動)")
     print("3. 適応的閾値 (局所的)")
+    print("4. Sauvola法 (局所的・大きな窓でも高速)")
+    print("5. Niblack法 (局所的・大きな窓でも高速)")
     
-    method_choice = input("選択 (1/2/3): ")
+    method_choice = input("選択 (1/2/3/4/5): ")
     
     if method_choice == "1":
         binary_img = create_binary_image(img, method="otsu")
@@ -369,6 +339,9 @@ def main():
         binary_img = create_binary_image(img, threshold, "simple")
     elif method_choice == "3":
         binary_img = create_binary_image(img, method="adaptive")
+    elif method_choice in ("4", "5"):
+        window = int(input("窓サイズを入力 (ピクセル, 推奨: 25-101): ") or "51")
+        binary_img = create_binary_image(img, method="sauvola" if method_choice == "4" else "niblack", window=window)
     else:
         binary_img = create_binary_image(img, method="otsu")
     
@@ -384,16 +357,27 @@ def main():
     print(f"2値化画像サイズ: {binary_img.shape}")
     print(f"黒ピクセル数: {black_pixels} ({black_ratio:.1f}%)")
     
-    # 塗りつぶしパスを生成
+    # 描画方法を選択
+    print("\n描画方法を選択してください:")
+    print("1. 塗りつぶし (ベタ塗り風)")
+    print("2. 中心線のみ (線画向け・線の中心を1回なぞる)")
+    
+    draw_method = input("選択 (1/2): ")
+    
     print("描画パスを生成中...")
-    paths = create_fill_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height)
+    if draw_method == "2":
+        paths = centerline_paths(binary_img, draw_x1, draw_y1, work_width * scale, work_height * scale)
+    else:
+        # 作業解像度で走査してから整数倍で描画範囲へ写す
+        paths = create_fill_paths(binary_img, 0, 0, work_width, work_height)
+        paths = paths.transform(scale=scale, offset=(draw_x1, draw_y1))
     
     if not paths:
         print("描画するパスが見つかりませんでした")
         return
     
     print(f"生成されたパス数: {len(paths)}")
-    total_points = sum(len(path) for path in paths)
+    total_points = paths.total_points
     print(f"総描画点数: {total_points}")
     
     # HTMLファイルを生成
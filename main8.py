@@ -1,5 +1,10 @@
 import cv2
 import numpy as np
+from paths import format_resolution_plan, plan_resolution, resample_black_pixels, extract_runs
+from binarize import adaptive_binarize, threshold_sweep, format_threshold_cost
+
+# これを超える黒ピクセル数は重くなるので警告する
+MAX_BLACK_PIXELS = 50000
 
 def get_canvas_size():
     print("キャンバスサイズを指定してください:")
@@ -12,7 +17,7 @@ def get_canvas_size():
         print("数値を入力してください")
         return None
 
-def create_binary_image(img, threshold=127, method="otsu"):
+def create_binary_image(img, threshold=127, method="otsu", window=51):
     """完全白黒2値化"""
     if method == "simple":
         _, binary = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY)
@@ -25,65 +30,32 @@ def create_binary_image(img, threshold=127, method="otsu"):
     elif method == "adaptive":
         binary = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
         print("適応的2値化")
+        
+    elif method in ("sauvola", "niblack"):
+        binary = adaptive_binarize(img, window, method)
+        print(f"{'Sauvola' if method == 'sauvola' else 'Niblack'}法 (窓: {window}px)")
     
     return binary
 
 def create_ultra_compressed_paths(binary_img, canvas_width, canvas_height):
     """超圧縮形式でパスを生成"""
-    height, width = binary_img.shape
-    
-    # 黒ピクセルを検索
-    black_y, black_x = np.where(binary_img == 0)
+    counts = resample_black_pixels(binary_img, canvas_width, canvas_height)
     
-    if len(black_x) == 0:
+    if not counts.any():
         return ""
     
-    print(f"黒ピクセル数: {len(black_x)}")
+    print(f"黒ピクセル数: {int(counts.sum())}")
     
-    # キャンバス座標に変換
-    draw_x_coords = ((black_x / width) * canvas_width).astype(np.uint16)
-    draw_y_coords = ((black_y / height) * canvas_height).astype(np.uint16)
+    # 同じ行でX座標の差が2以下の点をつなぎ、2点以上の線分だけ残す
+    rows, starts, ends = extract_runs(counts, gap=2, min_points=2)
     
-    # Y座標ごとにX座標をグループ化して連続線分を作成
-    y_to_x_dict = {}
-    for x, y in zip(draw_x_coords, draw_y_coords):
-        if y not in y_to_x_dict:
-            y_to_x_dict[y] = []
-        y_to_x_dict[y].append(x)
-    
-    # 超圧縮形式: "y:x1-x2,x3-x4;y2:x5-x6"
-    compressed_lines = []
-    
-    for y in sorted(y_to_x_dict.keys()):
-        x_coords = sorted(set(y_to_x_dict[y]))
-        
-        if not x_coords:
-            continue
-        
-        # 連続する範囲を見つけて圧縮
-        ranges = []
-        start_x = x_coords[0]
-        end_x = x_coords[0]
-        
-        for i in range(1, len(x_coords)):
-            if x_coords[i] - end_x <= 2:  # 連続
-                end_x = x_coords[i]
-            else:
-                # 範囲を保存
-                if end_x - start_x >= 1:  # 2点以上の線分のみ
-                    ranges.append(f"{start_x}-{end_x}")
-                start_x = x_coords[i]
-                end_x = x_coords[i]
-        
-        # 最後の範囲
-        if end_x - start_x >= 1:
-            ranges.append(f"{start_x}-{end_x}")
-        
-        if ranges:
-            compressed_lines.append(f"{y}:{','.join(ranges)}")
+    # 超圧縮形式: "y:x1-x2,x3-x4;y2:x5-x6"（線分は行順に並んでいる）
+    row_ranges = {}
+    for y, x1, x2 in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+        row_ranges.setdefault(y, []).append(f"{x1}-{x2}")
     
     # シンプルな圧縮（gzipなし）
-    compressed_str = ";".join(compressed_lines)
+    compressed_str = ";".join(f"{y}:{','.join(ranges)}" for y, ranges in row_ranges.items())
     
     print(f"圧縮データサイズ: {len(compressed_str)} bytes")
     
@@ -176,8 +148,10 @@ def generate_ultra_light_javascript(compressed_data, canvas_width, canvas_height
         
         const paths = decompressData();
         
+        // 作業解像度の1行がキャンバスの数行に広がるので、線の太さも合わせる
+        const lineWidth = Math.max(1, Math.round(Math.min(canvas.width / {canvas_width}, canvas.height / {canvas_height})));
         ctx.strokeStyle = '#000';
-        ctx.lineWidth = 1;
+        ctx.lineWidth = lineWidth;
         ctx.beginPath();
         
         for (const path of paths) {{
@@ -242,30 +216,38 @@ def main():
     
     print(f"キャンバスサイズ: {canvas_width} x {canvas_height}")
     
-    # 軽量化のため画像サイズを制限
+    # 軽量化のため作業解像度を長辺300ピクセル以下にする（キャンバスの整数分の1）
     height, width = img.shape
-    max_size = 300  # さらに小さく制限
-    
-    if max(width, height) > max_size:
-        if width > height:
-            new_width = max_size
-            new_height = int(height * (max_size / width))
-        else:
-            new_height = max_size
-            new_width = int(width * (max_size / height))
-        
-        img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    plan = plan_resolution(width, height, canvas_width, canvas_height, max_size=300)
+    print(format_resolution_plan(plan))
+    work_width, work_height = plan["work_size"]
+    
+    if (work_width, work_height) != (width, height):
+        img = cv2.resize(img, (work_width, work_height), interpolation=cv2.INTER_AREA)
         print(f"軽量化のためリサイズ: {img.shape}")
     
+    # 2値化せずに各方法のコストを求める（超圧縮形式は間隔2以下をつなぐ）
+    sweep = threshold_sweep(img, gap=2)
+    otsu_threshold = sweep["otsu"]
+    strong_threshold = 100
+    
     # 2値化方法を選択
     print("\n2値化方法を選択してください:")
-    print("1. 大津の手法 (自動閾値) - 推奨")
-    print("2. 強い閾値 (黒ピクセル削減)")
+    print(f"1. 大津の手法 (自動閾値) - 推奨  [{format_threshold_cost(sweep, otsu_threshold)}]")
+    print(f"2. 強い閾値 (黒ピクセル削減)    [{format_threshold_cost(sweep, strong_threshold)}]")
     
     method_choice = input("選択 (1/2): ")
     
+    # 2値化する前に黒ピクセル数を確認
+    expected_black = sweep["black_pixels"][strong_threshold if method_choice == "2" else otsu_threshold]
+    if expected_black > MAX_BLACK_PIXELS:
+        print("⚠️  黒ピクセルが多すぎます。より強い閾値を推奨します。")
+        choice = input("続行しますか？ (y/n): ")
+        if choice.lower() != "y":
+            return
+    
     if method_choice == "2":
-        binary_img = create_binary_image(img, 100, "simple")  # 強い閾値
+        binary_img = create_binary_image(img, strong_threshold, "simple")  # 強い閾値
     else:
         binary_img = create_binary_image(img, method="otsu")
     
@@ -281,15 +263,10 @@ def main():
     print(f"2値化画像サイズ: {binary_img.shape}")
     print(f"黒ピクセル数: {black_pixels} ({black_ratio:.1f}%)")
     
-    if black_pixels > 50000:
-        print("⚠️  黒ピクセルが多すぎます。より強い閾値を推奨します。")
-        choice = input("続行しますか？ (y/n): ")
-        if choice.lower() != "y":
-            return
-    
     # 超圧縮パスを生成
     print("超圧縮パスを生成中...")
-    compressed_data = create_ultra_compressed_paths(binary_img, canvas_width, canvas_height)
+    # 座標は作業解像度のまま書き出し、キャンバスへの拡大はJS側で行う（データも短くなる）
+    compressed_data = create_ultra_compressed_paths(binary_img, work_width, work_height)
     
     if not compressed_data:
         print("描画するパスが見つかりませんでした")
@@ -309,7 +286,7 @@ def main():
         canvas_selector = "canvas"
     
     # 超軽量JavaScriptコードを生成
-    js_code = generate_ultra_light_javascript(compressed_data, canvas_width, canvas_height, canvas_selector)
+    js_code = generate_ultra_light_javascript(compressed_data, work_width, work_height, canvas_selector)
     
     # JSファイルに保存
     output_file = "ultra_drawer.js"
@@ -0,0 +1,1384 @@
+import atexit
+import math
+import time
+from multiprocessing import Pool, cpu_count, shared_memory
+import cv2
+import numpy as np
+
+# これ未満の画素数なら並列化せずに1プロセスで処理する
+PARALLEL_MIN_PIXELS = 1_000_000
+
+# 呼び出しをまたいで使い回すプロセスプール
+_pool = None
+_pool_workers = 0
+
+
+def _coordinate_map(size, out_size):
+    """
+    元画像の座標 0..size-1 を描画座標へ写す（i * out_size // size）
+
+    従来の int(i / size * out_size) は浮動小数の丸めで 1 小さくなることがあり
+    （116 / 400 * 400 = 115.99...）、同じ大きさでも描画の行・列が抜けていた。
+    整数演算なら size == out_size で恒等写像、out_size が size の整数倍なら等間隔になる。
+    """
+    return np.arange(size, dtype=np.intp) * out_size // size
+
+
+def _resample_band(binary_img, out_width, out_height, row_start, row_stop):
+    """行 [row_start, row_stop) の黒ピクセルを描画グリッドへ写す（帯の最初の描画行も返す）"""
+    height, width = binary_img.shape
+    rows = _coordinate_map(height, out_height)[row_start:row_stop]
+    if len(rows) == 0:
+        return np.zeros((0, out_width), dtype=np.int32), 0
+
+    black = (binary_img[row_start:row_stop] == 0).astype(np.int32)
+
+    row_targets, row_first = np.unique(rows, return_index=True)
+    black = np.add.reduceat(black, row_first, axis=0)
+
+    cols = _coordinate_map(width, out_width)
+    col_targets, col_first = np.unique(cols, return_index=True)
+    black = np.add.reduceat(black, col_first, axis=1)
+
+    first_row = int(row_targets[0])
+    counts = np.zeros((int(row_targets[-1]) - first_row + 1, out_width), dtype=np.int32)
+    counts[np.ix_(row_targets - first_row, col_targets)] = black
+    return counts, first_row
+
+
+def resample_black_pixels(binary_img, out_width, out_height):
+    """
+    黒ピクセルを描画座標のグリッドへ写し、各マスに写った黒ピクセル数を数える
+
+    各画素の描画座標は x * out_width // width（_coordinate_map）で求める。
+    写像は単調なので、同じマスへ写る行・列を reduceat でまとめて合計する。
+
+    Returns:
+        (out_height, out_width) の int32 配列
+    """
+    height, width = binary_img.shape
+    counts = np.zeros((max(out_height, 0), max(out_width, 0)), dtype=np.int32)
+    if height == 0 or width == 0 or out_width <= 0 or out_height <= 0:
+        return counts
+
+    band, first_row = _resample_band(binary_img, out_width, out_height, 0, height)
+    counts[first_row:first_row + len(band)] = band
+    return counts
+
+
+def _legacy_work_size(image_width, image_height, draw_width, draw_height, max_size):
+    """従来の決め方：min(描画範囲, max_size) の枠にアスペクト比を保って収める"""
+    target_width, target_height = min(draw_width, max_size), min(draw_height, max_size)
+    aspect_ratio = image_width / image_height
+    if aspect_ratio > target_width / target_height:
+        return target_width, max(int(target_width / aspect_ratio), 1)
+    return max(int(target_height * aspect_ratio), 1), target_height
+
+
+def _mapping_collisions(size, out_size):
+    """size → out_size の写像で、同じ描画座標に重なる数と、どこからも写らない描画座標の数"""
+    used = len(np.unique(_coordinate_map(size, out_size)))
+    return size - used, out_size - used
+
+
+def plan_resolution(image_width, image_height, draw_width, draw_height, pen_width=1, max_size=1000):
+    """
+    描画範囲とペン幅から作業解像度を決める
+
+    作業画像の1ピクセルが描画範囲の scale × scale ピクセルにちょうど対応するように
+    scale を整数で選ぶ（scale = 1 なら 1:1）。ペン幅より細かく描いても線が重なるだけなので
+    scale はペン幅以上にし、長辺が max_size を超える場合はさらに大きくする。
+    作業画像は描画範囲と同じ比率に引き伸ばす（従来の x / width * draw_width の写像と同じ見た目）。
+
+    Args:
+        image_width, image_height: 入力画像のサイズ
+        draw_width, draw_height: 描画範囲のサイズ
+        pen_width: ペン幅（ピクセル）
+        max_size: 作業画像の長辺の上限
+
+    Returns:
+        dict: scale, work_size (幅, 高さ), legacy_size（従来の作業サイズ）,
+              legacy_merged / legacy_skipped（従来の写像で重なる・抜ける行と列の数）
+    """
+    scale = max(int(pen_width), math.ceil(max(draw_width, draw_height) / max_size), 1)
+    work_size = (max(draw_width // scale, 1), max(draw_height // scale, 1))
+
+    legacy_size = _legacy_work_size(image_width, image_height, draw_width, draw_height, max_size)
+    merged_x, skipped_x = _mapping_collisions(legacy_size[0], draw_width)
+    merged_y, skipped_y = _mapping_collisions(legacy_size[1], draw_height)
+    return {
+        "scale": scale,
+        "work_size": work_size,
+        "legacy_size": legacy_size,
+        "legacy_merged": (merged_x, merged_y),
+        "legacy_skipped": (skipped_x, skipped_y),
+    }
+
+
+def format_resolution_plan(plan, points=None):
+    """
+    作業解像度の計画と、従来の決め方に比べた画素数（と描画点数の見込み）の差を文字列にする
+
+    Args:
+        plan: plan_resolution の戻り値
+        points: 作業解像度で生成した描画点数。指定すると従来の解像度での点数を
+                画素数の比から見積もって並べる
+    """
+    (width, height), (legacy_width, legacy_height) = plan["work_size"], plan["legacy_size"]
+    pixels, legacy_pixels = width * height, legacy_width * legacy_height
+    rate = (1 - pixels / legacy_pixels) * 100
+    change = f"{rate:.1f}%削減" if rate >= 0 else f"{-rate:.1f}%増加、従来は描画の行・列が抜けていた"
+    lines = [
+        f"作業解像度: {width} x {height} (1ピクセル = 描画 {plan['scale']}x{plan['scale']} ピクセル)",
+        f"画素数: 従来 {legacy_width} x {legacy_height} = {legacy_pixels} → {pixels} ({change})",
+        f"従来の写像で重なる行・列: {plan['legacy_merged'][1]}行 {plan['legacy_merged'][0]}列, "
+        f"抜ける行・列: {plan['legacy_skipped'][1]}行 {plan['legacy_skipped'][0]}列",
+    ]
+    if points is not None:
+        legacy_points = round(points * legacy_pixels / pixels)
+        lines.append(f"描画点数の見込み: 従来 約{legacy_points} → {points}")
+    return "\n".join(lines)
+
+
+def extract_runs(counts, gap=1, min_points=1, duplicates=False, return_points=False):
+    """
+    各行の黒マスを、X座標の差が gap 以下なら同じ線分としてつなぐ
+
+    従来の y_to_x_dict → sorted(set(...)) → 隣接差で分割、のループと同じ線分を
+    画像全体の配列演算で求める。
+
+    Args:
+        counts: 黒マスの配列（bool、または resample_black_pixels の個数）
+        gap: 同じ線分とみなすX座標の差の上限
+        min_points: 線分に必要な点数
+        duplicates: 同じマスに写った複数の黒ピクセルを別の点として数えるか
+                    （main4 の従来実装は重複を除かずに並べていた）
+        return_points: 線分を構成する点も返すか
+
+    Returns:
+        (rows, starts, ends) 各線分の行と両端のX座標。
+        return_points=True なら (rows, starts, ends, (xs, first, count)) を返し、
+        線分 i の点のX座標は xs[first[i]:first[i] + count[i]]
+    """
+    ys, xs = np.nonzero(counts)
+    n = len(xs)
+
+    # 行が変わるか、前の点から gap を超えて離れたら新しい線分
+    new_run = np.ones(n, dtype=bool)
+    new_run[1:] = (ys[1:] != ys[:-1]) | (xs[1:] - xs[:-1] > gap)
+    begin = np.flatnonzero(new_run)
+    end = np.append(begin[1:], n)
+
+    if duplicates:
+        multiplicity = counts[ys, xs].astype(np.intp)
+        cumulative = np.concatenate(([0], np.cumsum(multiplicity)))
+        points = cumulative[end] - cumulative[begin]
+    else:
+        points = end - begin
+
+    keep = points >= min_points
+    rows = ys[begin[keep]]
+    starts = xs[begin[keep]]
+    ends = xs[end[keep] - 1]
+
+    if not return_points:
+        return rows, starts, ends
+
+    if duplicates:
+        # 重複を含めて並べ直す（xs は元々行・X順にソート済み）
+        return rows, starts, ends, (np.repeat(xs, multiplicity), cumulative[begin[keep]], points[keep])
+    return rows, starts, ends, (xs, begin[keep], points[keep])
+
+
+def runs_to_point_lists(rows, points, offset_x=0, offset_y=0):
+    """extract_runs の結果を従来形式の [[(x, y), ...], ...] に変換"""
+    xs, first, count = points
+    xs = (xs + offset_x).tolist()
+    ys = (rows + offset_y).tolist()
+    return [
+        [(x, y) for x in xs[start:start + length]]
+        for y, start, length in zip(ys, first.tolist(), count.tolist())
+    ]
+
+
+def _band_runs(counts, first_row, gap, min_points, duplicates):
+    """帯の描画グリッドから線分を取り、残った線分の点だけを詰めた小さな整数配列にする"""
+    rows, starts, ends, (xs, first, count) = extract_runs(counts, gap, min_points, duplicates,
+                                                          return_points=True)
+    packed_first = np.cumsum(count) - count
+    take = np.repeat(first - packed_first, count) + np.arange(int(count.sum()))
+    return ((rows + first_row).astype(np.int32), starts.astype(np.int32), ends.astype(np.int32),
+            xs[take].astype(np.int32), packed_first, count)
+
+
+def _extract_band_runs(args):
+    """並列線分抽出のワーカー: 共有メモリ上の2値画像から行の帯を処理する"""
+    shm_name, shape, row_start, row_stop, out_width, out_height, gap, min_points, duplicates = args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        binary_img = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        counts, first_row = _resample_band(binary_img, out_width, out_height, row_start, row_stop)
+        del binary_img
+    finally:
+        shm.close()
+    return _band_runs(counts, first_row, gap, min_points, duplicates)
+
+
+def _band_bounds(height, out_height, bands):
+    """
+    行 0..height-1 を約 bands 個の帯に分ける境界 [0, ..., height]
+
+    同じ描画行に写る行の先頭だけを境界にするので、帯ごとに写して線分を取っても
+    画像全体で処理した場合と同じ線分になる。
+    """
+    row_first = np.flatnonzero(np.diff(_coordinate_map(height, out_height), prepend=-1))
+    bands = max(min(bands, len(row_first)), 1)
+    position = np.searchsorted(row_first, np.linspace(0, height, bands + 1)[:-1])
+    cuts = np.unique(row_first[np.minimum(position, len(row_first) - 1)])
+    return np.append(cuts, height).tolist()
+
+
+def _close_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+        _pool_workers = 0
+
+
+def get_pool(workers):
+    """使い回しのプロセスプールを返す（プロセス数が変わったときだけ作り直す）"""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        _close_pool()
+        _pool = Pool(processes=workers)
+        _pool_workers = workers
+    return _pool
+
+
+atexit.register(_close_pool)
+
+
+def parallel_extract_runs(binary_img, out_width, out_height, gap=1, min_points=1,
+                          duplicates=False, workers=None):
+    """
+    resample_black_pixels → extract_runs(return_points=True) を行の帯ごとに並列実行する
+
+    2値画像は共有メモリに1回だけ置き、各ワーカーは自分の帯だけを読む。
+    帯の境界は同じ描画行に写る行を分けない位置に取るので、結果は1プロセス版と一致する。
+
+    Args:
+        binary_img: 2値画像 (uint8, 黒=0)
+        out_width, out_height: 描画グリッドのサイズ
+        gap, min_points, duplicates: extract_runs と同じ
+        workers: プロセス数（Noneならコア数。小さな画像は1プロセスで処理）
+
+    Returns:
+        extract_runs(return_points=True) と同じ (rows, starts, ends, (xs, first, count))
+    """
+    height, width = binary_img.shape
+    if workers is None:
+        workers = cpu_count() if binary_img.size >= PARALLEL_MIN_PIXELS else 1
+    if workers <= 1 or out_width <= 0 or out_height <= 0:
+        counts = resample_black_pixels(binary_img, out_width, out_height)
+        return extract_runs(counts, gap, min_points, duplicates, return_points=True)
+
+    bounds = _band_bounds(height, out_height, workers)
+    if len(bounds) <= 2:
+        counts = resample_black_pixels(binary_img, out_width, out_height)
+        return extract_runs(counts, gap, min_points, duplicates, return_points=True)
+
+    shm = shared_memory.SharedMemory(create=True, size=binary_img.nbytes)
+    try:
+        shared = np.ndarray(binary_img.shape, dtype=np.uint8, buffer=shm.buf)
+        shared[...] = binary_img
+        tasks = [
+            (shm.name, binary_img.shape, bounds[i], bounds[i + 1], out_width, out_height,
+             gap, min_points, duplicates)
+            for i in range(len(bounds) - 1)
+        ]
+        results = get_pool(workers).map(_extract_band_runs, tasks)
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # 帯ごとの点の添字を通し番号にずらして連結する
+    offsets = np.cumsum([0] + [len(result[3]) for result in results[:-1]])
+    rows = np.concatenate([result[0] for result in results])
+    starts = np.concatenate([result[1] for result in results])
+    ends = np.concatenate([result[2] for result in results])
+    xs = np.concatenate([result[3] for result in results])
+    first = np.concatenate([result[4] + offset for result, offset in zip(results, offsets)])
+    count = np.concatenate([result[5] for result in results])
+    return rows, starts, ends, (xs, first, count)
+
+
+def iter_band_runs(binary_img, out_width, out_height, gap=1, min_points=1, duplicates=False,
+                   band_height=64, workers=1):
+    """
+    resample_black_pixels → extract_runs(return_points=True) を行の帯ごとに順に返すジェネレータ
+
+    上の帯から順に、出来たものから返すので、後の帯を計算している間に前の帯を使える
+    （描画しながらパスを作るストリーミング用）。workers > 1 なら帯を使い回しの
+    プロセスプールで先回りして計算する。全部の帯を連結すると parallel_extract_runs と
+    同じ線分になる。
+
+    Args:
+        binary_img: 2値画像 (uint8, 黒=0)
+        out_width, out_height: 描画グリッドのサイズ
+        gap, min_points, duplicates: extract_runs と同じ
+        band_height: 1つの帯の描画行数の目安
+        workers: プロセス数
+
+    Yields:
+        帯ごとの (rows, starts, ends, (xs, first, count))。rows は描画グリッドの行
+    """
+    height, width = binary_img.shape
+    if out_width <= 0 or out_height <= 0 or height == 0:
+        return
+    bounds = _band_bounds(height, out_height, -(-out_height // max(band_height, 1)))
+
+    def unpack(result):
+        rows, starts, ends, xs, first, count = result
+        return rows, starts, ends, (xs, first, count)
+
+    if workers <= 1:
+        for row_start, row_stop in zip(bounds[:-1], bounds[1:]):
+            counts, first_row = _resample_band(binary_img, out_width, out_height, row_start, row_stop)
+            yield unpack(_band_runs(counts, first_row, gap, min_points, duplicates))
+        return
+
+    shm = shared_memory.SharedMemory(create=True, size=binary_img.nbytes)
+    try:
+        shared = np.ndarray(binary_img.shape, dtype=np.uint8, buffer=shm.buf)
+        shared[...] = binary_img
+        del shared
+        tasks = [
+            (shm.name, binary_img.shape, bounds[i], bounds[i + 1], out_width, out_height,
+             gap, min_points, duplicates)
+            for i in range(len(bounds) - 1)
+        ]
+        # imap は帯の順に結果を返すので、先頭の帯が出来しだい使える
+        for result in get_pool(workers).imap(_extract_band_runs, tasks):
+            yield unpack(result)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class PathBuffer:
+    """
+    パスの集合を1本の座標配列とオフセット配列で持つコンテナ
+
+    パス i の点は points[offsets[i]:offsets[i + 1]]。リストのリストに比べて
+    メモリが小さく、切り出し・連結・座標変換が配列演算で済む。
+
+    Attributes:
+        points: (点数, 2) の int32 配列 [x, y]
+        offsets: (パス数 + 1,) の int64 配列
+    """
+
+    def __init__(self, points=None, offsets=None):
+        self.points = np.zeros((0, 2), dtype=np.int32) if points is None else points
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else offsets
+
+    @classmethod
+    def from_lengths(cls, points, lengths):
+        """点の配列と各パスの点数から作る"""
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.ascontiguousarray(points, dtype=np.int32).reshape(-1, 2), offsets)
+
+    @classmethod
+    def from_runs(cls, rows, points, offset_x=0, offset_y=0):
+        """extract_runs(return_points=True) の結果から作る（各線分が1本のパス）"""
+        xs, first, count = points
+        packed_first = np.cumsum(count) - count
+        take = np.repeat(first - packed_first, count) + np.arange(int(np.sum(count)))
+        coords = np.empty((len(take), 2), dtype=np.int32)
+        coords[:, 0] = xs[take] + offset_x
+        coords[:, 1] = np.repeat(rows, count) + offset_y
+        return cls.from_lengths(coords, count)
+
+    @classmethod
+    def from_lists(cls, paths):
+        """[[(x, y), ...], ...] 形式（または点の配列のリスト）から作る"""
+        lengths = [len(path) for path in paths]
+        if sum(lengths) == 0:
+            return cls.from_lengths(np.zeros((0, 2)), lengths)
+        return cls.from_lengths(np.concatenate([np.asarray(path).reshape(-1, 2) for path in paths if len(path)]),
+                                lengths)
+
+    @classmethod
+    def concatenate(cls, buffers):
+        """複数の PathBuffer を順に連結する"""
+        buffers = [buffer for buffer in buffers if len(buffer)]
+        if not buffers:
+            return cls()
+        return cls.from_lengths(np.concatenate([buffer.points for buffer in buffers]),
+                                np.concatenate([buffer.lengths() for buffer in buffers]))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """整数ならそのパスの点 (n, 2)、スライスなら PathBuffer（どちらもビュー）"""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.select(np.arange(start, stop, step))
+            stop = max(stop, start)
+            offsets = self.offsets[start:stop + 1]
+            return PathBuffer(self.points[offsets[0]:offsets[-1]], offsets - offsets[0])
+        if index < 0:
+            index += len(self)
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        points = self.points
+        bounds = self.offsets.tolist()
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            yield points[start:stop]
+
+    def lengths(self):
+        """各パスの点数"""
+        return np.diff(self.offsets)
+
+    @property
+    def total_points(self):
+        return int(self.offsets[-1])
+
+    def path_index(self):
+        """各点が属するパスの番号"""
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    def select(self, indices):
+        """指定した番号（またはbool配列）のパスだけを取り出す"""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        lengths = self.lengths()[indices]
+        starts = self.offsets[indices]
+        take = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(int(lengths.sum()))
+        return PathBuffer.from_lengths(self.points[take], lengths)
+
+    def transform(self, scale=1.0, offset=(0, 0), matrix=None):
+        """
+        座標をアフィン変換した新しい PathBuffer を返す
+
+        Args:
+            scale: 拡大率（スカラーまたは (sx, sy)）
+            offset: 平行移動 (dx, dy)
+            matrix: 2x3 のアフィン行列（指定時は scale と offset より優先）
+        """
+        if matrix is None:
+            sx, sy = np.broadcast_to(np.asarray(scale, dtype=np.float64), (2,))
+            matrix = [[sx, 0.0, offset[0]], [0.0, sy, offset[1]]]
+        matrix = np.asarray(matrix, dtype=np.float64)
+        transformed = self.points @ matrix[:, :2].T + matrix[:, 2]
+        return PathBuffer(np.rint(transformed).astype(np.int32), self.offsets.copy())
+
+    def translate(self, dx, dy):
+        """整数の平行移動（丸め誤差なし）"""
+        return PathBuffer(self.points + np.array([dx, dy], dtype=np.int32), self.offsets.copy())
+
+    def to_lists(self):
+        """従来形式の [[(x, y), ...], ...] に変換"""
+        coords = self.points.tolist()
+        bounds = self.offsets.tolist()
+        return [[tuple(point) for point in coords[start:stop]] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def to_json_arrays(self):
+        """JS用に平坦化した座標 [x0,y0,x1,y1,...] と各パスの点数の文字列を返す"""
+        points = ",".join(map(str, self.points.ravel().tolist()))
+        lengths = ",".join(map(str, self.lengths().tolist()))
+        return f"[{points}]", f"[{lengths}]"
+
+
+def draw_paths_preview(paths, width, height, origin=(0, 0), color=(0, 0, 0), thickness=1):
+    """PathBuffer を白いキャンバスに折れ線として描いたプレビュー画像を返す"""
+    preview_img = np.full((int(height), int(width), 3), 255, dtype=np.uint8)
+    if not len(paths):
+        return preview_img
+
+    relative = paths.translate(-origin[0], -origin[1])
+    lengths = relative.lengths()
+    polylines = [path for path, length in zip(relative, lengths.tolist()) if length >= 2]
+    cv2.polylines(preview_img, polylines, False, color, thickness)
+    return preview_img
+
+
+def _interior_mask(paths):
+    """各点がパスの最初・最後の点でないか（パスの中間点なら True）"""
+    interior = np.ones(paths.total_points, dtype=bool)
+    lengths = paths.lengths()
+    nonempty = lengths > 0
+    interior[paths.offsets[:-1][nonempty]] = False
+    interior[paths.offsets[1:][nonempty] - 1] = False
+    return interior
+
+
+def _keep_points(paths, keep):
+    """keep が True の点だけを残した PathBuffer を返す"""
+    kept = np.zeros(paths.total_points + 1, dtype=np.int64)
+    np.cumsum(keep, out=kept[1:])
+    return PathBuffer(paths.points[keep], kept[paths.offsets])
+
+
+def remove_collinear(paths):
+    """
+    見た目を変えずに落とせる中間点を除く
+
+    パスの中間点のうち、直前の点と同じ点と、前後の点と一直線上で
+    折り返さない点を取り除く。最初と最後の点は必ず残すので、
+    [p, p] のような点描画のパスもそのまま残る。
+    """
+    if paths.total_points == 0:
+        return paths
+
+    # 連続する同じ点を1つにまとめる
+    points = paths.points.astype(np.int64)
+    same = np.zeros(len(points), dtype=bool)
+    same[1:] = np.all(points[1:] == points[:-1], axis=1)
+    paths = _keep_points(paths, ~(same & _interior_mask(paths)))
+
+    # 前後の点と一直線上（外積 0）で、同じ向きに進む（内積 >= 0）点を除く
+    points = paths.points.astype(np.int64)
+    before = np.zeros_like(points)
+    after = np.zeros_like(points)
+    before[1:] = points[1:] - points[:-1]
+    after[:-1] = points[1:] - points[:-1]
+    cross = before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]
+    dot = np.sum(before * after, axis=1)
+    return _keep_points(paths, ~((cross == 0) & (dot >= 0) & _interior_mask(paths)))
+
+
+def _douglas_peucker(path, tolerance):
+    """1本のパスの Douglas–Peucker 簡略化で残す点の bool 配列"""
+    keep = np.zeros(len(path), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(path) - 1)]
+    while stack:
+        start, stop = stack.pop()
+        if stop - start < 2:
+            continue
+        origin = path[start]
+        direction = path[stop] - origin
+        offsets = path[start + 1:stop] - origin
+        norm = np.hypot(*direction)
+        if norm == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / norm
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, stop))
+    return keep
+
+
+def _visvalingam(path, tolerance):
+    """1本のパスの Visvalingam–Whyatt 簡略化で残す点の bool 配列（三角形の面積が tolerance² 未満を除く）"""
+    count = len(path)
+    keep = np.ones(count, dtype=bool)
+    if count < 3:
+        return keep
+
+    previous = np.arange(-1, count - 1)
+    following = np.arange(1, count + 1)
+
+    def area(i):
+        a, b, c = path[previous[i]], path[i], path[following[i]]
+        return abs((b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])) / 2.0
+
+    areas = np.full(count, np.inf)
+    for i in range(1, count - 1):
+        areas[i] = area(i)
+
+    limit = tolerance * tolerance
+    while True:
+        i = int(np.argmin(areas))
+        if areas[i] >= limit:
+            break
+        removed = areas[i]
+        keep[i] = False
+        areas[i] = np.inf
+        before, after = previous[i], following[i]
+        following[before] = after
+        previous[after] = before
+        # 隣の三角形の面積は消した点の面積より小さくしない（Visvalingam の補正）
+        for neighbor in (before, after):
+            if 0 < neighbor < count - 1:
+                areas[neighbor] = max(area(neighbor), removed)
+    return keep
+
+
+SIMPLIFY_METHODS = {
+    "douglas_peucker": _douglas_peucker,
+    "visvalingam": _visvalingam,
+}
+
+
+def simplify_paths(paths, tolerance=0.0, method="douglas_peucker"):
+    """
+    パスの点を減らす
+
+    まず remove_collinear で見た目が変わらない点を除き、tolerance > 0 なら
+    さらに指定の方法で tolerance ピクセル以内の誤差で簡略化する。
+    輪郭線やストロークのように斜めの点が多いパス向け。
+
+    Args:
+        paths: PathBuffer
+        tolerance: 許容誤差（ピクセル）。0 なら一直線上の点の除去のみ
+        method: "douglas_peucker" または "visvalingam"
+
+    Returns:
+        簡略化した PathBuffer
+    """
+    if method not in SIMPLIFY_METHODS:
+        raise ValueError(f"unknown simplification method: {method}")
+
+    paths = remove_collinear(paths)
+    if tolerance <= 0 or paths.total_points == 0:
+        return paths
+
+    simplify = SIMPLIFY_METHODS[method]
+    keep = np.ones(paths.total_points, dtype=bool)
+    points = paths.points.astype(np.float64)
+    bounds = paths.offsets.tolist()
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if stop - start >= 3:
+            keep[start:stop] = simplify(points[start:stop], tolerance)
+    return _keep_points(paths, keep)
+
+
+def format_point_reduction(before, after, seconds_per_point):
+    """簡略化前後の点数と推定時間を1行の文字列にする"""
+    before_points, after_points = before.total_points, after.total_points
+    rate = (1 - after_points / before_points) * 100 if before_points else 0.0
+    return (f"描画点数 {before_points} → {after_points} ({rate:.1f}%削減), "
+            f"推定時間 {before_points * seconds_per_point:.1f}秒 → {after_points * seconds_per_point:.1f}秒")
+
+
+def _overlapping_runs(rows, starts, ends, row, low, high, from_end):
+    """
+    行 row で区間 [low, high] と重なる線分のうち、from_end なら一番右、そうでなければ一番左の番号
+    （なければ -1）。線分は行・開始X順に並んでいること
+    """
+    width = int(max(ends.max(), high.max())) + 1
+    row = row.astype(np.int64)
+    if from_end:
+        keys = rows.astype(np.int64) * width + starts
+        index = np.searchsorted(keys, row * width + high, side="right") - 1
+    else:
+        keys = rows.astype(np.int64) * width + ends
+        index = np.searchsorted(keys, row * width + low, side="left")
+    found = (index >= 0) & (index < len(rows))
+    index = np.clip(index, 0, len(rows) - 1)
+    found &= (rows[index] == row) & (starts[index] <= high) & (ends[index] >= low)
+    return np.where(found, index, -1)
+
+
+def chain_runs(rows, starts, ends, points, offset_x=0, offset_y=0):
+    """
+    隣り合う行の線分を蛇行（往復）する1本のストロークにつなぐ
+
+    線分を塗り終えた端から、1行下の重なる線分のうち一番近いものへ移る。
+    移動は今の線分の上を戻ってから、上下とも黒い列で1ピクセル下りるだけなので、
+    白い部分をペンが横切ることはない。下の線分は遠い方の端まで塗り、そこを次の出口にする。
+    ペン上げ回数は線分数からストローク数に減る。
+
+    Args:
+        rows, starts, ends, points: extract_runs(return_points=True) の結果
+        offset_x, offset_y: 描画座標への平行移動
+
+    Returns:
+        各ストロークの折れ線（線分の両端と移動点）を持つ PathBuffer
+    """
+    if len(rows) == 0:
+        return PathBuffer()
+
+    xs, first, count = points
+    run_of_point = np.repeat(np.arange(len(rows)), count)
+    point_xs = xs[np.repeat(first - (np.cumsum(count) - count), count) + np.arange(int(np.sum(count)))]
+    black = np.zeros((int(rows.max()) + 2, int(max(ends.max(), point_xs.max())) + 1), dtype=bool)
+    black[rows[run_of_point], point_xs] = True
+
+    # 各線分の左端・右端から1行下へ移れる線分と、下りる列
+    below = rows + 1
+    next_from = []
+    for from_end in (False, True):
+        candidate = _overlapping_runs(rows, starts, ends, below, starts, ends, from_end)
+        matched = np.maximum(candidate, 0)
+        column = np.minimum(ends, ends[matched]) if from_end else np.maximum(starts, starts[matched])
+        candidate[~(black[rows, column] & black[below, column])] = -1
+        next_from.append((candidate.tolist(), column.tolist()))
+    next_from_start, next_from_end = next_from
+
+    row_list, start_list, end_list = rows.tolist(), starts.tolist(), ends.tolist()
+    used = [False] * len(row_list)
+    paths = []
+    lengths = []
+    for first_run in range(len(row_list)):
+        if used[first_run]:
+            continue
+        run, y = first_run, row_list[first_run]
+        used[run] = True
+        stroke = [start_list[run], y, end_list[run], y]
+        exit_is_end = True
+        while True:
+            candidates, columns = next_from_end if exit_is_end else next_from_start
+            run, column = candidates[run], columns[run]
+            if run < 0 or used[run]:
+                break
+            used[run] = True
+            start, end = start_list[run], end_list[run]
+            # 下りた位置から近い端へ行き、遠い端を出口にする
+            exit_is_end = column - start <= end - column
+            near, far = (start, end) if exit_is_end else (end, start)
+            stroke += [column, y, column, y + 1, near, y + 1, far, y + 1]
+            y += 1
+        paths.append(stroke)
+        lengths.append(len(stroke) // 2)
+
+    coords = np.fromiter((value for stroke in paths for value in stroke), dtype=np.int32)
+    chained = PathBuffer.from_lengths(coords, lengths)
+    return remove_collinear(chained.translate(offset_x, offset_y))
+
+
+def _path_ends(paths):
+    """各パスの始点と終点 (パス数, 2) を float64 で返す（空のパスは含めないこと）"""
+    points = paths.points.astype(np.float64)
+    return points[paths.offsets[:-1]], points[paths.offsets[1:] - 1]
+
+
+def travel_distance(paths):
+    """パスの終点から次のパスの始点までのペン移動距離の合計"""
+    if len(paths) < 2:
+        return 0.0
+    nonempty = paths.select(paths.lengths() > 0)
+    starts, ends = _path_ends(nonempty)
+    return float(np.sum(np.hypot(*(starts[1:] - ends[:-1]).T)))
+
+
+class _EndpointGrid:
+    """パス端点の一様グリッド索引（訪問済みの端点は走査時に取り除く）"""
+
+    # この半径（マス数）まで探して見つからなければ残りの全端点から探す
+    MAX_RING = 6
+
+    def __init__(self, coords, cell):
+        self.coords = coords
+        self.cell = cell
+        self.xy = coords.tolist()
+        self.alive = bytearray(b"\x01") * len(coords)
+        self.remaining = len(coords)
+        self.candidates = np.arange(len(coords))
+
+        # マス (kx, ky) を1つの整数 kx * stride + ky で表す。
+        # Y方向に余白を取り、探索半径内では隣の列と番号が重ならないようにする
+        self.origin = coords.min(axis=0) if len(coords) else np.zeros(2)
+        self.pad = 3 * self.MAX_RING
+        cells = np.floor((coords - self.origin) / cell).astype(np.int64) + self.pad
+        self.stride = int(cells[:, 1].max(initial=0)) + 2 * self.pad + 1
+        keys = cells[:, 0] * self.stride + cells[:, 1]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        split = np.flatnonzero(np.diff(sorted_keys)) + 1
+        self.cells = {
+            int(key): members.tolist()
+            for key, members in zip(sorted_keys[np.append(0, split)], np.split(order, split))
+        }
+        self._rings = [[0]]
+
+    def key(self, x, y):
+        return ((math.floor((x - self.origin[0]) / self.cell) + self.pad) * self.stride +
+                math.floor((y - self.origin[1]) / self.cell) + self.pad)
+
+    def ring(self, r):
+        """中心のマスから距離 r のマスへのキーの差分"""
+        while len(self._rings) <= r:
+            k = len(self._rings)
+            stride = self.stride
+            offsets = [dx * stride - k for dx in range(-k, k + 1)]
+            offsets += [dx * stride + k for dx in range(-k, k + 1)]
+            offsets += [-k * stride + dy for dy in range(-k + 1, k)]
+            offsets += [k * stride + dy for dy in range(-k + 1, k)]
+            self._rings.append(offsets)
+        return self._rings[r]
+
+    def remove(self, index):
+        if self.alive[index]:
+            self.alive[index] = 0
+            self.remaining -= 1
+
+    def nearest(self, x, y):
+        """(x, y) に一番近い未訪問の端点の番号（なければ -1）"""
+        if self.remaining == 0:
+            return -1
+        center = self.key(x, y)
+        cell = self.cell
+        fx = (x - self.origin[0]) % cell
+        fy = (y - self.origin[1]) % cell
+        # 自分のマスの辺までの最短距離（リング r + 1 の点は r * cell + margin より遠い）
+        margin = min(fx, cell - fx, fy, cell - fy)
+        alive, xy, cells = self.alive, self.xy, self.cells
+        best, best_d = -1, math.inf
+        r = 0
+        while r <= self.pad:
+            for offset in self.ring(r):
+                members = cells.get(center + offset)
+                if not members:
+                    continue
+                live = [index for index in members if alive[index]]
+                if len(live) != len(members):
+                    if live:
+                        cells[center + offset] = live
+                    else:
+                        del cells[center + offset]
+                for index in live:
+                    px, py = xy[index]
+                    d = (px - x) ** 2 + (py - y) ** 2
+                    if d < best_d:
+                        best, best_d = index, d
+            if best >= 0 and best_d <= (r * cell + margin) ** 2:
+                return best
+            r += 1
+            if best < 0 and r > self.MAX_RING:
+                break
+        return self._nearest_brute(x, y)
+
+    def _nearest_brute(self, x, y):
+        alive = np.frombuffer(bytes(self.alive), dtype=np.uint8)
+        # 候補の配列は生きている端点が半分を切ったら詰め直す
+        if len(self.candidates) > 2 * self.remaining:
+            self.candidates = np.flatnonzero(alive)
+        candidates = self.candidates[alive[self.candidates] == 1]
+        d = np.sum((self.coords[candidates] - (x, y)) ** 2, axis=1)
+        return int(candidates[np.argmin(d)])
+
+    def neighbors(self, point, limit):
+        """point の周り 3x3 マスの端点を最大 limit 個（近い順）"""
+        center = self.key(point[0], point[1])
+        found = []
+        for offset in self.ring(0) + self.ring(1):
+            found.extend(self.cells.get(center + offset, ()))
+        if len(found) > limit:
+            d = np.sum((self.coords[found] - point) ** 2, axis=1)
+            found = [found[k] for k in np.argpartition(d, limit)[:limit]]
+        return found
+
+
+def _greedy_order(starts, ends, reverse):
+    """最近傍法で訪問順と反転の有無を決める（最初のパスはそのまま）"""
+    count = len(starts)
+    coords = np.concatenate([starts, ends]) if reverse else starts
+    extent = np.ptp(coords, axis=0).max() if count > 1 else 1.0
+    grid = _EndpointGrid(coords, max(extent / np.sqrt(count), 1.0))
+
+    order = np.empty(count, dtype=np.int64)
+    flip = np.zeros(count, dtype=bool)
+    current = 0
+    for step in range(count):
+        order[step] = current
+        grid.remove(current)
+        if reverse:
+            grid.remove(current + count)
+        if step == count - 1:
+            break
+        exit_x, exit_y = starts[current] if flip[step] else ends[current]
+        nearest = grid.nearest(exit_x, exit_y)
+        # 終点側の端点から入るならパスを反転して描く
+        current = nearest % count
+        flip[step + 1] = nearest >= count
+    return order, flip
+
+
+def _refine_order(starts, ends, order, flip, reverse, time_limit, neighbors=8):
+    """
+    近傍候補だけを調べる 2-opt（区間の反転、reverse=True のとき）と
+    Or-opt（1本のパスの移動）で訪問順を改善する。time_limit 秒で打ち切る
+    """
+    deadline = time.perf_counter() + time_limit
+    count = len(order)
+    if count < 3 or time_limit <= 0:
+        return order, flip
+
+    order, flip = order.copy(), flip.copy()
+    position = np.empty(count, dtype=np.int64)
+    position[order] = np.arange(count)
+    s_pos = np.where(flip[:, None], ends[order], starts[order])
+    e_pos = np.where(flip[:, None], starts[order], ends[order])
+
+    # 端点の座標は順番を変えても動かないので、索引はパス番号で1回だけ作る
+    coords = np.concatenate([starts, ends])
+    extent = max(np.ptp(coords, axis=0).max(), 1.0)
+    grid = _EndpointGrid(coords, max(extent / np.sqrt(count), 1.0))
+
+    def dist(a, b):
+        if a is None or b is None:
+            return 0.0
+        return math.hypot(a[0] - b[0], a[1] - b[1])
+
+    def at(points, index):
+        return points[index] if 0 <= index < count else None
+
+    def end_positions(point):
+        """point の近くに向き付きの終点があるパスの位置"""
+        for endpoint in grid.neighbors(point, neighbors):
+            path = endpoint % count
+            is_end = (endpoint >= count) != flip[position[path]]
+            if is_end:
+                yield int(position[path])
+
+    def reverse_segment(low, high):
+        order[low:high + 1] = order[low:high + 1][::-1]
+        flip[low:high + 1] = ~flip[low:high + 1][::-1]
+        new_s = e_pos[low:high + 1][::-1].copy()
+        e_pos[low:high + 1] = s_pos[low:high + 1][::-1]
+        s_pos[low:high + 1] = new_s
+        position[order[low:high + 1]] = np.arange(low, high + 1)
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, count):
+            if i % 256 == 0 and time.perf_counter() >= deadline:
+                break
+            a = e_pos[i - 1]
+            if dist(a, s_pos[i]) == 0:
+                continue
+
+            # 2-opt: E[i-1] の近くに終点がある位置 j との間の区間を反転する
+            if reverse:
+                for j in end_positions(a):
+                    if j == i - 1:
+                        continue
+                    low, high = (i, j) if j >= i else (j + 1, i - 1)
+                    left, right = at(e_pos, low - 1), at(s_pos, high + 1)
+                    before = dist(left, s_pos[low]) + dist(e_pos[high], right)
+                    after = dist(left, e_pos[high]) + dist(s_pos[low], right)
+                    if after < before - 1e-9:
+                        reverse_segment(low, high)
+                        improved = True
+                        break
+                if dist(e_pos[i - 1], s_pos[i]) == 0:
+                    continue
+
+            # Or-opt: 位置 i のパスを、始点の近くに終点がある位置 q の直後へ移す
+            previous, following = e_pos[i - 1], at(s_pos, i + 1)
+            removal_gain = dist(previous, s_pos[i]) + dist(e_pos[i], following) - dist(previous, following)
+            for q in end_positions(s_pos[i]):
+                if q in (i - 1, i):
+                    continue
+                follow = at(s_pos, q + 1)
+                insert_cost = dist(e_pos[q], s_pos[i]) + dist(e_pos[i], follow) - dist(e_pos[q], follow)
+                flipped = False
+                if reverse:
+                    flipped_cost = dist(e_pos[q], e_pos[i]) + dist(s_pos[i], follow) - dist(e_pos[q], follow)
+                    if flipped_cost < insert_cost:
+                        insert_cost, flipped = flipped_cost, True
+                if insert_cost < removal_gain - 1e-9:
+                    target = q + 1 if q < i else q
+                    low, high = min(i, target), max(i, target)
+                    moved, moved_flip = order[i], flip[i] ^ flipped
+                    moved_s, moved_e = (e_pos[i], s_pos[i]) if flipped else (s_pos[i], e_pos[i])
+                    moved_s, moved_e = moved_s.copy(), moved_e.copy()
+                    # i を抜いて target へ入れる（間の位置は1つずつずれる）
+                    shift = slice(i, target) if i < target else slice(target + 1, i + 1)
+                    source = slice(i + 1, target + 1) if i < target else slice(target, i)
+                    for array in (order, flip, s_pos, e_pos):
+                        array[shift] = array[source].copy()
+                    order[target], flip[target] = moved, moved_flip
+                    s_pos[target], e_pos[target] = moved_s, moved_e
+                    position[order[low:high + 1]] = np.arange(low, high + 1)
+                    improved = True
+                    break
+    return order, flip
+
+
+def order_paths(paths, reverse=True, time_limit=1.0):
+    """
+    ペンを上げて移動する距離が短くなるようにパスを並べ替える
+
+    パスの端点を一様グリッドに入れて最近傍法で順番を決め、
+    残り時間で近傍候補だけを調べる 2-opt / Or-opt で改善する。
+
+    Args:
+        paths: PathBuffer
+        reverse: パスを逆向きに描いてもよいか
+        time_limit: 2-opt / Or-opt に使う秒数（0 なら最近傍法のみ）
+
+    Returns:
+        並べ替えた PathBuffer（空のパスは末尾に回す）
+    """
+    lengths = paths.lengths()
+    nonempty = np.flatnonzero(lengths > 0)
+    if len(nonempty) < 2:
+        return paths
+
+    starts, ends = _path_ends(paths.select(nonempty))
+    order, flip = _greedy_order(starts, ends, reverse)
+    order, flip = _refine_order(starts, ends, order, flip, reverse, time_limit)
+
+    ordered = paths.select(np.concatenate([nonempty[order], np.flatnonzero(lengths == 0)]))
+    if not flip.any():
+        return ordered
+
+    # 反転するパスの点を逆順に並べ直す
+    index = ordered.path_index()
+    ordered_lengths = ordered.lengths()
+    within = np.arange(ordered.total_points) - ordered.offsets[index]
+    flipped = np.zeros(len(ordered), dtype=bool)
+    flipped[:len(flip)] = flip
+    take = np.where(flipped[index], ordered.offsets[index] + ordered_lengths[index] - 1 - within,
+                    np.arange(ordered.total_points))
+    return PathBuffer(ordered.points[take], ordered.offsets)
+
+
+def skeletonize(mask):
+    """
+    Zhang–Suen 法で2値マスクを1ピクセル幅の骨格に細線化する
+
+    各サブ反復で消せる画素を画像全体の配列演算でまとめて求める。
+
+    Args:
+        mask: 線の部分が True の2値配列
+
+    Returns:
+        骨格の bool 配列
+    """
+    image = np.pad(np.asarray(mask, dtype=bool), 1).astype(np.uint8)
+    while True:
+        changed = False
+        for first_pass in (True, False):
+            # 近傍 P2..P9（北から時計回り）
+            p2, p3, p4 = image[:-2, 1:-1], image[:-2, 2:], image[1:-1, 2:]
+            p5, p6, p7 = image[2:, 2:], image[2:, 1:-1], image[2:, :-2]
+            p8, p9 = image[1:-1, :-2], image[:-2, :-2]
+            ring = (p2, p3, p4, p5, p6, p7, p8, p9, p2)
+
+            neighbors = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9
+            # 0 → 1 の切り替わり回数
+            transitions = sum((ring[k] == 0) & (ring[k + 1] == 1) for k in range(8))
+            if first_pass:
+                condition = (p2 * p4 * p6 == 0) & (p4 * p6 * p8 == 0)
+            else:
+                condition = (p2 * p4 * p8 == 0) & (p2 * p6 * p8 == 0)
+            remove = ((image[1:-1, 1:-1] == 1) & (neighbors >= 2) & (neighbors <= 6)
+                      & (transitions == 1) & condition)
+            if remove.any():
+                image[1:-1, 1:-1][remove] = 0
+                changed = True
+        if not changed:
+            return image[1:-1, 1:-1].astype(bool)
+
+
+# 8近傍の向き (dy, dx)。ビット k が向き k
+_NEIGHBOR_OFFSETS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+
+def _skeleton_links(skeleton):
+    """
+    骨格の各画素について、つながっている近傍のビットマスクを返す
+
+    斜めの近傍は、その間にある上下左右の画素がどちらも空のときだけつながっているとみなす
+    （m 隣接）。L 字の角で三角形ができて偽の分岐点になるのを防ぐ。
+    """
+    padded = np.pad(skeleton, 1)
+    height, width = skeleton.shape
+
+    def shifted(dy, dx):
+        return padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+
+    links = np.zeros(skeleton.shape, dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(_NEIGHBOR_OFFSETS):
+        linked = skeleton & shifted(dy, dx)
+        if dy and dx:
+            linked &= ~shifted(dy, 0) & ~shifted(0, dx)
+        links |= linked.astype(np.uint8) << bit
+    return links
+
+
+def trace_skeleton(skeleton):
+    """
+    骨格を折れ線に分解する（各画素を1回ずつたどる線形時間）
+
+    端点・分岐点（つながりが2本でない画素）の間を1本の折れ線にし、
+    分岐点のない輪は1周を1本にする。孤立した画素は [p, p] の点にする。
+
+    Returns:
+        骨格画素の座標 (x, y) の PathBuffer
+    """
+    links = _skeleton_links(skeleton)
+    height, width = skeleton.shape
+    link_list = links.ravel().tolist()
+    degree = np.unpackbits(links[..., None], axis=-1).sum(axis=-1).ravel().tolist()
+    steps = [dy * width + dx for dy, dx in _NEIGHBOR_OFFSETS]
+    pixels = np.flatnonzero(skeleton.ravel()).tolist()
+
+    visited = bytearray(height * width)
+    node_edges = set()
+    paths = []
+
+    def walk(start, first):
+        """start から first の方向へ、次の端点・分岐点（または start）までたどる"""
+        path = [start, first]
+        previous, current = start, first
+        while degree[current] == 2 and current != start:
+            visited[current] = 1
+            bits = link_list[current]
+            for bit in range(8):
+                if bits >> bit & 1 and current + steps[bit] != previous:
+                    previous, current = current, current + steps[bit]
+                    break
+            path.append(current)
+        return path
+
+    for pixel in pixels:
+        if degree[pixel] == 2:
+            continue
+        if degree[pixel] == 0:
+            paths.append([pixel, pixel])
+            continue
+        bits = link_list[pixel]
+        for bit in range(8):
+            if not bits >> bit & 1:
+                continue
+            neighbor = pixel + steps[bit]
+            if degree[neighbor] == 2:
+                if visited[neighbor]:
+                    continue
+            else:
+                # 端点・分岐点どうしが直接つながる辺は1回だけ
+                edge = (min(pixel, neighbor), max(pixel, neighbor))
+                if edge in node_edges:
+                    continue
+                node_edges.add(edge)
+            paths.append(walk(pixel, neighbor))
+
+    # 残りは分岐点のない輪
+    for pixel in pixels:
+        if degree[pixel] == 2 and not visited[pixel]:
+            visited[pixel] = 1
+            bits = link_list[pixel]
+            first = next(pixel + steps[bit] for bit in range(8) if bits >> bit & 1)
+            paths.append(walk(pixel, first))
+
+    if not paths:
+        return PathBuffer()
+    flat = np.fromiter((index for path in paths for index in path), dtype=np.int64)
+    coords = np.stack([flat % width, flat // width], axis=1)
+    return PathBuffer.from_lengths(coords, [len(path) for path in paths])
+
+
+def centerline_paths(binary_img, draw_x1, draw_y1, draw_width, draw_height, tolerance=0.5):
+    """
+    黒い線を細線化し、中心線の折れ線を描画座標で返す（線画向け）
+
+    輪郭線のように線の両側をなぞったり、塗りつぶしのように太さ分を往復したりせず、
+    線の中心を1回だけなぞる。
+
+    Args:
+        binary_img: 2値画像 (uint8, 黒=0)
+        tolerance: 描画座標での簡略化の許容誤差（ピクセル）
+
+    Returns:
+        PathBuffer
+    """
+    skeleton = skeletonize(binary_img == 0)
+    traced = trace_skeleton(skeleton)
+    if not len(traced):
+        return traced
+
+    height, width = binary_img.shape
+    traced.points[:, 0] = _coordinate_map(width, draw_width)[traced.points[:, 0]] + draw_x1
+    traced.points[:, 1] = _coordinate_map(height, draw_height)[traced.points[:, 1]] + draw_y1
+    return simplify_paths(traced, tolerance)
+
+
+def segment_pixels(segments):
+    """
+    線分 (N, 2, 2) の始点から終点へ引いた直線が通る画素を、全部の線分についてまとめて求める
+
+    長い方の軸で1画素ずつ進めて、もう一方の座標を丸める（端点を含む）。
+
+    Returns:
+        (index, xs, ys): 各画素が何番目の線分のものか、とその座標（線分の順、始点から終点へ）
+    """
+    segments = np.asarray(segments, dtype=np.int64).reshape(-1, 2, 2)
+    delta = segments[:, 1] - segments[:, 0]
+    steps = np.abs(delta).max(axis=1)
+    counts = steps + 1
+    index = np.repeat(np.arange(len(segments)), counts)
+    k = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = k / np.maximum(steps, 1)[index]
+    xs = np.rint(segments[index, 0, 0] + delta[index, 0] * t).astype(np.int64)
+    ys = np.rint(segments[index, 0, 1] + delta[index, 1] * t).astype(np.int64)
+    return index, xs, ys
+
+
+def _clip_segments(segments, mask):
+    """
+    各線分 (N, 2, 2) を、通る画素（segment_pixels）がすべて mask の中にある部分に切り分ける
+
+    全部の線分の画素をまとめて調べ、白い画素で区切った黒い連続部分の両端を新しい線分にする。
+    切り出した線分は引き直すと通る画素が少し変わることがあるので、切り出した分だけを
+    もう一度調べる。切り出した線分は元より短いので必ず終わり、1画素だけの線分は黒なので残る。
+    """
+    kept = []
+    pending = np.asarray(segments, dtype=np.int64).reshape(-1, 2, 2)
+    while len(pending):
+        index, xs, ys = segment_pixels(pending)
+        inside = mask[ys, xs]
+        clean = np.ones(len(pending), dtype=bool)
+        clean[index[~inside]] = False
+        kept.append(pending[clean])
+
+        # 白を通った線分の、黒い画素の連続部分（別の線分や白い画素をまたがない）
+        keep = inside & ~clean[index]
+        index, xs, ys = index[keep], xs[keep], ys[keep]
+        position = np.flatnonzero(keep)
+        first = np.ones(len(index), dtype=bool)
+        first[1:] = (position[1:] != position[:-1] + 1) | (index[1:] != index[:-1])
+        last = np.ones(len(index), dtype=bool)
+        last[:-1] = first[1:]
+        pending = np.stack([np.column_stack([xs[first], ys[first]]),
+                            np.column_stack([xs[last], ys[last]])], axis=1)
+    return np.concatenate(kept) if kept else np.empty((0, 2, 2), dtype=np.int64)
+
+
+def _pen_radius(pen_width):
+    """太さ pen_width のペンが塗る範囲（画素の中心が線からこの距離以内なら塗られる）"""
+    return pen_width / 2 + 0.5
+
+
+def _hatch_runs(mask, pitch):
+    """
+    mask の黒を、pitch 行ずつの帯ごとに黒い画素だけを通る横線で塗る
+
+    まず帯の中心の行の黒い区間を線にする。ペンが届かない黒が残っていれば、その列で
+    帯の中心に近い順に最初の届かない黒い行を選んで線を足し、全部届くまで繰り返す
+    （帯の中の細い線も落とさない）。
+
+    Returns:
+        (rows, starts, ends): 各線の行と両端のX座標
+    """
+    bands = -(-mask.shape[0] // pitch)
+    padded = np.zeros((bands * pitch, mask.shape[1]), dtype=bool)
+    padded[:mask.shape[0]] = mask
+    chosen = np.zeros_like(padded)
+    chosen[pitch // 2::pitch] = padded[pitch // 2::pitch]
+
+    radius = _pen_radius(pitch)
+    ys, xs = np.mgrid[-int(radius):int(radius) + 1, -int(radius):int(radius) + 1]
+    pen = (np.hypot(xs, ys) <= radius).astype(np.uint8)
+    order = np.argsort(np.abs(np.arange(pitch) - pitch // 2), kind="stable")
+    while True:
+        missed = padded & (cv2.dilate(chosen.astype(np.uint8), pen) == 0)
+        if not missed.any():
+            break
+        candidates = missed.reshape(bands, pitch, -1)[:, order]
+        band, column = np.nonzero(candidates.any(axis=1))
+        chosen[band * pitch + order[candidates[band, :, column].argmax(axis=1)], column] = True
+
+    # 選んだ行ごとの黒い区間が線になる（行が変わる所と白を挟む所で切れる）
+    return extract_runs(chosen, gap=1)
+
+
+def hatch_fill(binary_img, draw_x1, draw_y1, draw_width, draw_height, pen_width, angle=0.0):
+    """
+    黒い領域を、ペンの太さの間隔で平行線を引いて塗る
+
+    描画グリッドの黒マスを angle 度回転させ、pen_width 行ずつの帯ごとに横線を選ぶ
+    （_hatch_runs: 帯の中心の行と、ペンが届かない黒を拾う行。帯の中の細い線も落とさない）。
+    線は回転した画像の上で黒い画素だけを通る。逆回転して描画座標に戻したあと、
+    通る画素をまとめて調べ直して丸めで白に触れた所だけ切り分け、回転の補間や丸めで
+    ペンが届かなくなった黒は描画グリッドのままの横線で埋める。塗りつぶしの内側では
+    帯の中心の行が続くので、線の数は1行ずつ走査するのに比べておよそ 1/pen_width になる。
+
+    Args:
+        binary_img: 2値画像 (uint8, 黒=0)
+        pen_width: ペンの太さ（ピクセル）＝線の間隔
+        angle: ハッチングの角度（度）
+
+    Returns:
+        各線が2点のパスの PathBuffer
+    """
+    black = resample_black_pixels(binary_img, draw_width, draw_height) > 0
+    if not black.any():
+        return PathBuffer()
+    pitch = max(int(pen_width), 1)
+    height, width = black.shape
+
+    if angle % 180 == 0:
+        rotated = black
+        inverse = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    elif angle % 180 == 90:
+        # 縦線は転置で正確に作る（回転の補間で1ピクセルの線が欠けないように）
+        rotated = black.T
+        inverse = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, 0.0]])
+    else:
+        # 回転後の画像がはみ出さない大きさに広げて回転する
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        rotated_width = int(np.ceil(width * cos + height * sin))
+        rotated_height = int(np.ceil(width * sin + height * cos))
+        matrix[0, 2] += rotated_width / 2 - width / 2
+        matrix[1, 2] += rotated_height / 2 - height / 2
+        rotated = cv2.warpAffine(black.astype(np.uint8), matrix, (rotated_width, rotated_height),
+                                 flags=cv2.INTER_NEAREST) > 0
+        inverse = cv2.invertAffineTransform(matrix)
+
+    # 回転した画像の上で黒い画素だけを通る横線を選ぶ
+    rows, starts, ends = _hatch_runs(rotated, pitch)
+    ends_xy = np.stack([
+        np.stack([starts, rows], axis=1),
+        np.stack([ends, rows], axis=1),
+    ], axis=1).reshape(-1, 2)
+
+    original = ends_xy @ inverse[:, :2].T + inverse[:, 2]
+    original = np.rint(original)
+    original[:, 0] = np.clip(original[:, 0], 0, width - 1)
+    original[:, 1] = np.clip(original[:, 1], 0, height - 1)
+    segments = _clip_segments(original.astype(np.int64).reshape(-1, 2, 2), black)
+
+    # 回転の補間や丸めでペンが届かなかった黒は、描画グリッドのままの横線で埋める
+    canvas = np.full(black.shape, 255, dtype=np.uint8)
+    _, xs, ys = segment_pixels(segments)
+    canvas[ys, xs] = 0
+    missed = black & (cv2.distanceTransform(canvas, cv2.DIST_L2, cv2.DIST_MASK_PRECISE) > _pen_radius(pitch))
+    if missed.any():
+        rows, starts, ends = _hatch_runs(missed, pitch)
+        segments = np.concatenate([segments, np.stack([
+            np.stack([starts, rows], axis=1),
+            np.stack([ends, rows], axis=1),
+        ], axis=1)])
+    if not len(segments):
+        return PathBuffer()
+    return PathBuffer.from_lengths(segments.reshape(-1, 2) + np.array([draw_x1, draw_y1]),
+                                   np.full(len(segments), 2))
+
+
+def dot_paths(dots, length=1):
+    """
+    点の座標 (N, 2) を、1点ごとに短い横線1本のパスにする（点描の点を画像を走査し直さずに描く）
+
+    線は点を中心に length ピクセル（セルの幅 - 1 なら、そのセルの左端から右端まで）。
+    2点なのは、描画側が1点だけのパスを描かないため。
+
+    Args:
+        dots: 点の座標 (N, 2) [x, y]（dithering.stippling_dither の dots など）
+        length: 線の長さ（ピクセル、0 ならその場で押すだけ）
+
+    Returns:
+        各パスが2点の PathBuffer（点と同じ順）
+    """
+    dots = np.asarray(dots).reshape(-1, 2)
+    start = dots - np.array([(length + 1) // 2, 0])
+    ends = np.stack([start, start + np.array([length, 0])], axis=1)
+    return PathBuffer.from_lengths(ends.reshape(-1, 2), np.full(len(dots), 2))
@@ -0,0 +1,95 @@
+import queue
+import threading
+import time
+
+# 作ったがまだ描いていないパスの塊の上限（生成が描画より速くてもメモリを使いすぎない）
+MAX_PENDING_CHUNKS = 4
+
+# 生成の終わりを描画側に知らせる印
+_DONE = object()
+
+
+def stream_draw(chunks, draw_chunk, max_pending=MAX_PENDING_CHUNKS):
+    """
+    パスの塊を作るジェネレータを別スレッドで進めながら、出来た塊から順に描く
+
+    生成側は大きさ max_pending のキューに塊を入れ、いっぱいなら描画が追いつくまで待つ。
+    描画は呼び出したスレッド（pyautogui を動かすメインスレッド）で行うので、
+    最初の塊が出来しだい描き始め、その間に後の塊を作る。描画が中止されたら
+    生成も作りかけの塊が出来た所でやめる。
+
+    Args:
+        chunks: PathBuffer を順に返すイテラブル（ジェネレータなら生成スレッドで進む）
+        draw_chunk: 1つの塊を描く関数。中止されたら False を返す
+        max_pending: キューに溜める塊の上限
+
+    Returns:
+        辞書 {"first_stroke", "generated", "total", "chunks", "paths", "points", "stopped"}
+        時間は呼び出しからの秒数。first_stroke は最初のパスを描き始めた時刻
+        （何も描かなければ None）、generated は生成が終わった時刻（中止で終わらなければ None）
+    """
+    start = time.perf_counter()
+    pending = queue.Queue(maxsize=max_pending)
+    cancel = threading.Event()
+    produced = {}
+
+    def hand_over(item):
+        # 描画側が中止したら、キューが空くのを待たずにやめる
+        while not cancel.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not hand_over(chunk):
+                    break
+            else:
+                produced["generated"] = time.perf_counter() - start
+        except Exception as error:
+            produced["error"] = error
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            hand_over(_DONE)
+
+    report = {"first_stroke": None, "generated": None, "total": None,
+              "chunks": 0, "paths": 0, "points": 0, "stopped": False}
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    while True:
+        chunk = pending.get()
+        if chunk is _DONE:
+            break
+        report["chunks"] += 1
+        if not len(chunk):
+            continue
+        if report["first_stroke"] is None:
+            report["first_stroke"] = time.perf_counter() - start
+        report["paths"] += len(chunk)
+        report["points"] += chunk.total_points
+        if draw_chunk(chunk) is False:
+            report["stopped"] = True
+            break
+
+    # 中止したときも、作りかけの塊が終わって生成側が後片付け（共有メモリの解放など）をするのを待つ
+    cancel.set()
+    producer.join()
+    if "error" in produced:
+        raise produced["error"]
+    report["generated"] = produced.get("generated")
+    report["total"] = time.perf_counter() - start
+    return report
+
+
+def format_stream_report(report):
+    """stream_draw の結果を1行の文字列にする"""
+    first = "なし" if report["first_stroke"] is None else f"{report['first_stroke']:.2f}秒"
+    generated = "中止" if report["generated"] is None else f"{report['generated']:.2f}秒"
+    return (f"最初のストロークまで {first}, パス生成完了 {generated}, 全体 {report['total']:.2f}秒 "
+            f"({report['chunks']}塊, {report['paths']}パス, {report['points']}点)")
@@ -0,0 +1,269 @@
+import cv2
+import numpy as np
+from paths import PathBuffer, remove_collinear
+
+
+def _cell(x, y, size):
+    return (int(x // size), int(y // size))
+
+
+def group_strokes(strokes, connect_threshold=40.0):
+    """
+    ストロークを、ペンを上げずに続けて描けるグループにまとめる
+
+    従来の main.py と同じ規則でまとめる: 未訪問で番号が最小のストロークから始め、
+    今の終点に一番近い未訪問ストロークの端点（始点なら順向き、終点なら反転）へ
+    connect_threshold 以下の距離ならつなぐ。距離が同じなら番号の小さい方、
+    同じストロークなら始点を優先する。
+
+    端点を connect_threshold / 4 四方のマスに入れておき、近いマスから順に
+    connect_threshold の範囲までだけを調べるので、全ストロークを毎回走査する
+    従来の方法（O(n²)）と違いほぼ線形時間で終わる。
+
+    Args:
+        strokes: (start_x, start_y, end_x, end_y) のリスト
+        connect_threshold: つなぐ距離の上限（ピクセル）
+
+    Returns:
+        グループのリスト。各グループは向きをそろえた (sx, sy, ex, ey) のリスト
+    """
+    count = len(strokes)
+    # マスは距離の上限の 1/4。近いリングから調べ、それより近い候補が残り得なくなったら止める
+    size = float(connect_threshold) / 4 if connect_threshold > 0 else 1.0
+    max_ring = int(np.ceil(connect_threshold / size)) + 1
+    rings = [[(0, 0)]] + [
+        [(dx, dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1) if max(abs(dx), abs(dy)) == r]
+        for r in range(1, max_ring + 1)
+    ]
+
+    # マス → そのマスに端点があるストローク番号（昇順）
+    cells = {}
+    for j, (sx, sy, ex, ey) in enumerate(strokes):
+        start_cell, end_cell = _cell(sx, sy, size), _cell(ex, ey, size)
+        cells.setdefault(start_cell, []).append(j)
+        if end_cell != start_cell:
+            cells.setdefault(end_cell, []).append(j)
+
+    visited = [False] * count
+    ordered_groups = []
+    first_unvisited = 0
+    while True:
+        while first_unvisited < count and visited[first_unvisited]:
+            first_unvisited += 1
+        if first_unvisited == count:
+            break
+
+        visited[first_unvisited] = True
+        sx, sy, ex, ey = strokes[first_unvisited]
+        group = [(sx, sy, ex, ey)]
+        current_x, current_y = ex, ey
+
+        while True:
+            cx, cy = _cell(current_x, current_y, size)
+            # 自分のマスの辺までの最短距離（リング r + 1 の端点は r * size + margin より遠い）
+            fx, fy = current_x - cx * size, current_y - cy * size
+            margin = min(fx, size - fx, fy, size - fy)
+            best = None
+            for r, ring in enumerate(rings):
+                for dx, dy in ring:
+                    key = (cx + dx, cy + dy)
+                    members = cells.get(key)
+                    if not members:
+                        continue
+                    live = [j for j in members if not visited[j]]
+                    if len(live) != len(members):
+                        cells[key] = live
+                    for j in live:
+                        csx, csy, cex, cey = strokes[j]
+                        d1 = (current_x - csx) ** 2 + (current_y - csy) ** 2
+                        d2 = (current_x - cex) ** 2 + (current_y - cey) ** 2
+                        candidate = (d1, j, False) if d1 <= d2 else (d2, j, True)
+                        if best is None or candidate < best:
+                            best = candidate
+                # 同じ距離の候補（番号の小さい方を選ぶ）が外側に残らないよう、厳密に近いときだけ止める
+                if best is not None and best[0] < (r * size + margin) ** 2:
+                    break
+
+            if best is None or best[0] ** 0.5 > connect_threshold:
+                break
+
+            _, j, flip = best
+            visited[j] = True
+            nsx, nsy, nex, ney = strokes[j]
+            if flip:
+                nsx, nsy, nex, ney = nex, ney, nsx, nsy
+            group.append((nsx, nsy, nex, ney))
+            current_x, current_y = nex, ney
+
+        ordered_groups.append(group)
+    return ordered_groups
+
+
+def sampled_gradients(img, step):
+    """
+    step 間隔で標本化する格子点での Sobel 勾配 (gx, gy)
+
+    step 以下で最大の 2 のべき乗までピラミッドで縮小してから float32 の Sobel をかけるので、
+    全解像度で勾配を求めるのに比べてメモリと時間がおよそ 1/step² になる。
+
+    Returns:
+        (ceil(height / step), ceil(width / step)) の float32 配列 2つ
+    """
+    level = max(int(step).bit_length() - 1, 0)
+    small = img
+    for _ in range(level):
+        small = cv2.pyrDown(small)
+
+    sobel_x = cv2.Sobel(small, cv2.CV_32F, 1, 0, ksize=3)
+    sobel_y = cv2.Sobel(small, cv2.CV_32F, 0, 1, ksize=3)
+
+    # 元画像の格子点 (y, x) = (i * step, j * step) に対応する縮小画像の画素
+    height, width = img.shape
+    ys = np.minimum(np.arange(0, height, step) >> level, small.shape[0] - 1)
+    xs = np.minimum(np.arange(0, width, step) >> level, small.shape[1] - 1)
+    return sobel_x[np.ix_(ys, xs)], sobel_y[np.ix_(ys, xs)]
+
+
+def stroke_pattern(img, draw_x1, draw_y1, draw_width, draw_height, step=12, max_brightness=180):
+    """
+    step 間隔の格子点のうち暗い点に、勾配の向きのストロークを置く
+
+    ストロークの長さは暗いほど長く 5〜20 ピクセル。格子点すべてを1回の配列演算で求める。
+
+    Returns:
+        (ストローク数, 4) の int 配列 [start_x, start_y, end_x, end_y]（行優先の格子順）
+    """
+    img_height, img_width = img.shape
+    gx, gy = sampled_gradients(img, step)
+
+    brightness = img[::step, ::step]
+    ys, xs = np.nonzero(brightness < max_brightness)
+    dark = brightness[ys, xs].astype(np.int64)
+    # 角度は標本点だけで求める
+    angle = np.arctan2(gy[ys, xs].astype(np.float64), gx[ys, xs].astype(np.float64))
+    ys, xs = ys * step, xs * step
+
+    stroke_length = (255 - dark) * 15 // 255 + 5
+    start_x = draw_x1 + (xs / img_width * draw_width).astype(np.int64)
+    start_y = draw_y1 + (ys / img_height * draw_height).astype(np.int64)
+    end_x = start_x + np.trunc(np.cos(angle) * stroke_length).astype(np.int64)
+    end_y = start_y + np.trunc(np.sin(angle) * stroke_length).astype(np.int64)
+    return np.stack([start_x, start_y, end_x, end_y], axis=1)
+
+
+def tangent_field(img, sigma):
+    """
+    エッジに沿った向き（Sobel 勾配に垂直な単位ベクトル）を構造テンソルで平滑化して返す
+
+    勾配の向きは θ と θ + π が同じ意味なので、ベクトルを直接ぼかさず
+    構造テンソル (gx², gx·gy, gy²) をぼかしてから向きを求める。
+
+    Returns:
+        (tx, ty) 画像と同じサイズの float32 配列 2つ
+    """
+    gx = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(img, cv2.CV_32F, 0, 1, ksize=3)
+    jxx = cv2.GaussianBlur(gx * gx, (0, 0), sigma)
+    jxy = cv2.GaussianBlur(gx * gy, (0, 0), sigma)
+    jyy = cv2.GaussianBlur(gy * gy, (0, 0), sigma)
+
+    # 勾配の主方向に垂直な向き
+    theta = 0.5 * np.arctan2(2 * jxy, jxx - jyy) + np.float32(np.pi / 2)
+    return np.cos(theta), np.sin(theta)
+
+
+def _trace(tx, ty, brightness, blocked, x, y, direction, step, separation, max_brightness, max_points):
+    """(x, y) から向き direction（+1/-1）へ流線をたどった点のリスト（始点は含まない）"""
+    height, width = len(blocked), len(blocked[0])
+    ix, iy = int(x), int(y)
+    dx, dy = tx[iy][ix] * direction, ty[iy][ix] * direction
+    points = []
+    # 自分自身に近づいたら止めるため、通ったマス（間隔の半分四方）と通った刻みを覚えておく
+    cell = max(separation / 2, 1.0)
+    visited = {(int(x // cell), int(y // cell)): 0}
+    recent = int(2 * separation / step) + 1
+    for index in range(1, max_points + 1):
+        # 中点法 (RK2)。向きは軸（±）なので直前の進行方向にそろえる
+        mx, my = x + dx * step * 0.5, y + dy * step * 0.5
+        if not (0 <= mx < width and 0 <= my < height):
+            break
+        vx, vy = tx[int(my)][int(mx)], ty[int(my)][int(mx)]
+        if vx * dx + vy * dy < 0:
+            vx, vy = -vx, -vy
+        nx, ny = x + vx * step, y + vy * step
+        if not (0 <= nx < width and 0 <= ny < height):
+            break
+        ix, iy = int(nx), int(ny)
+        if blocked[iy][ix] or brightness[iy][ix] > max_brightness:
+            break
+        key = (int(nx // cell), int(ny // cell))
+        if index - visited.setdefault(key, index) > recent:
+            break
+        x, y, dx, dy = nx, ny, vx, vy
+        points.append((x, y))
+    return points
+
+
+def flow_streamlines(img, draw_x1, draw_y1, draw_width, draw_height, spacing=6, step=1.5,
+                     max_brightness=180, min_points=4, max_points=2000):
+    """
+    エッジに沿った流れ場の流線を、一定の間隔を空けて長い連続ストロークとして並べる
+
+    描画範囲の1ピクセル＝作業画像の1ピクセルとして、暗い点から順に種を置き、
+    平滑化した接線場に沿って両方向へたどる。既存の線から spacing / 2 より近づくか、
+    明度が max_brightness を超えたら止める。線の近さは占有画像で判定する。
+
+    Args:
+        img: グレースケール画像
+        spacing: 線どうしの間隔（ピクセル）
+        step: 積分の刻み（ピクセル）
+        max_brightness: これより明るい場所では線を描かない
+        min_points: これより短い線は捨てる
+        max_points: 片側にたどる点数の上限
+
+    Returns:
+        描画座標の PathBuffer（1本の流線が1本のパス）
+    """
+    work = cv2.resize(img, (int(draw_width), int(draw_height)), interpolation=cv2.INTER_AREA)
+    work = cv2.GaussianBlur(work, (3, 3), 0)
+    tx, ty = tangent_field(work, sigma=spacing)
+
+    # 積分中は Python のリストで参照する（numpy の要素アクセスより速い）
+    tx_rows, ty_rows, brightness = tx.tolist(), ty.tolist(), work.tolist()
+
+    # 線の近く（間隔の半分以内）は流線を止め、間隔以内には種を置かない
+    near_line = np.zeros(work.shape, dtype=np.uint8)
+    no_seed = np.zeros(work.shape, dtype=np.uint8)
+    near_rows = near_line.tolist()
+
+    ys, xs = np.mgrid[spacing // 2:work.shape[0]:spacing, spacing // 2:work.shape[1]:spacing]
+    ys, xs = ys.ravel(), xs.ravel()
+    dark = work[ys, xs] <= max_brightness
+    ys, xs = ys[dark], xs[dark]
+    order = np.argsort(work[ys, xs], kind="stable")
+
+    lines = []
+    for seed_x, seed_y in zip(xs[order].tolist(), ys[order].tolist()):
+        if no_seed[seed_y, seed_x]:
+            continue
+        x, y = seed_x + 0.5, seed_y + 0.5
+        forward = _trace(tx_rows, ty_rows, brightness, near_rows, x, y, 1, step, spacing,
+                         max_brightness, max_points)
+        backward = _trace(tx_rows, ty_rows, brightness, near_rows, x, y, -1, step, spacing,
+                          max_brightness, max_points)
+        line = backward[::-1] + [(x, y)] + forward
+        if len(line) < min_points:
+            continue
+
+        polyline = np.rint(np.array(line)).astype(np.int32)
+        lines.append(polyline)
+        cv2.polylines(near_line, [polyline], False, 1, thickness=max(spacing // 2, 1) * 2 - 1)
+        cv2.polylines(no_seed, [polyline], False, 1, thickness=spacing * 2 - 1)
+        # 占有画像が変わった行だけリストへ写し直す
+        low = max(int(polyline[:, 1].min()) - spacing, 0)
+        high = int(polyline[:, 1].max()) + spacing + 1
+        near_rows[low:high] = near_line[low:high].tolist()
+
+    if not lines:
+        return PathBuffer()
+    return remove_collinear(PathBuffer.from_lists(lines).translate(draw_x1, draw_y1))